@@ -0,0 +1,11 @@
+"""
+Запуск predict, в том числе в несколько процессов:
+
+    MODEL_WORKERS=4 MODEL_INTRA_OP_THREADS=2 python -m src
+    MODEL_UDS=/run/predict/predict.sock python -m src
+"""
+import uvicorn
+from src.config import settings
+
+if __name__ == '__main__':
+    uvicorn.run('src.main:app', host=settings.host, port=settings.port, workers=settings.workers, uds=settings.uds)
@@ -0,0 +1,97 @@
+"""
+Сравнение backend'ов модели: задержка и потребление памяти.
+
+    python -m src.benchmarks.backends [--iterations 200] [--batch-size 1]
+
+Каждый backend измеряется в отдельном процессе, чтобы RSS не смешивался.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from src.config import settings
+from src.tasks.backends import ONNX, TORCH, load_backend
+
+CORPUS_FILE = Path(__file__).resolve().parents[2] / 'tests' / 'fixtures' / 'corpus.json'
+VARIANTS = {
+    'torch': (TORCH, False),
+    'onnx': (ONNX, False),
+    'onnx-int8': (ONNX, True),
+}
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса в МБ."""
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure(variant: str, iterations: int, batch_size: int) -> dict:
+    from transformers import DistilBertTokenizer
+
+    name, quantized = VARIANTS[variant]
+    texts = json.loads(CORPUS_FILE.read_text(encoding='utf-8'))
+    rss_start = rss_mb()
+    started = time.perf_counter()
+    backend = load_backend(name, settings.model_path, quantized)
+    tokenizer = DistilBertTokenizer.from_pretrained(settings.model_path)
+    load_time = time.perf_counter() - started
+    rss_loaded = rss_mb()
+
+    latencies = []
+    for i in range(iterations):
+        batch = [texts[(i * batch_size + j) % len(texts)] for j in range(batch_size)]
+        started = time.perf_counter()
+        backend.logits(dict(tokenizer(batch, padding=True, truncation=True, return_tensors='np')))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies = latencies[min(10, iterations // 10):]
+
+    return {
+        'backend': variant,
+        'load_s': round(load_time, 3),
+        'rss_model_mb': round(rss_loaded - rss_start, 1),
+        'rss_total_mb': round(rss_mb(), 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(statistics.quantiles(latencies, n=20)[-1], 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Бенчмарк backend\'ов модели.')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--child', choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.iterations, args.batch_size)))
+        return
+
+    print(f"{'backend':<10} {'load, s':>8} {'model RSS, MB':>14} {'total RSS, MB':>14} {'p50, ms':>8} {'p95, ms':>8} {'mean, ms':>9}")
+    for variant in args.variants:
+        process = subprocess.run(
+            [sys.executable, '-m', 'src.benchmarks.backends', '--child', variant,
+             '--iterations', str(args.iterations), '--batch-size', str(args.batch_size)],
+            capture_output=True, text=True,
+        )
+        if process.returncode:
+            print(f'{variant:<10} ошибка: {process.stderr.strip().splitlines()[-1] if process.stderr else process.returncode}')
+            continue
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        print(
+            f"{result['backend']:<10} {result['load_s']:>8} {result['rss_model_mb']:>14} {result['rss_total_mb']:>14} "
+            f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['mean_ms']:>9}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Нагрузочный бенчмарк predict внутри процесса через ASGI транспорт httpx.
+
+    python -m src.benchmarks.load run --concurrency 1 8 32 --words 5 30 120 --output torch.json
+    python -m src.benchmarks.load compare torch.json onnx.json
+
+`run` измеряет p50/p95/p99 и RPS эндпоинта `/tasks/check/` для каждой пары
+(конкурентность, длина текста) и пропускную способность модели на батчах разного
+размера, затем сохраняет результат в JSON. `compare` сравнивает два таких файла.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from src.config import settings
+
+CORPUS_FILE = Path(__file__).resolve().parents[2] / 'tests' / 'fixtures' / 'corpus.json'
+HTTP_KEYS = ('concurrency', 'words')
+RAW_KEYS = ('batch_size',)
+# метрики, у которых рост означает улучшение
+HIGHER_IS_BETTER = {'rps', 'texts_per_s'}
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def make_texts(words: int, count: int) -> list[str]:
+    """Уникальные тексты заданной длины в словах, собранные из корпуса."""
+    vocabulary = ' '.join(json.loads(CORPUS_FILE.read_text(encoding='utf-8'))).split()
+    source = itertools.cycle(vocabulary)
+    return [f'{idx} ' + ' '.join(itertools.islice(source, max(1, words - 1))) for idx in range(count)]
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'elapsed_s': round(elapsed, 3),
+    }
+
+
+async def load_http(client: httpx.AsyncClient, concurrency: int, words: int, requests: int) -> dict:
+    texts = make_texts(words, requests)
+    queue = iter(texts)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        for text in queue:
+            started = time.perf_counter()
+            response = await client.post('/tasks/check/', json={'text': text})
+            latencies.append(time.perf_counter() - started)
+            errors += response.status_code != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'concurrency': concurrency,
+        'words': words,
+        'requests': requests,
+        'errors': errors,
+        'rps': round(requests / elapsed, 2),
+        **summarize(latencies, elapsed),
+    }
+
+
+def load_raw(runner, batch_size: int, words: int, iterations: int) -> dict:
+    texts = make_texts(words, batch_size)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        batch_started = time.perf_counter()
+        runner(texts)
+        latencies.append(time.perf_counter() - batch_started)
+    elapsed = time.perf_counter() - started
+    return {
+        'batch_size': batch_size,
+        'words': words,
+        'iterations': iterations,
+        'texts_per_s': round(batch_size * iterations / elapsed, 2),
+        **summarize(latencies, elapsed),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from src.main import app
+    from src.tasks.model_utils import cache, runner
+
+    if not args.with_cache:
+        cache.max_size = 0
+
+    result = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'label': args.label,
+            'python': platform.python_version(),
+            'settings': settings.model_dump(exclude={'cache_redis_url'}),
+            'cache': args.with_cache,
+        },
+        'http': [],
+        'raw': [],
+    }
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://predict', timeout=None) as client:
+            for concurrency, words in itertools.product(args.concurrency, args.words):
+                row = await load_http(client, concurrency, words, args.requests)
+                result['http'].append(row)
+                print(f"http  concurrency={concurrency:<4} words={words:<4} rps={row['rps']:<9} "
+                      f"p50={row['p50_ms']}ms p95={row['p95_ms']}ms p99={row['p99_ms']}ms errors={row['errors']}", file=sys.stderr)
+
+        for batch_size in args.batch_sizes:
+            row = load_raw(runner, batch_size, args.raw_words, args.raw_iterations)
+            result['raw'].append(row)
+            print(f"raw   batch_size={batch_size:<4} texts/s={row['texts_per_s']:<9} p50={row['p50_ms']}ms p95={row['p95_ms']}ms", file=sys.stderr)
+    return result
+
+
+def compare(base: dict, other: dict) -> list[str]:
+    """Построчное сравнение двух прогонов с относительным изменением метрик."""
+    lines = [f"{base['meta'].get('label') or 'base'} -> {other['meta'].get('label') or 'other'}"]
+    for section, keys, metrics in (
+        ('http', HTTP_KEYS, ('rps', 'p50_ms', 'p95_ms', 'p99_ms')),
+        ('raw', RAW_KEYS, ('texts_per_s', 'p50_ms', 'p95_ms')),
+    ):
+        other_rows = {tuple(row[key] for key in keys): row for row in other.get(section, [])}
+        for row in base.get(section, []):
+            row_key = tuple(row[key] for key in keys)
+            pair = other_rows.get(row_key)
+            if not pair:
+                continue
+            title = ' '.join(f'{key}={value}' for key, value in zip(keys, row_key))
+            changes = []
+            for metric in metrics:
+                before, after = row[metric], pair[metric]
+                delta = (after - before) / before * 100 if before else 0.0
+                better = delta > 0 if metric in HIGHER_IS_BETTER else delta < 0
+                mark = '+' if better else '-' if delta else ' '
+                changes.append(f'{metric} {before} -> {after} ({delta:+.1f}% {mark})')
+            lines.append(f'{section:<4} {title}: ' + ', '.join(changes))
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Нагрузочный бенчмарк predict.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run')
+    run_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    run_parser.add_argument('--words', type=int, nargs='+', default=[5, 30, 120])
+    run_parser.add_argument('--requests', type=int, default=200)
+    run_parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 64])
+    run_parser.add_argument('--raw-words', type=int, default=30)
+    run_parser.add_argument('--raw-iterations', type=int, default=20)
+    run_parser.add_argument('--with-cache', action='store_true', help='не отключать кэш предсказаний')
+    run_parser.add_argument('--label', default='')
+    run_parser.add_argument('--output', type=Path)
+
+    compare_parser = subparsers.add_parser('compare')
+    compare_parser.add_argument('base', type=Path)
+    compare_parser.add_argument('other', type=Path)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        base, other = (json.loads(path.read_text(encoding='utf-8')) for path in (args.base, args.other))
+        print('\n'.join(compare(base, other)))
+        return
+
+    result = json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(result, encoding='utf-8')
+    else:
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Потребление памяти воркерами predict: RSS и PSS на процесс для 1, 2 и 4 воркеров.
+
+    python -m src.benchmarks.memory [--workers 1 2 4] [--no-mmap]
+
+PSS делит общие страницы между процессами, поэтому при mmap весов суммарный PSS
+растёт медленнее суммарного RSS. Воркеры запускаются через spawn, как в uvicorn.
+"""
+import argparse
+import multiprocessing
+from pathlib import Path
+
+from src.config import settings
+
+
+def memory_mb(pid: int | str = 'self') -> dict:
+    """RSS и PSS процесса в МБ по /proc/<pid>/smaps_rollup."""
+    values = {}
+    for line in Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines():
+        key, _, rest = line.partition(':')
+        if key in ('Rss', 'Pss', 'Shared_Clean', 'Private_Dirty'):
+            values[key.lower()] = int(rest.split()[0]) / 1024
+    return values
+
+
+def worker(mmap_weights: bool, loaded, stop) -> None:
+    from src.tasks.model_utils import WARMUP_TEXTS, runner
+
+    settings.mmap_weights = mmap_weights
+    runner.load()
+    runner(WARMUP_TEXTS)
+    loaded.release()
+    stop.wait()
+
+
+def measure(workers: int, mmap_weights: bool) -> list[dict]:
+    context = multiprocessing.get_context('spawn')
+    loaded = context.Semaphore(0)
+    stop = context.Event()
+    processes = [context.Process(target=worker, args=(mmap_weights, loaded, stop)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for _ in processes:
+            loaded.acquire()
+        return [memory_mb(process.pid) for process in processes]
+    finally:
+        stop.set()
+        for process in processes:
+            process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Бенчмарк памяти воркеров predict.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--no-mmap', action='store_true', help='загружать веса через from_pretrained')
+    args = parser.parse_args()
+
+    mmap_weights = not args.no_mmap
+    print(f'backend: {settings.backend}, mmap: {mmap_weights}')
+    print(f"{'workers':>7} {'worker':>6} {'RSS, MB':>9} {'PSS, MB':>9} {'shared, MB':>11} {'private, MB':>12}")
+    for workers in args.workers:
+        results = measure(workers, mmap_weights)
+        for idx, result in enumerate(results, 1):
+            print(
+                f"{workers:>7} {idx:>6} {result['rss']:>9.1f} {result['pss']:>9.1f} "
+                f"{result['shared_clean']:>11.1f} {result['private_dirty']:>12.1f}"
+            )
+        total_rss = sum(result['rss'] for result in results)
+        total_pss = sum(result['pss'] for result in results)
+        print(f"{workers:>7} {'total':>6} {total_rss:>9.1f} {total_pss:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
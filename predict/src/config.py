@@ -6,9 +6,34 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     model_config: SettingsConfigDict = SettingsConfigDict(env_prefix='MODEL_')
 
+    backend: str = 'torch'
+    onnx_quantized: bool = False
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    warmup_iterations: int = 3
+    mmap_weights: bool = True
+    # при нескольких воркерах intra_op_threads стоит задавать как число ядер / workers
+    workers: int = 1
+    host: str = '0.0.0.0'
+    port: int = 8100
+    # путь к Unix-сокету, если predict работает рядом с Django, вместо host/port
+    uds: str | None = None
+
+    batch_max_size: int = 32
+    batch_max_wait_ms: float = 5
+    batch_chunk_size: int = 64
+
+    cache_max_size: int = 10000
+    cache_ttl: float = 600
+    cache_redis_url: str | None = None
+
     @property
     def base_dir(self) -> Path:
         return Path(__file__).resolve().parent
 
+    @property
+    def model_path(self) -> Path:
+        return self.base_dir / 'tasks' / 'distil_bert'
+
 
 settings = Settings()
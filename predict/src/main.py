@@ -1,7 +1,20 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from .routers import routers
+from .tasks.model_utils import cache, engine, warm_up
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await engine.start()
+    await warm_up()
+    yield
+    await engine.stop()
+    await cache.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(routers)
@@ -0,0 +1,116 @@
+"""
+Метрики predict в текстовом формате Prometheus.
+
+Значения хранятся в памяти процесса: при нескольких воркерах каждый
+отдаёт на `/metrics` свои собственные счётчики.
+"""
+import bisect
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    items = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    return '{' + items + '}'
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, label: str | None = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, value: float = 1, label_value: str | None = None) -> None:
+        with self.lock:
+            self.values[label_value] += value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self.lock:
+            values = dict(self.values)
+        for label_value, value in sorted(values.items(), key=lambda item: str(item[0])):
+            labels = {self.label: label_value} if self.label else {}
+            yield f'{self.name}{format_labels(labels)} {format_value(value)}'
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else format_value(bound)
+            yield f'{self.name}_bucket{format_labels({"le": le})} {cumulative}'
+        yield f'{self.name}_sum {format_value(total)}'
+        yield f'{self.name}_count {cumulative}'
+
+
+class Gauge:
+    """Значение, вычисляемое в момент отдачи метрик."""
+
+    def __init__(self, name: str, documentation: str, getter: Callable[[], float], metric_type: str = 'gauge') -> None:
+        self.name = name
+        self.documentation = documentation
+        self.getter = getter
+        self.metric_type = metric_type
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.metric_type}'
+        yield f'{self.name} {format_value(self.getter())}'
+
+
+class Registry:
+
+    def __init__(self) -> None:
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = Registry()
+
+REQUEST_TIME = registry.register(Histogram('predict_request_seconds', 'Полное время обработки текста, включая кэш и очередь.'))
+QUEUE_WAIT = registry.register(Histogram('predict_queue_wait_seconds', 'Время ожидания текста в очереди до начала обработки батча.'))
+TOKENIZE_TIME = registry.register(Histogram('predict_tokenize_seconds', 'Время токенизации батча.'))
+FORWARD_TIME = registry.register(Histogram('predict_forward_seconds', 'Время forward pass батча.'))
+TOKEN_LENGTH = registry.register(Histogram('predict_input_tokens', 'Длина текста в токенах.', TOKEN_BUCKETS))
+BATCH_SIZE = registry.register(Histogram('predict_batch_size', 'Количество текстов в батче.', BATCH_BUCKETS))
+PREDICTIONS = registry.register(Counter('predict_predictions_total', 'Количество предсказаний по классам.', 'predicted_class'))
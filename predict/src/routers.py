@@ -1,7 +1,23 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response, status
+from fastapi.responses import PlainTextResponse
 
+from .metrics import registry
+from .tasks.model_utils import runner
 from .tasks.routers import router as tasks_routers
 
 routers = APIRouter()
 
+
+@routers.get("/ready", tags=["health"])
+async def ready(response: Response):
+    if not runner.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": runner.ready}
+
+
+@routers.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 routers.include_router(tasks_routers, prefix="/tasks", tags=["task-prediction"])
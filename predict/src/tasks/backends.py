@@ -0,0 +1,76 @@
+from pathlib import Path
+
+import numpy as np
+
+from .mmap_weights import SAFETENSORS_FILE, load_mmap_model
+
+TORCH = 'torch'
+ONNX = 'onnx'
+
+ONNX_FILE = 'model.onnx'
+ONNX_QUANTIZED_FILE = 'model.int8.onnx'
+
+
+class TorchBackend:
+    """Исходная fp32 модель DistilBERT на PyTorch, при `mmap_weights` веса берутся из mmap safetensors."""
+    name = TORCH
+
+    def __init__(self, model_path: Path, intra_op_threads: int = 0, inter_op_threads: int = 0, mmap_weights: bool = False) -> None:
+        import torch
+        from transformers import DistilBertForSequenceClassification
+
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        if inter_op_threads:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError:
+                # уже задано в этом процессе, повторно менять torch не позволяет
+                pass
+        self.torch = torch
+        if mmap_weights and (Path(model_path) / SAFETENSORS_FILE).exists():
+            self.model = load_mmap_model(model_path)
+        else:
+            self.model = DistilBertForSequenceClassification.from_pretrained(model_path)
+            self.model.eval()
+
+    def logits(self, encoded_input: dict[str, np.ndarray]) -> np.ndarray:
+        inputs = {key: self.torch.from_numpy(value) for key, value in encoded_input.items()}
+        with self.torch.no_grad():
+            outputs = self.model(**inputs)
+        return outputs.logits.numpy()
+
+
+class OnnxBackend:
+    """Экспортированный ONNX граф (опционально int8) на CPU провайдере onnxruntime."""
+    name = ONNX
+
+    def __init__(self, model_path: Path, quantized: bool = False, intra_op_threads: int = 0, inter_op_threads: int = 0) -> None:
+        import onnxruntime
+
+        onnx_file = Path(model_path) / (ONNX_QUANTIZED_FILE if quantized else ONNX_FILE)
+        if not onnx_file.exists():
+            raise FileNotFoundError(f'ONNX модель не найдена: {onnx_file}. Выполните `python -m src.tasks.export_onnx`.')
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.session = onnxruntime.InferenceSession(str(onnx_file), options, providers=['CPUExecutionProvider'])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def logits(self, encoded_input: dict[str, np.ndarray]) -> np.ndarray:
+        inputs = {key: value.astype(np.int64) for key, value in encoded_input.items() if key in self.input_names}
+        return self.session.run(['logits'], inputs)[0]
+
+
+def load_backend(name: str,
+                 model_path: Path,
+                 quantized: bool = False,
+                 intra_op_threads: int = 0,
+                 inter_op_threads: int = 0,
+                 mmap_weights: bool = False) -> TorchBackend | OnnxBackend:
+    """Возвращает backend модели по имени из настроек. Количество потоков 0 — значение библиотеки по умолчанию."""
+    if name == TORCH:
+        return TorchBackend(model_path, intra_op_threads, inter_op_threads, mmap_weights)
+    if name == ONNX:
+        return OnnxBackend(model_path, quantized, intra_op_threads, inter_op_threads)
+    raise ValueError(f'Неизвестный backend модели: {name}')
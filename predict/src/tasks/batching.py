@@ -0,0 +1,125 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Sequence
+
+from src.metrics import BATCH_SIZE, QUEUE_WAIT
+
+
+class BatchInferenceEngine:
+    """
+    Динамический микро-батчинг запросов к модели.
+
+    Входящие элементы складываются в очередь, откуда фоновая задача собирает
+    батч до `max_batch_size` элементов или до истечения `max_wait_ms` с момента
+    прихода первого элемента. Батч целиком обрабатывается `handler` в отдельном
+    потоке, поэтому event loop FastAPI не блокируется на forward pass.
+
+    ### Args:
+    - handler (`Callable[[list], Sequence]`): Синхронная функция, возвращающая результат для каждого элемента батча.
+    - max_batch_size (`int`): Максимальный размер батча.
+    - max_wait_ms (`float`): Максимальное время ожидания добора батча, мс.
+
+    """
+
+    def __init__(self, handler: Callable[[list], Sequence], max_batch_size: int = 32, max_wait_ms: float = 5) -> None:
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000
+        self.queue: asyncio.Queue | None = None
+        self.worker: asyncio.Task | None = None
+        self.executor: ThreadPoolExecutor | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.worker is not None and not self.worker.done()
+
+    async def start(self) -> None:
+        """Запускает фоновую задачу сборки батчей в текущем event loop."""
+        if self.is_running:
+            return
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self.worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает сборку батчей и отменяет ожидающие запросы."""
+        if self.worker:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        if self.queue:
+            while not self.queue.empty():
+                _, future, _ = self.queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def submit(self, item: Any) -> Any:
+        """Ставит элемент в очередь и ожидает результат его обработки в батче."""
+        if not self.is_running:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def run_batch(self, items: list) -> Sequence:
+        """Обрабатывает готовый батч в том же потоке, что и очередь, минуя сборку."""
+        if not self.is_running:
+            await self.start()
+        BATCH_SIZE.observe(len(items))
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.handler, items)
+
+    async def _collect_batch(self, batch: list[tuple[Any, asyncio.Future, float]]) -> None:
+        """Собирает батч по размеру или по истечении времени ожидания."""
+        loop = asyncio.get_running_loop()
+        batch.append(await self.queue.get())
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self) -> None:
+        while True:
+            batch = []
+            try:
+                await self._collect_batch(batch)
+                await self._process_batch([entry for entry in batch if not entry[1].done()])
+            except asyncio.CancelledError:
+                for _, future, _ in batch:
+                    future.cancel()
+                raise
+
+    async def _process_batch(self, batch: list[tuple[Any, asyncio.Future, float]]) -> None:
+        """Обрабатывает батч вне event loop и раздаёт результаты ожидающим."""
+        if not batch:
+            return
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        for *_, enqueued_at in batch:
+            QUEUE_WAIT.observe(started - enqueued_at)
+        BATCH_SIZE.observe(len(batch))
+        items = [item for item, *_ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, self.handler, items)
+        except Exception as err:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
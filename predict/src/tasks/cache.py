@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+def cache_key(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+class PredictionCache:
+    """
+    Двухуровневый кэш результатов предсказания.
+
+    Первый уровень — LRU в памяти процесса с TTL, второй — Redis, общий для всех
+    воркеров predict. Попадание во второй уровень прогревает первый.
+
+    ### Args:
+    - max_size (`int`): Максимальное количество записей в памяти, 0 отключает кэш.
+    - ttl (`float`): Время жизни записи, сек.
+    - redis_client (optional): Асинхронный клиент Redis для второго уровня.
+    - prefix (`str`, optional): Префикс ключей в Redis.
+    - clock (`Callable[[], float]`, optional): Источник времени.
+
+    """
+
+    def __init__(self, max_size: int, ttl: float, redis_client=None, prefix: str = 'predict:', clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.clock = clock
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.stats = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    async def get(self, key: str) -> Any | None:
+        if not self.enabled:
+            return None
+        entry = self.entries.get(key)
+        if entry:
+            expires_at, value = entry
+            if expires_at > self.clock():
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return value
+            del self.entries[key]
+            self.stats['expired'] += 1
+
+        value = await self._redis_get(key)
+        if value is not None:
+            self.stats['redis_hits'] += 1
+            self._store(key, value)
+            return value
+
+        self.stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._store(key, value)
+        await self._redis_set(key, value)
+
+    async def close(self) -> None:
+        if self.redis_client:
+            await self.redis_client.aclose()
+
+    def metrics(self) -> dict:
+        lookups = self.stats['hits'] + self.stats['redis_hits'] + self.stats['misses']
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.stats['hits'],
+            'redis_hits': self.stats['redis_hits'],
+            'misses': self.stats['misses'],
+            'evictions': self.stats['evictions'],
+            'expired': self.stats['expired'],
+            'redis_errors': self.stats['redis_errors'],
+            'hit_rate': round((lookups - self.stats['misses']) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _store(self, key: str, value: Any) -> None:
+        self.entries[key] = (self.clock() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    async def _redis_get(self, key: str) -> Any | None:
+        if not self.redis_client:
+            return None
+        try:
+            raw = await self.redis_client.get(self.prefix + key)
+        except Exception as err:
+            self.stats['redis_errors'] += 1
+            logger.warning('Ошибка чтения кэша из Redis: %s', err)
+            return None
+        return json.loads(raw) if raw else None
+
+    async def _redis_set(self, key: str, value: Any) -> None:
+        if not self.redis_client:
+            return
+        try:
+            await self.redis_client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), px=int(self.ttl * 1000))
+        except Exception as err:
+            self.stats['redis_errors'] += 1
+            logger.warning('Ошибка записи кэша в Redis: %s', err)
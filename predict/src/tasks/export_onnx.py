@@ -0,0 +1,60 @@
+"""
+Экспорт DistilBERT в ONNX и int8 динамическая квантизация.
+
+    python -m src.tasks.export_onnx [--quantize]
+"""
+import argparse
+from pathlib import Path
+
+import torch
+from src.config import settings
+from transformers import (DistilBertForSequenceClassification,
+                          DistilBertTokenizer)
+
+from .backends import ONNX_FILE, ONNX_QUANTIZED_FILE
+
+
+def export(model_path: Path, opset: int = 17) -> Path:
+    model = DistilBertForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    tokenizer = DistilBertTokenizer.from_pretrained(model_path)
+    sample = tokenizer(['напомни завтра в 10 позвонить маме'], padding=True, truncation=True, return_tensors='pt')
+
+    onnx_file = model_path / ONNX_FILE
+    dynamic_axes = {'input_ids': {0: 'batch', 1: 'sequence'}, 'attention_mask': {0: 'batch', 1: 'sequence'}, 'logits': {0: 'batch'}}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample['input_ids'], sample['attention_mask']),
+            str(onnx_file),
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    return onnx_file
+
+
+def quantize(onnx_file: Path) -> Path:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_file = onnx_file.with_name(ONNX_QUANTIZED_FILE)
+    quantize_dynamic(str(onnx_file), str(quantized_file), weight_type=QuantType.QInt8)
+    return quantized_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Экспорт модели DistilBERT в ONNX.')
+    parser.add_argument('--model-path', type=Path, default=settings.model_path)
+    parser.add_argument('--quantize', action='store_true', help='дополнительно сохранить int8 версию')
+    parser.add_argument('--opset', type=int, default=17)
+    args = parser.parse_args()
+
+    onnx_file = export(args.model_path, args.opset)
+    print(f'Экспортировано: {onnx_file}')
+    if args.quantize:
+        print(f'Квантизовано: {quantize(onnx_file)}')
+
+
+if __name__ == '__main__':
+    main()
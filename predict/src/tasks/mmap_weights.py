@@ -0,0 +1,83 @@
+"""
+Загрузка весов из safetensors через read-only mmap.
+
+Тензоры модели создаются поверх отображённого в память файла и не копируются,
+поэтому несколько процессов predict используют одни и те же физические страницы
+page cache. Конвертация имеющихся весов в safetensors:
+
+    python -m src.tasks.mmap_weights
+"""
+import json
+import mmap
+import struct
+from pathlib import Path
+
+SAFETENSORS_FILE = 'model.safetensors'
+
+DTYPES = {
+    'F64': 'float64',
+    'F32': 'float32',
+    'F16': 'float16',
+    'BF16': 'bfloat16',
+    'I64': 'int64',
+    'I32': 'int32',
+    'I16': 'int16',
+    'I8': 'int8',
+    'U8': 'uint8',
+    'BOOL': 'bool',
+}
+
+
+def load_mmap_state_dict(weights_file: Path) -> dict:
+    """Возвращает state_dict, тензоры которого ссылаются на страницы mmap файла."""
+    import torch
+
+    with open(weights_file, 'rb') as file:
+        # ACCESS_COPY: страницы общие, пока в них не пишут; запись в веса не затронет файл
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    header_size = struct.unpack('<Q', buffer[:8])[0]
+    header = json.loads(buffer[8:8 + header_size])
+    data_offset = 8 + header_size
+
+    state_dict = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = getattr(torch, DTYPES[info['dtype']])
+        start, end = info['data_offsets']
+        count = (end - start) // torch.empty((), dtype=dtype).element_size()
+        if count:
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_offset + start)
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        state_dict[name] = tensor.reshape(info['shape'])
+    return state_dict
+
+
+def load_mmap_model(model_path: Path):
+    """Создаёт DistilBERT и подменяет его параметры тензорами из mmap без копирования."""
+    from transformers import (DistilBertConfig,
+                              DistilBertForSequenceClassification)
+
+    config = DistilBertConfig.from_pretrained(model_path)
+    model = DistilBertForSequenceClassification(config)
+    model.load_state_dict(load_mmap_state_dict(Path(model_path) / SAFETENSORS_FILE), assign=True)
+    model.eval()
+    return model
+
+
+def convert(model_path: Path) -> Path:
+    """Сохраняет веса модели в safetensors рядом с исходными."""
+    from safetensors.torch import save_model
+    from transformers import DistilBertForSequenceClassification
+
+    model = DistilBertForSequenceClassification.from_pretrained(model_path)
+    weights_file = Path(model_path) / SAFETENSORS_FILE
+    save_model(model, str(weights_file))
+    return weights_file
+
+
+if __name__ == '__main__':
+    from src.config import settings
+
+    print(f'Сохранено: {convert(settings.model_path)}')
@@ -1,22 +1,182 @@
-import torch
+import asyncio
+import json
+import logging
+import time
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator
+
+import numpy as np
 from src.config import settings
-from transformers import (DistilBertForSequenceClassification,
-                          DistilBertTokenizer)
-
-model_path = f"{settings.base_dir}/tasks/distil_bert/"
-model = DistilBertForSequenceClassification.from_pretrained(model_path)
-tokenizer = DistilBertTokenizer.from_pretrained(model_path)
-
-
-async def predict(text: str):
-    encoded_input = tokenizer(text, padding=True, truncation=True, return_tensors="pt")
-    with torch.no_grad():
-        outputs = model(**encoded_input)
-
-    predictions = torch.softmax(outputs.logits, dim=1)
-    predicted_class = torch.argmax(predictions, dim=1).item()
-    predict = {
-        0: 'chat_gpt',
-        1: 'task'
-    }
-    return predict[predicted_class]
+from src.metrics import (FORWARD_TIME, PREDICTIONS, REQUEST_TIME, TOKEN_LENGTH,
+                         TOKENIZE_TIME, Gauge, registry)
+from transformers import DistilBertTokenizer
+
+from .backends import load_backend
+from .batching import BatchInferenceEngine
+from .cache import PredictionCache, cache_key
+
+logger = logging.getLogger('uvicorn.error')
+
+LABELS = {
+    0: 'chat_gpt',
+    1: 'task'
+}
+
+# классы многоинтентной модели: дешёвые интенты обрабатываются ботом без GPT
+INTENT_LABELS = (
+    'chat_gpt',
+    'task',
+    'weather',
+    'show_notes',
+    'delete_note',
+    'joke',
+)
+
+WARMUP_TEXTS = [
+    'Ева, напомни завтра в 10 утра позвонить маме',
+    'Объясни, чем отличается список от кортежа в Python',
+    'Привет',
+    'Каждый понедельник в 9 планёрка, напоминай за 30 минут до начала и не забудь про отчёт по задачам',
+]
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def resolve_labels(model_path: Path) -> dict[int, str]:
+    """
+    Имена классов из `id2label` конфига модели.
+
+    Модель, обученная без имён классов (`LABEL_0`, `LABEL_1`, ...), считается
+    бинарной моделью `chat_gpt`/`task`.
+
+    ### Args:
+    - model_path (`Path`): Каталог модели с `config.json`.
+
+    """
+    try:
+        id2label = json.loads((model_path / 'config.json').read_text()).get('id2label') or {}
+    except (OSError, ValueError):
+        return LABELS
+    labels = {int(idx): label for idx, label in id2label.items()}
+    if not labels or not set(labels.values()) <= set(INTENT_LABELS):
+        return LABELS
+    return labels
+
+
+class ModelRunner:
+    """Модель и токенизатор, загружаемые при старте приложения, а не при импорте."""
+
+    def __init__(self) -> None:
+        self.backend = None
+        self.tokenizer = None
+        self.labels = LABELS
+        self.ready = False
+
+    def load(self) -> None:
+        started = time.perf_counter()
+        self.backend = load_backend(
+            settings.backend,
+            settings.model_path,
+            settings.onnx_quantized,
+            settings.intra_op_threads,
+            settings.inter_op_threads,
+            settings.mmap_weights,
+        )
+        self.tokenizer = DistilBertTokenizer.from_pretrained(settings.model_path)
+        self.labels = resolve_labels(settings.model_path)
+        logger.info(
+            'Модель %s загружена за %.2f с, классы: %s',
+            settings.backend, time.perf_counter() - started, ', '.join(self.labels.values()),
+        )
+
+    def __call__(self, texts: list[str]) -> list[dict]:
+        """Один padded forward pass для всего батча текстов."""
+        started = time.perf_counter()
+        encoded_input = self.tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+        tokenized = time.perf_counter()
+        logits = self.backend.logits(dict(encoded_input))
+        FORWARD_TIME.observe(time.perf_counter() - tokenized)
+        TOKENIZE_TIME.observe(tokenized - started)
+        for length in encoded_input['attention_mask'].sum(axis=1).tolist():
+            TOKEN_LENGTH.observe(length)
+
+        predictions = softmax(logits)
+        predicted_classes = predictions.argmax(axis=1).tolist()
+        return [
+            {
+                'predicted_class': self.labels[predicted_class],
+                'confidence': row[predicted_class],
+                'probabilities': {self.labels[idx]: probability for idx, probability in enumerate(row)},
+            }
+            for predicted_class, row in zip(predicted_classes, predictions.tolist())
+        ]
+
+
+runner = ModelRunner()
+engine = BatchInferenceEngine(
+    runner,
+    max_batch_size=settings.batch_max_size,
+    max_wait_ms=settings.batch_max_wait_ms,
+)
+
+
+def init_cache() -> PredictionCache:
+    redis_client = None
+    if settings.cache_redis_url:
+        from redis import asyncio as aioredis
+
+        redis_client = aioredis.from_url(settings.cache_redis_url)
+    return PredictionCache(settings.cache_max_size, settings.cache_ttl, redis_client, prefix=f'predict:{settings.backend}:')
+
+
+cache = init_cache()
+
+for name in ('hits', 'redis_hits', 'misses', 'evictions', 'expired'):
+    registry.register(Gauge(f'predict_cache_{name}_total', f'Кэш предсказаний: {name}.', partial(cache.stats.__getitem__, name), 'counter'))
+registry.register(Gauge('predict_cache_size', 'Количество записей в кэше предсказаний.', lambda: len(cache.entries)))
+
+
+async def warm_up(iterations: int = settings.warmup_iterations) -> None:
+    """Загружает модель и прогоняет прогревочные батчи через поток инференса."""
+    # загрузка в потоке инференса, чтобы настройки потоков torch применились к нему
+    await asyncio.get_running_loop().run_in_executor(engine.executor, runner.load)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await engine.run_batch(WARMUP_TEXTS[:1])
+        await engine.run_batch(WARMUP_TEXTS)
+    runner.ready = True
+    logger.info('Прогрев модели (%s итераций) занял %.2f с', iterations, time.perf_counter() - started)
+
+
+async def predict(text: str) -> dict:
+    """Класс текста, уверенность модели и вероятности по всем классам."""
+    started = time.perf_counter()
+    key = cache_key(text)
+    result = await cache.get(key)
+    if result is None:
+        result = await engine.submit(text)
+        await cache.set(key, result)
+    PREDICTIONS.inc(label_value=result['predicted_class'])
+    REQUEST_TIME.observe(time.perf_counter() - started)
+    return result
+
+
+async def predict_chunks(texts: list[str], chunk_size: int = settings.batch_chunk_size) -> AsyncIterator[list[dict]]:
+    """Классифицирует тексты последовательными батчами фиксированного размера, модель считает только промахи кэша."""
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        keys = [cache_key(text) for text in chunk]
+        results = [await cache.get(key) for key in keys]
+        missed = [idx for idx, result in enumerate(results) if result is None]
+        if missed:
+            computed = await engine.run_batch([chunk[idx] for idx in missed])
+            for idx, result in zip(missed, computed):
+                results[idx] = result
+                await cache.set(keys[idx], result)
+        for result in results:
+            PREDICTIONS.inc(label_value=result['predicted_class'])
+        yield results
@@ -1,7 +1,12 @@
+import json
+from typing import AsyncIterator
+
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
+from src.config import settings
 
-from .model_utils import predict
-from .schemas import Task
+from .model_utils import cache, predict, predict_chunks
+from .schemas import Task, TaskBatch
 
 router = APIRouter()
 
@@ -9,7 +14,40 @@ router = APIRouter()
 @router.post("/check/", status_code=status.HTTP_200_OK)
 async def get_task_predict(task: Task):
     try:
-        prediction = await predict(task.text)
-        return {"predicted_class": prediction}
+        return await predict(task.text)
     except Exception as e:
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+async def stream_predictions(texts: list[str]) -> AsyncIterator[str]:
+    index = 0
+    try:
+        async for chunk in predict_chunks(texts):
+            for result in chunk:
+                yield json.dumps({"index": index, **result}, ensure_ascii=False) + "\n"
+                index += 1
+    except Exception as e:
+        yield json.dumps({"index": index, "error": str(e)}, ensure_ascii=False) + "\n"
+
+
+@router.post("/check/batch/", status_code=status.HTTP_200_OK)
+async def get_batch_predict(batch: TaskBatch):
+    """
+    Классификация списка текстов.
+
+    Если текстов не больше `MODEL_BATCH_CHUNK_SIZE`, возвращается JSON со списком
+    `predictions`. Иначе результаты отдаются потоком NDJSON по мере обработки чанков,
+    по одной строке `{"index", "predicted_class", "confidence", "probabilities"}` на текст.
+    """
+    if len(batch.texts) > settings.batch_chunk_size:
+        return StreamingResponse(stream_predictions(batch.texts), media_type="application/x-ndjson")
+    try:
+        predictions = [result async for chunk in predict_chunks(batch.texts) for result in chunk]
+        return {"predictions": predictions}
+    except Exception as e:
+        raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@router.get("/cache/", status_code=status.HTTP_200_OK)
+async def get_cache_metrics():
+    return cache.metrics()
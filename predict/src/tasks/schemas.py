@@ -1,5 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Task(BaseModel):
     text: str
+
+
+class TaskBatch(BaseModel):
+    texts: list[str] = Field(min_length=1)
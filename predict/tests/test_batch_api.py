@@ -0,0 +1,108 @@
+import json
+from unittest import TestCase, mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from src.config import settings
+from src.routers import routers
+from src.tasks.cache import PredictionCache
+
+
+def prediction(text):
+    predicted_class = 'task' if text.startswith('напомни') else 'chat_gpt'
+    return {'predicted_class': predicted_class, 'confidence': 0.9, 'probabilities': {predicted_class: 0.9}, 'text': text}
+
+
+class BatchPredictApiTest(TestCase):
+
+    def setUp(self):
+        self.batches = []
+
+        async def run_batch(texts):
+            self.batches.append(list(texts))
+            return [prediction(text) for text in texts]
+
+        patchers = [
+            mock.patch('src.tasks.model_utils.engine.run_batch', run_batch),
+            mock.patch('src.tasks.model_utils.cache', PredictionCache(max_size=1000, ttl=60)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app = FastAPI()
+        app.include_router(routers)
+        self.client = TestClient(app)
+
+    def post(self, texts):
+        return self.client.post('/tasks/check/batch/', json={'texts': texts})
+
+    def test_small_batch_returns_json(self):
+        """До `batch_chunk_size` текстов ответ — JSON со списком predictions в порядке запроса."""
+        texts = ['напомни про встречу', 'как дела?', 'напомни купить хлеб']
+
+        response = self.post(texts)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-type'], 'application/json')
+        predictions = response.json()['predictions']
+        self.assertEqual([item['text'] for item in predictions], texts)
+        self.assertEqual([item['predicted_class'] for item in predictions], ['task', 'chat_gpt', 'task'])
+        self.assertEqual(set(predictions[0]), {'predicted_class', 'confidence', 'probabilities', 'text'})
+        self.assertEqual(self.batches, [texts])
+
+    def test_repeated_texts_keep_order(self):
+        """Повторы внутри батча считаются из кэша и возвращаются на своих местах."""
+        texts = ['как дела?', 'напомни позвонить', 'как дела?']
+
+        predictions = self.post(texts).json()['predictions']
+
+        self.assertEqual([item['text'] for item in predictions], texts)
+
+    def test_large_batch_streams_ndjson(self):
+        """Больше `batch_chunk_size` текстов отдаются NDJSON построчно с индексом текста."""
+        texts = [f'текст {idx}' for idx in range(settings.batch_chunk_size + 1)]
+
+        response = self.post(texts)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([line['index'] for line in lines], list(range(len(texts))))
+        self.assertEqual([line['text'] for line in lines], texts)
+        self.assertTrue(all({'predicted_class', 'confidence', 'probabilities'} <= set(line) for line in lines))
+
+    def test_oversized_batch_processed_in_chunks(self):
+        """Батч в несколько `batch_chunk_size` считается последовательными чанками, порядок сохраняется."""
+        size = settings.batch_chunk_size
+        texts = [f'текст {idx}' for idx in range(size * 2 + 5)]
+
+        lines = [json.loads(line) for line in self.post(texts).text.splitlines()]
+
+        self.assertEqual([len(batch) for batch in self.batches], [size, size, 5])
+        self.assertEqual([line['text'] for line in lines], texts)
+
+    def test_stream_error_is_reported_in_line(self):
+        """Ошибка модели посреди потока передаётся строкой с индексом первого необработанного текста."""
+        size = settings.batch_chunk_size
+        texts = [f'текст {idx}' for idx in range(size * 2)]
+
+        async def run_batch(chunk):
+            if self.batches:
+                raise RuntimeError('модель недоступна')
+            self.batches.append(chunk)
+            return [prediction(text) for text in chunk]
+
+        with mock.patch('src.tasks.model_utils.engine.run_batch', run_batch):
+            lines = [json.loads(line) for line in self.post(texts).text.splitlines()]
+
+        self.assertEqual(len(lines), size + 1)
+        self.assertEqual(lines[-1], {'index': size, 'error': 'модель недоступна'})
+
+    def test_empty_batch_rejected(self):
+        response = self.post([])
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.batches, [])
+
+    def test_texts_required(self):
+        self.assertEqual(self.client.post('/tasks/check/batch/', json={}).status_code, 422)
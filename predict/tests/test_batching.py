@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase
+
+from src.tasks.batching import BatchInferenceEngine
+
+
+class BatchInferenceEngineTest(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.batches = []
+        self.threads = set()
+
+        def handler(items):
+            self.batches.append(list(items))
+            self.threads.add(threading.get_ident())
+            return [item.upper() for item in items]
+
+        self.engine = BatchInferenceEngine(handler, max_batch_size=4, max_wait_ms=20)
+        await self.engine.start()
+
+    async def asyncTearDown(self):
+        await self.engine.stop()
+
+    async def test_concurrent_requests_are_batched(self):
+        """Одновременные запросы обрабатываются одним батчем, каждый получает свой результат."""
+        results = await asyncio.gather(*(self.engine.submit(text) for text in ('a', 'b', 'c')))
+
+        self.assertEqual(results, ['A', 'B', 'C'])
+        self.assertEqual(self.batches, [['a', 'b', 'c']])
+
+    async def test_batch_size_is_limited(self):
+        """Батч не превышает max_batch_size."""
+        texts = [str(i) for i in range(10)]
+        results = await asyncio.gather(*(self.engine.submit(text) for text in texts))
+
+        self.assertEqual(results, texts)
+        self.assertTrue(all(len(batch) <= 4 for batch in self.batches))
+        self.assertEqual(sum(len(batch) for batch in self.batches), 10)
+
+    async def test_handler_runs_off_event_loop(self):
+        """Вычисления выполняются вне потока event loop."""
+        await self.engine.submit('a')
+
+        self.assertNotIn(threading.get_ident(), self.threads)
+
+    async def test_handler_error_is_propagated(self):
+        """Ошибка обработчика передаётся каждому ожидающему запросу батча."""
+        def broken_handler(items):
+            raise ValueError('boom')
+
+        self.engine.handler = broken_handler
+        results = await asyncio.gather(self.engine.submit('a'), self.engine.submit('b'), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_cancelled_request_is_skipped(self):
+        """Отменённый до обработки запрос не попадает в батч."""
+        cancelled = asyncio.create_task(self.engine.submit('x'))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        self.assertEqual(await self.engine.submit('y'), 'Y')
+        self.assertNotIn('x', sum(self.batches, []))
+
+    async def test_run_batch_bypasses_queue(self):
+        """Готовый батч обрабатывается целиком одним вызовом обработчика."""
+        results = await self.engine.run_batch(['a', 'b', 'c', 'd', 'e'])
+
+        self.assertEqual(results, ['A', 'B', 'C', 'D', 'E'])
+        self.assertEqual(self.batches, [['a', 'b', 'c', 'd', 'e']])
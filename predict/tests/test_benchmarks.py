@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+from src.benchmarks.load import compare, make_texts, percentile
+
+
+class LoadBenchmarkTest(TestCase):
+
+    def test_percentile_nearest_rank(self):
+        """Перцентиль считается по ближайшему рангу."""
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_texts_are_unique_and_sized(self):
+        """Тексты уникальны и имеют заданное количество слов."""
+        texts = make_texts(10, 5)
+
+        self.assertEqual(len(set(texts)), 5)
+        self.assertTrue(all(len(text.split()) == 10 for text in texts))
+
+    def test_compare_matches_rows_by_parameters(self):
+        """Сравниваются строки с одинаковыми параметрами, направление улучшения учитывается."""
+        base = {'meta': {'label': 'torch'}, 'http': [{'concurrency': 8, 'words': 5, 'rps': 100, 'p50_ms': 10, 'p95_ms': 20, 'p99_ms': 30}], 'raw': []}
+        other = {'meta': {'label': 'onnx'}, 'http': [{'concurrency': 8, 'words': 5, 'rps': 150, 'p50_ms': 5, 'p95_ms': 20, 'p99_ms': 33}], 'raw': []}
+
+        lines = compare(base, other)
+
+        self.assertEqual(lines[0], 'torch -> onnx')
+        self.assertIn('rps 100 -> 150 (+50.0% +)', lines[1])
+        self.assertIn('p50_ms 10 -> 5 (-50.0% +)', lines[1])
+        self.assertIn('p99_ms 30 -> 33 (+10.0% -)', lines[1])
@@ -0,0 +1,81 @@
+from unittest import IsolatedAsyncioTestCase
+
+from src.tasks.cache import PredictionCache, cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value.encode('utf-8')
+
+
+class PredictionCacheTest(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = PredictionCache(max_size=2, ttl=10, clock=self.clock)
+
+    def test_key_uses_normalized_text(self):
+        """Регистр и лишние пробелы не влияют на ключ."""
+        self.assertEqual(cache_key('  Ева,  напомни\nзавтра '), cache_key('ева, напомни завтра'))
+        self.assertNotEqual(cache_key('ева'), cache_key('ева!'))
+
+    async def test_hit_and_miss_are_counted(self):
+        """Повторный запрос попадает в кэш."""
+        self.assertIsNone(await self.cache.get('a'))
+        await self.cache.set('a', {'predicted_class': 'task'})
+
+        self.assertEqual(await self.cache.get('a'), {'predicted_class': 'task'})
+        metrics = self.cache.metrics()
+        self.assertEqual((metrics['hits'], metrics['misses']), (1, 1))
+        self.assertEqual(metrics['hit_rate'], 0.5)
+
+    async def test_entry_expires_after_ttl(self):
+        """Запись недоступна после истечения TTL."""
+        await self.cache.set('a', 1)
+        self.clock.now = 11
+
+        self.assertIsNone(await self.cache.get('a'))
+        self.assertEqual(self.cache.metrics()['expired'], 1)
+
+    async def test_least_recently_used_is_evicted(self):
+        """При переполнении вытесняется давно не использованная запись."""
+        await self.cache.set('a', 1)
+        await self.cache.set('b', 2)
+        await self.cache.get('a')
+        await self.cache.set('c', 3)
+
+        self.assertEqual(list(self.cache.entries), ['a', 'c'])
+        self.assertEqual(self.cache.metrics()['evictions'], 1)
+
+    async def test_redis_tier_is_shared_between_workers(self):
+        """Запись одного воркера доступна другому через Redis."""
+        redis_client = FakeRedis()
+        first = PredictionCache(max_size=2, ttl=10, redis_client=redis_client, clock=self.clock)
+        second = PredictionCache(max_size=2, ttl=10, redis_client=redis_client, clock=self.clock)
+        await first.set('a', {'predicted_class': 'chat_gpt'})
+
+        self.assertEqual(await second.get('a'), {'predicted_class': 'chat_gpt'})
+        self.assertEqual(second.metrics()['redis_hits'], 1)
+        self.assertIn('a', second.entries)
+
+    async def test_disabled_cache_stores_nothing(self):
+        """Нулевой размер отключает кэш."""
+        cache = PredictionCache(max_size=0, ttl=10)
+        await cache.set('a', 1)
+
+        self.assertIsNone(await cache.get('a'))
+        self.assertEqual(cache.entries, {})
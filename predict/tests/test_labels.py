@@ -0,0 +1,30 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from src.tasks.model_utils import LABELS, resolve_labels
+
+
+class ResolveLabelsTest(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model_path = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_config(self, id2label):
+        (self.model_path / 'config.json').write_text(json.dumps({'id2label': id2label}))
+
+    def test_intent_labels_from_config(self):
+        self.write_config({'0': 'chat_gpt', '1': 'task', '2': 'weather', '3': 'joke'})
+        self.assertEqual(resolve_labels(self.model_path), {0: 'chat_gpt', 1: 'task', 2: 'weather', 3: 'joke'})
+
+    def test_generic_labels_fall_back_to_binary(self):
+        self.write_config({'0': 'LABEL_0', '1': 'LABEL_1'})
+        self.assertEqual(resolve_labels(self.model_path), LABELS)
+
+    def test_missing_config_falls_back_to_binary(self):
+        self.assertEqual(resolve_labels(self.model_path), LABELS)
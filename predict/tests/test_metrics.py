@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from src.metrics import Counter, Histogram, Registry
+
+
+class MetricsTest(TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Бакеты гистограммы накопительные, +Inf равен количеству наблюдений."""
+        histogram = Histogram('batch_size', 'Размер батча.', (1, 4, 16))
+        for value in (1, 3, 4, 20):
+            histogram.observe(value)
+
+        lines = list(histogram.render())
+
+        self.assertIn('# TYPE batch_size histogram', lines)
+        self.assertIn('batch_size_bucket{le="1"} 1', lines)
+        self.assertIn('batch_size_bucket{le="4"} 3', lines)
+        self.assertIn('batch_size_bucket{le="16"} 3', lines)
+        self.assertIn('batch_size_bucket{le="+Inf"} 4', lines)
+        self.assertIn('batch_size_sum 28', lines)
+        self.assertIn('batch_size_count 4', lines)
+
+    def test_counter_per_label(self):
+        """Счётчик ведётся отдельно для каждого значения метки."""
+        counter = Counter('predictions_total', 'Предсказания.', 'predicted_class')
+        counter.inc(label_value='task')
+        counter.inc(label_value='task')
+        counter.inc(label_value='chat_gpt')
+
+        lines = list(counter.render())
+
+        self.assertIn('predictions_total{predicted_class="task"} 2', lines)
+        self.assertIn('predictions_total{predicted_class="chat_gpt"} 1', lines)
+
+    def test_registry_renders_all_metrics(self):
+        """Registry отдаёт все зарегистрированные метрики одним текстом."""
+        registry = Registry()
+        registry.register(Counter('a_total', 'A.')).inc()
+        registry.register(Histogram('b_seconds', 'B.', (0.1,))).observe(0.05)
+
+        text = registry.render()
+
+        self.assertTrue(text.endswith('\n'))
+        self.assertIn('a_total 1\n', text)
+        self.assertIn('b_seconds_bucket{le="0.1"} 1\n', text)
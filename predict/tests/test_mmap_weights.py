@@ -0,0 +1,39 @@
+import json
+import struct
+import tempfile
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import TestCase, skipUnless
+
+import numpy as np
+from src.tasks.mmap_weights import load_mmap_state_dict
+
+
+def write_safetensors(path: Path, tensors: dict[str, np.ndarray]) -> None:
+    header, chunks, offset = {}, [], 0
+    for name, array in tensors.items():
+        data = array.tobytes()
+        header[name] = {'dtype': {'float32': 'F32', 'int64': 'I64'}[str(array.dtype)], 'shape': list(array.shape), 'data_offsets': [offset, offset + len(data)]}
+        chunks.append(data)
+        offset += len(data)
+    header_bytes = json.dumps(header).encode('utf-8')
+    path.write_bytes(struct.pack('<Q', len(header_bytes)) + header_bytes + b''.join(chunks))
+
+
+@skipUnless(find_spec('torch'), 'torch не установлен')
+class MmapWeightsTest(TestCase):
+
+    def test_state_dict_matches_file(self):
+        """Тензоры из mmap совпадают с сохранёнными по значениям, типам и форме."""
+        tensors = {
+            'weight': np.arange(12, dtype=np.float32).reshape(3, 4),
+            'ids': np.array([1, 2, 3], dtype=np.int64),
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            weights_file = Path(tmp) / 'model.safetensors'
+            write_safetensors(weights_file, tensors)
+            state_dict = load_mmap_state_dict(weights_file)
+
+            for name, array in tensors.items():
+                np.testing.assert_array_equal(state_dict[name].numpy(), array)
+                self.assertEqual(tuple(state_dict[name].shape), array.shape)
@@ -0,0 +1,39 @@
+import json
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import TestCase, skipUnless
+
+from src.config import settings
+from src.tasks.backends import (ONNX_FILE, ONNX_QUANTIZED_FILE, OnnxBackend,
+                                TorchBackend)
+
+CORPUS = json.loads((Path(__file__).parent / 'fixtures' / 'corpus.json').read_text(encoding='utf-8'))
+HAS_RUNTIME = all(find_spec(name) for name in ('torch', 'transformers', 'onnxruntime'))
+# допустимая доля расхождений классов для int8 модели
+MAX_QUANTIZED_MISMATCH = 0.05
+
+
+@skipUnless(HAS_RUNTIME and (settings.model_path / ONNX_FILE).exists(), 'нет onnxruntime или экспортированной модели')
+class OnnxParityTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from transformers import DistilBertTokenizer
+
+        tokenizer = DistilBertTokenizer.from_pretrained(settings.model_path)
+        cls.encoded_input = dict(tokenizer(CORPUS, padding=True, truncation=True, return_tensors='np'))
+        cls.expected = TorchBackend(settings.model_path).logits(cls.encoded_input).argmax(axis=1).tolist()
+
+    def test_fp32_classes_match_torch(self):
+        """ONNX fp32 модель предсказывает те же классы, что и torch."""
+        predicted = OnnxBackend(settings.model_path).logits(self.encoded_input).argmax(axis=1).tolist()
+
+        self.assertEqual(predicted, self.expected)
+
+    @skipUnless((settings.model_path / ONNX_QUANTIZED_FILE).exists(), 'нет int8 модели')
+    def test_int8_classes_match_torch(self):
+        """int8 модель расходится с torch не более чем на MAX_QUANTIZED_MISMATCH корпуса."""
+        predicted = OnnxBackend(settings.model_path, quantized=True).logits(self.encoded_input).argmax(axis=1).tolist()
+        mismatches = sum(p != e for p, e in zip(predicted, self.expected))
+
+        self.assertLessEqual(mismatches / len(CORPUS), MAX_QUANTIZED_MISMATCH)
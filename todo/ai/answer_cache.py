@@ -0,0 +1,143 @@
+import hashlib
+import json
+import re
+import time
+
+from ai.in_flight import normalize_text
+from django.conf import settings
+
+redis_client = settings.REDIS_CLIENT
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+STATS_KEY = 'answer_cache:stats'
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[str]:
+    """Символьные шинглы нормализованного текста."""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def simhash(text: str) -> int:
+    """64-битный simhash по символьным шинглам."""
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles(text):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def normalize_question(text: str) -> str:
+    """Текст без регистра, пунктуации и лишних пробелов."""
+    return normalize_text(re.sub(r'[^\w\s]', ' ', text))
+
+
+def numbers_signature(text: str) -> str:
+    """Числа текста: даты и время напоминаний не должны совпадать приблизительно."""
+    return ','.join(re.findall(r'\d+', text))
+
+
+class AnswerCache:
+    """
+    Кэш ответов ИИ для запросов без истории диалога.
+
+    Ответ зависит только от модели, промпта ассистента, температуры и текста, поэтому
+    совпадение ищется по хэшу текста без регистра и пунктуации. Близкое совпадение по расстоянию
+    Хэмминга simhash символьных шинглов при совпадающих числах в тексте включается только
+    ненулевым `GPT_ANSWER_CACHE_SIMHASH_DISTANCE`: тексты, различающиеся одним словом
+    («по возрастанию» и «по убыванию», «забрать» и «не забрать»), близки по simhash,
+    но требуют разных ответов. Записи истекают через `ttl`, при превышении `max_entries`
+    вытесняются самые старые. Попадания и промахи считаются в `answer_cache:stats`.
+
+    ### Args:
+    - model_title (`str`): Название модели GPT.
+    - assist_prompt (`str`): Промпт ассистента.
+    - temperature (`float`): Уровень энтропии ответа.
+    - owner (`int`, optional): Владелец записей, если ответ содержит личные данные пользователя.
+      Defaults to None - общий кэш.
+
+    """
+
+    def __init__(self, model_title: str, assist_prompt: str, temperature: float, owner: int = None) -> None:
+        scope = hashlib.sha1(f'{model_title}:{temperature}:{owner}:{assist_prompt}'.encode('utf-8')).hexdigest()
+        self.prefix = f'answer_cache:{scope}'
+        self.index_key = f'{self.prefix}:index'
+        self.simhash_key = f'{self.prefix}:simhash'
+        self.ttl = settings.GPT_ANSWER_CACHE_TTL
+        self.max_entries = settings.GPT_ANSWER_CACHE_MAX_ENTRIES
+        self.max_distance = settings.GPT_ANSWER_CACHE_SIMHASH_DISTANCE
+
+    def entry_key(self, digest: str) -> str:
+        return f'{self.prefix}:{digest}'
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, text: str) -> dict | None:
+        """
+        Ответ `{text, prompt_tokens, completion_tokens}` на такой же или близкий текст.
+
+        ### Args:
+        - text (`str`): Текст запроса.
+
+        """
+        normalized = normalize_question(text)
+        entry = redis_client.get(self.entry_key(self.digest(normalized)))
+        kind = 'exact'
+        if entry is None and self.max_distance:
+            entry = self.get_near(normalized)
+            kind = 'near'
+        redis_client.hincrby(STATS_KEY, f'hits_{kind}' if entry else 'misses')
+        return json.loads(entry) if entry else None
+
+    def get_near(self, normalized: str) -> bytes | None:
+        fingerprint, numbers = simhash(normalized), numbers_signature(normalized)
+        candidates = []
+        for digest, value in redis_client.hgetall(self.simhash_key).items():
+            candidate_hash, _, candidate_numbers = value.decode('utf-8').partition(':')
+            distance = bin(fingerprint ^ int(candidate_hash)).count('1')
+            if distance <= self.max_distance and candidate_numbers == numbers:
+                candidates.append((distance, digest.decode('utf-8')))
+        for _, digest in sorted(candidates):
+            if entry := redis_client.get(self.entry_key(digest)):
+                return entry
+        return None
+
+    def set(self, text: str, answer: dict) -> None:
+        """Сохраняет ответ и вытесняет истёкшие и самые старые записи."""
+        normalized = normalize_question(text)
+        digest = self.digest(normalized)
+        now = time.time()
+        pipe = redis_client.pipeline()
+        pipe.set(self.entry_key(digest), json.dumps(answer, ensure_ascii=False), ex=self.ttl)
+        pipe.hset(self.simhash_key, digest, f'{simhash(normalized)}:{numbers_signature(normalized)}')
+        pipe.zadd(self.index_key, {digest: now})
+        pipe.expire(self.simhash_key, self.ttl)
+        pipe.expire(self.index_key, self.ttl)
+        pipe.execute()
+        expired = redis_client.zrangebyscore(self.index_key, '-inf', now - self.ttl)
+        overflow = max(0, redis_client.zcard(self.index_key) - len(expired) - self.max_entries)
+        evicted = expired + (redis_client.zrange(self.index_key, len(expired), len(expired) + overflow - 1) if overflow else [])
+        if evicted:
+            pipe = redis_client.pipeline()
+            pipe.zrem(self.index_key, *evicted)
+            pipe.hdel(self.simhash_key, *evicted)
+            pipe.delete(*[self.entry_key(digest.decode('utf-8')) for digest in evicted])
+            pipe.execute()
+
+
+def cache_stats() -> dict:
+    """Количество попаданий и промахов кэша ответов и доля попаданий."""
+    stats = {key.decode('utf-8'): int(value) for key, value in redis_client.hgetall(STATS_KEY).items()}
+    hits = stats.get('hits_exact', 0) + stats.get('hits_near', 0)
+    total = hits + stats.get('misses', 0)
+    return {
+        'hits_exact': stats.get('hits_exact', 0),
+        'hits_near': stats.get('hits_near', 0),
+        'misses': stats.get('misses', 0),
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
@@ -2,13 +2,26 @@ import asyncio
 import json
 
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+BUSY_MESSAGE = 'Я ещё отвечаю на ваши предыдущие вопросы, отправьте этот чуть позже.'
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Чат сайта с ИИ.
+
+    Каждое соединение отвечает на вопросы не более чем `WS_AI_CONCURRENCY` задачами,
+    а ожидающие вопросы держит в очереди на `WS_AI_QUEUE_SIZE` мест. Вопрос сверх
+    очереди отклоняется кадром `busy`, при отключении все задачи соединения отменяются.
+    """
+
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f"chat_{self.room_name}"
         self.message_count = 0
+        self.queue = asyncio.Queue(maxsize=settings.WS_AI_QUEUE_SIZE)
+        self.workers = [asyncio.create_task(self.answer_worker()) for _ in range(settings.WS_AI_CONCURRENCY)]
 
         # Подключение к комнате
         await self.channel_layer.group_add(
@@ -19,6 +32,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, close_code):
+        # Отмена ответов, которые больше некому получить
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
         # Отключение от комнаты
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -30,6 +51,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
         text_data_json = json.loads(text_data)
         message = text_data_json['message']
         user = self.scope['user']
+        if self.queue.full():
+            await self.send(text_data=json.dumps({
+                'message': f'<li class="other">{BUSY_MESSAGE}</li>',
+                'username': 'Eva',
+                'busy': True,
+            }))
+            return
         self.message_count += 1
 
         send_eva = {
@@ -40,9 +68,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'message_count': self.message_count,
         }
 
-        # Отправка запроса ИИ
-        answer_gpt_instance = WSAnswerChatGPT(**send_eva)
-        asyncio.create_task(answer_gpt_instance.answer_from_ai())
+        # Запрос ИИ в очередь соединения
+        self.queue.put_nowait(WSAnswerChatGPT(**send_eva))
 
         # Отправка сообщения в комнату
         await self.channel_layer.group_send(
@@ -54,6 +81,15 @@ class ChatConsumer(AsyncWebsocketConsumer):
             }
         )
 
+    async def answer_worker(self):
+        """Отвечает на вопросы из очереди соединения по одному."""
+        while True:
+            answer_gpt_instance = await self.queue.get()
+            try:
+                await answer_gpt_instance.answer_from_ai()
+            finally:
+                self.queue.task_done()
+
     async def chat_message(self, event):
         # Отправка сообщения обратно на клиент
         message = event['message']
@@ -64,4 +100,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'message': message,
             'username': username,
+            'stream_id': event.get('stream_id'),
+        }))
+
+    async def chat_stream(self, event):
+        # Отправка части потокового ответа ИИ
+        await self.send(text_data=json.dumps({
+            'chunk': event['chunk'],
+            'stream_id': event['stream_id'],
+            'username': event['username'],
         }))
@@ -0,0 +1,179 @@
+import json
+import time
+from datetime import datetime
+
+from django.apps import apps
+from django.conf import settings
+
+redis_client = settings.REDIS_CLIENT
+
+# токен модели в контекст Redis не попадает, он берётся из `ModelTokens`
+MODEL_FIELDS = ('id', 'title', 'context_window', 'max_request_token', 'time_window', 'rpm_limit', 'tpm_limit', 'fallback_model_id', 'daily_token_limit')
+
+
+class RedisContext:
+    """
+    Скользящий контекст диалога пользователя с ИИ в Redis.
+
+    Хранит активную модель пользователя с началом окна истории, список сообщений
+    `{role, content, tokens, ts, id}` парами вопрос-ответ, где `id` — запись `HistoryAI`,
+    и краткое содержание свёрнутой части диалога. Чтение и дополнение выполняются одним pipeline каждое, Postgres
+    используется только при промахе.
+
+    ### Args:
+    - user_id (`int`): ID пользователя.
+
+    """
+
+    def __init__(self, user_id: int) -> None:
+        self.key = f'gpt_context:{user_id}'
+        self.model_key = f'gpt_context_model:{user_id}'
+        self.summary_key = f'gpt_context_summary:{user_id}'
+        self.summary: dict = None
+        self.ttl = settings.GPT_CONTEXT_TTL
+        self.max_entries = settings.GPT_CONTEXT_MAX_ENTRIES
+
+    def load(self) -> tuple[dict, list[dict]] | tuple[None, None]:
+        """
+        Модель с началом окна и сообщения контекста или `(None, None)` при промахе.
+
+        Промахом считаются и неполные данные: список сообщений пуст или истёк раньше модели
+        (история в Postgres могла не попасть в Redis), у модели нет поля из `MODEL_FIELDS`
+        или у сообщения нет `id` (записаны прежней версией). Краткое содержание свёрнутой
+        части диалога сохраняется в `self.summary`.
+        """
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(self.model_key)
+        pipe.lrange(self.key, 0, -1)
+        pipe.get(self.summary_key)
+        model_data, entries, summary = pipe.execute()
+        if not model_data or not entries:
+            return None, None
+        model_data = json.loads(model_data)
+        entries = [json.loads(entry) for entry in entries]
+        if any(field not in model_data['model'] for field in MODEL_FIELDS) or any('id' not in entry for entry in entries):
+            return None, None
+        self.summary = json.loads(summary) if summary else None
+        return model_data, entries
+
+    def fill(self, model_data: dict, history: list[dict], summary: dict = None) -> None:
+        """Заполняет контекст из Postgres после промаха."""
+        entries = []
+        for item in history:
+            ts = item['created_at'].timestamp()
+            entries.append(self.entry('user', item['question'], item['question_tokens'], ts, item['id']))
+            entries.append(self.entry('assistant', item['answer'], item['answer_tokens'], ts, item['id']))
+        pipe = redis_client.pipeline()
+        pipe.delete(self.key)
+        if entries:
+            pipe.rpush(self.key, *entries)
+            pipe.expire(self.key, self.ttl)
+        pipe.set(self.model_key, json.dumps(model_data), ex=self.ttl)
+        if summary:
+            pipe.set(self.summary_key, json.dumps(summary, ensure_ascii=False), ex=self.ttl)
+        else:
+            pipe.delete(self.summary_key)
+        pipe.execute()
+
+    def set_summary(self, summary: dict) -> None:
+        """Сохраняет новое краткое содержание свёрнутой части диалога."""
+        redis_client.set(self.summary_key, json.dumps(summary, ensure_ascii=False), ex=self.ttl)
+
+    def append(self, history_id: int, question: str, question_tokens: int, answer: str, answer_tokens: int, keep: int) -> None:
+        """
+        Добавляет пару вопрос-ответ и обрезает список до сообщений, помещающихся в окно.
+
+        ### Args:
+        - history_id (`int`): ID записи `HistoryAI` этой пары.
+        - keep (`int`): Количество последних сообщений, попавших в prompt этого запроса.
+
+        """
+        ts = datetime.now().timestamp()
+        pipe = redis_client.pipeline()
+        pipe.rpush(
+            self.key,
+            self.entry('user', question, question_tokens, ts, history_id),
+            self.entry('assistant', answer, answer_tokens, ts, history_id),
+        )
+        pipe.ltrim(self.key, -min(keep + 2, self.max_entries), -1)
+        pipe.expire(self.key, self.ttl)
+        pipe.expire(self.model_key, self.ttl)
+        pipe.expire(self.summary_key, self.ttl)
+        pipe.execute()
+
+    def clear(self) -> None:
+        redis_client.delete(self.key, self.model_key, self.summary_key)
+
+    @staticmethod
+    def entry(role: str, content: str, tokens: int, ts: float, history_id: int) -> str:
+        return json.dumps({'role': role, 'content': content, 'tokens': tokens or 0, 'ts': ts, 'id': history_id}, ensure_ascii=False)
+
+    @staticmethod
+    def select(entries: list[dict], time_start: datetime, budget: int, last_history_id: int = None) -> list[dict]:
+        """
+        Последние пары вопрос-ответ из окна времени, помещающиеся в бюджет токенов.
+
+        ### Args:
+        - entries (`list[dict]`): Сообщения контекста в хронологическом порядке.
+        - time_start (`datetime`): Начало окна истории.
+        - budget (`int`): Количество токенов, доступное для истории.
+        - last_history_id (`int`, optional): ID последней записи, свёрнутой в краткое содержание.
+
+        """
+        start = time_start.timestamp()
+        pairs = [
+            pair for pair in zip(entries[::2], entries[1::2])
+            if pair[0]['ts'] >= start and pair[0]['id'] > (last_history_id or 0)
+        ]
+        selected, used = [], 0
+        for question, answer in reversed(pairs):
+            # +11 - токены для ролей и разделителей пары вопрос-ответ
+            used += question['tokens'] + answer['tokens'] + 11
+            if used >= budget:
+                break
+            selected.extend((answer, question))
+        return selected[::-1]
+
+
+class ModelTokens:
+    """
+    Токены API моделей GPT в памяти процесса по `id` модели.
+
+    Модель из контекста Redis восстанавливается без токена, он читается из БД
+    не чаще раза в `ttl` секунд, поэтому смена токена в админке доходит
+    до всех процессов без перезапуска.
+
+    ### Args:
+    - ttl (`int`, optional): Время жизни токена в памяти, сек.
+
+    """
+
+    def __init__(self, ttl: int = 60) -> None:
+        self.ttl = ttl
+        self.tokens: dict[int, tuple[str, float]] = {}
+
+    def get(self, model_id: int) -> str | None:
+        """Токен модели или None, если модель удалена."""
+        token, expires = self.tokens.get(model_id, (None, 0))
+        if expires > time.monotonic():
+            return token
+        token = apps.get_model('telbot', 'GptModels').objects.filter(pk=model_id).values_list('token', flat=True).first()
+        if token is not None:
+            self.tokens[model_id] = (token, time.monotonic() + self.ttl)
+        return token
+
+    def forget(self, model_id: int) -> None:
+        self.tokens.pop(model_id, None)
+
+
+model_tokens = ModelTokens()
+
+
+def clear_context(user_id: int) -> None:
+    RedisContext(user_id).clear()
+
+
+def forget_model(*user_ids: int) -> None:
+    """Сбрасывает закэшированную активную модель, контекст сообщений сохраняется."""
+    if user_ids:
+        redis_client.delete(*[RedisContext(user_id).model_key for user_id in user_ids])
@@ -20,6 +20,11 @@ class LongQueryError(LogTracebackExceptionError):
         super().__init__(self.message)
 
 
+class TokenQuotaError(LogTracebackExceptionError):
+    """Исключение для случаев, когда суточный лимит токенов пользователя по модели исчерпан."""
+    pass
+
+
 class UnhandledError(LogTracebackExceptionError):
     """Исключение для обработки неожиданных ошибок."""
     pass
@@ -45,6 +50,11 @@ class OpenAIJSONDecodeError(OpenAIRequestError):
     pass
 
 
+class OpenAIRateLimitError(OpenAIRequestError):
+    """Лимиты запросов к OpenAI исчерпаны дольше, чем пользователь готов ждать."""
+    pass
+
+
 class ValueChoicesError(OpenAIRequestError):
     """Ошибки в содержании ответа."""
     pass
@@ -66,9 +76,11 @@ async def handle_exceptions(err: Exception, include_traceback: bool = False) ->
     error_messages = {
         InWorkError: 'Я ещё думаю над вашим вопросом.',
         LongQueryError: str(err),
+        TokenQuotaError: 'Лимит токенов на сегодня исчерпан, продолжим завтра 🌙',
         ValueChoicesError: user_error_text,
         OpenAIResponseError: 'Проблема с получением ответа от ИИ. Возможно она устала.',
         OpenAIConnectionError: 'Проблемы соединения. Вероятно ИИ вышла ненадолго.',
+        OpenAIRateLimitError: 'Сейчас ко мне очень много вопросов, повторите свой через минуту.',
         OpenAIJSONDecodeError: user_error_text,
         UnhandledError: user_error_text,
     }
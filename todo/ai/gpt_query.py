@@ -1,28 +1,57 @@
 import asyncio
+import copy
 import json
+import logging
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import AsyncContextManager
 
 import httpx
-import tiktoken_async
+from ai.answer_cache import AnswerCache
+from ai.context import MODEL_FIELDS, RedisContext, model_tokens
 from ai.gpt_exception import (InWorkError, LongQueryError,
                               OpenAIConnectionError, OpenAIJSONDecodeError,
-                              OpenAIResponseError, UnhandledError,
+                              OpenAIRateLimitError, OpenAIResponseError,
+                              TokenQuotaError, UnhandledError,
                               ValueChoicesError, handle_exceptions)
+from ai.hedging import HedgeRace, latency_tracker
+from ai.in_flight import InFlightRequest
+from ai.openai_client import get_openai_client
+from ai.rate_limiter import backoff_delay, rate_limiter, retry_after_seconds
+from ai.rendering import convert_markdown
+from ai.single_flight import SingleFlight
+from ai.summary import SUMMARY_MESSAGE
+from ai.tasks import summarize_history
+from ai.tokenizer import count_tokens
 from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Model
+from django.db.models import F, Model, QuerySet, Sum, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce
 from django.utils.timezone import now
-from httpx_socks import AsyncProxyTransport
-from telbot.loader import bot
-from telbot.models import GptModels, UserGptModels
+from telbot.chat_actions import chat_action
+from telbot.models import (GptModels, HistoryAI, HistorySummary, TokenUsage,
+                           UserGptModels)
 from telegram import ChatAction
 
 ADMIN_ID = settings.TELEGRAM_ADMIN_ID
 
 User = get_user_model()
-redis_client = settings.REDIS_CLIENT
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class AnswerResult:
+    """Ответ одного запроса к модели и его токены."""
+    text: str | None
+    prompt_tokens: int | None
+    completion_tokens: int | None
+    model: GptModels
+    served_from: str = HistoryAI.ServedFrom.MODEL
 
 
 class GetAnswerGPT():
@@ -35,11 +64,14 @@ class GetAnswerGPT():
     - user (`Model`): Пользователь.
     - history_model (`Model`): Модель для хранения истории.
     - chat_id (`int`, optional): ID чата. Defaults to None.
+    - temperature (`float`, optional): Уровень энтропии ответа. Defaults to 0.5.
+    - stream (`bool`, optional): Получать ответ потоком SSE и передавать его в `stream_chunk`. Defaults to False.
 
     """
     MAX_TYPING_TIME = 3
+    STREAM_INTERVAL = 1.0  # минимальный интервал между вызовами stream_chunk, сек
 
-    def __init__(self, query_text: str, assist_prompt: str, user: 'Model', history_model: 'Model', chat_id: int = None, temperature: float = 0.5) -> None:
+    def __init__(self, query_text: str, assist_prompt: str, user: 'Model', history_model: 'Model', chat_id: int = None, temperature: float = 0.5, stream: bool = False) -> None:
         # Инициализация свойств класса
         self.user = user                    # модель пользователя пославшего запрос
         self.is_user_authenticated = self.user.is_authenticated  # гость или аутентифицированный пользователь
@@ -57,49 +89,99 @@ class GetAnswerGPT():
         self.return_text_tokens = None      # количество токенов в ответе
         self.event = asyncio.Event() if chat_id else None  # typing в чат пользователя
         self.user_models = None             # разрешенные GPT модели пользователя
+        self.stream = stream                # потоковый ответ от модели
+        self.time_to_first_token = None     # время до первого полученного токена, сек
+        self.stream_parts = []              # полученные части потокового ответа
+        self.context = None                 # скользящий контекст пользователя в Redis
+        self.context_entries = None         # сообщения контекста, None при промахе
+        self.context_kept = 0               # количество сообщений контекста в prompt
+        self.history_tokens = 0             # токены истории в prompt без краткого содержания
+        self.rendered_answer = None         # текст ответа и его HTML
+        self.in_flight = None               # отметка запроса в работе
+        self.prompt_tokens = 0              # оценка токенов prompt для лимитов модели
+        self.deadline = time.monotonic() + settings.GPT_LATENCY_BUDGET  # крайний срок ожидания лимитов и повторов
+        self.answer_cache = None            # кэш ответов для запросов без истории
+        self.hedge_model = None             # модель отменённого параллельного запроса
+        self.hedge_question_tokens = None   # токены запроса отменённой модели
+        self.hedge_answer_tokens = None     # токены ответа отменённой модели
+        self.served_from = HistoryAI.ServedFrom.MODEL  # источник ответа: модель, кэш или одинаковый запрос
 
     @property
     def check_long_query(self) -> bool:
         return self.query_text_tokens > self.model.max_request_token
 
+    @property
+    def return_html(self) -> str:
+        """HTML ответа, отрисовывается один раз для записи в историю и отправки в чат сайта."""
+        if self.rendered_answer is None or self.rendered_answer[0] != self.return_text:
+            self.rendered_answer = (self.return_text, convert_markdown(self.return_text))
+        return self.rendered_answer[1]
+
+    def answer_result(self) -> AnswerResult:
+        """Ответ и токены этого запроса."""
+        return AnswerResult(self.return_text, self.query_text_tokens, self.return_text_tokens, self.model, self.served_from)
+
+    def apply_result(self, result: AnswerResult) -> None:
+        """Принимает ответ, полученный другим запросом: из гонки моделей, кэша или одинакового запроса."""
+        self.return_text = result.text
+        self.query_text_tokens = result.prompt_tokens
+        self.return_text_tokens = result.completion_tokens
+        self.model = result.model
+        self.served_from = result.served_from
+
+    @property
+    def is_stateless(self) -> bool:
+        """Ответ зависит только от модели, промпта и текста запроса, история не передаётся."""
+        return False
+
+    @property
+    def answer_cache_owner(self) -> int | None:
+        """Владелец записей кэша ответов, None - кэш общий для всех пользователей."""
+        return None
+
+    @property
+    def in_flight_owner(self) -> int | str:
+        """Владелец отметки запроса в работе."""
+        return self.user.id
+
     async def get_answer_chat_gpt(self) -> dict:
         """Основная логика."""
         await self.init_user_model()
-        self.query_text_tokens, self.assist_prompt_tokens, _ = await asyncio.gather(
-            self.num_tokens(self.query_text),
-            self.num_tokens(self.assist_prompt),
-            self.check_in_works(),
-        )
-        if self.check_long_query:
-            raise LongQueryError(
-                f'{self.user.first_name if self.is_user_authenticated else "Дорогой друг" }, слишком большой текст запроса.\n'
-                'Попробуйте сформулировать его короче.'
-            )
+        await self.check_token_quota()
+        await self.check_in_works()
+        # отметка запроса в работе снимается при любом исходе, в том числе при ошибке подсчёта токенов
         try:
-            if self.event:
-                asyncio.create_task(self.send_typing_periodically())
-            await self.get_prompt()
-            await self.httpx_request_to_openai()
-            if self.is_user_authenticated:
-                asyncio.create_task(self.create_history_ai())
-        except Exception as err:
-            _, type_err, traceback_str = await handle_exceptions(err, True)
-            raise type_err(f'\n\n{str(err)}{traceback_str}')
+            self.query_text_tokens, self.assist_prompt_tokens = await count_tokens(self.model.title, [self.query_text, self.assist_prompt])
+            if self.check_long_query:
+                raise LongQueryError(
+                    f'{self.user.first_name if self.is_user_authenticated else "Дорогой друг" }, слишком большой текст запроса.\n'
+                    'Попробуйте сформулировать его короче.'
+                )
+            try:
+                async with self.typing():
+                    await self.get_prompt()
+                    if not await self.read_answer_cache():
+                        await self.httpx_request_to_openai()
+                        await self.write_answer_cache()
+                if self.is_user_authenticated:
+                    # контекст Redis ссылается на запись истории, поэтому дополняется после её сохранения
+                    await self.create_history_ai()
+                    await self.append_context()
+                    await self.summarize_history()
+            except Exception as err:
+                _, type_err, traceback_str = await handle_exceptions(err, True)
+                raise type_err(f'\n\n{str(err)}{traceback_str}')
         finally:
             await self.del_mess_in_redis()
 
-    async def send_typing_periodically(self) -> None:
-        """"Передаёт TYPING в чат Телеграм откуда пришёл запрос."""
-        time_stop = datetime.now() + timedelta(minutes=self.MAX_TYPING_TIME)
-        while not self.event.is_set():
-            bot.send_chat_action(chat_id=self.chat_id, action=ChatAction.TYPING)
-            await asyncio.sleep(2)
-            if datetime.now() > time_stop:
-                break
+    def typing(self) -> AsyncContextManager:
+        """Показывает TYPING в чате Телеграм, откуда пришёл запрос, до первого токена ответа."""
+        if self.event:
+            return chat_action(self.chat_id, ChatAction.TYPING, self.MAX_TYPING_TIME * 60, self.event)
+        return nullcontext()
 
-    async def httpx_request_to_openai(self) -> None:
-        """Делает запрос в OpenAI и выключает typing."""
-        transport = AsyncProxyTransport.from_url(settings.SOCKS5)
+    def request_payload(self) -> tuple[dict, dict]:
+        """Заголовки и тело запроса к модели `self.model`."""
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.model.token}"
@@ -109,26 +191,19 @@ class GetAnswerGPT():
             "messages": self.all_prompt,
             "temperature": self.temperature
         }
+        return headers, data
+
+    async def httpx_request_to_openai(self) -> None:
+        """Делает запрос в OpenAI и выключает typing."""
+        headers, data = self.request_payload()
         try:
-            async with httpx.AsyncClient(transport=transport) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=60 * self.MAX_TYPING_TIME,
-                )
-                response.raise_for_status()
-                completion = response.json()
-                choices = completion.get('choices')
-                if choices and len(choices) > 0:
-                    first_choice = choices[0]
-                    self.return_text = first_choice['message']['content']
-                    self.return_text_tokens = completion.get('usage', {}).get('completion_tokens')
-                    self.query_text_tokens = completion.get('usage', {}).get('prompt_tokens')
-                else:
-                    raise ValueChoicesError(f"`GetAnswerGPT`, ответ не содержит полей 'choices': {json.dumps(completion, ensure_ascii=False, indent=4)}")
+            await self.coalesced_request(headers, data)
 
+        except OpenAIRateLimitError:
+            raise
         except httpx.HTTPStatusError as http_err:
+            if http_err.response.status_code == httpx.codes.TOO_MANY_REQUESTS:
+                raise OpenAIRateLimitError(f'`GetAnswerGPT`, лимиты OpenAI исчерпаны: {http_err}') from http_err
             raise OpenAIResponseError(f'`GetAnswerGPT`, ответ сервера был получен, но код состояния указывает на ошибку: {http_err}') from http_err
         except httpx.RequestError as req_err:
             raise OpenAIConnectionError(f'`GetAnswerGPT`, проблемы соединения: {req_err}') from req_err
@@ -140,24 +215,267 @@ class GetAnswerGPT():
             if self.event:
                 self.event.set()
 
+    async def coalesced_request(self, headers: dict, data: dict) -> None:
+        """
+        Запрос к модели через `SingleFlight`.
+
+        Одинаковые одновременные запросы (модель, сообщения, температура) из всех процессов
+        ждут ответа одного из них и получают его текст и количество токенов. Ожидание
+        занимает поток и не передаёт частичный ответ, поэтому ограничено
+        `GPT_SINGLE_FLIGHT_WAIT`: не дождавшись, запрос выполняется сам.
+        """
+        flight = SingleFlight(data, self.MAX_TYPING_TIME * 60 * 1000)
+        if not await sync_to_async(flight.lead)():
+            shared = await sync_to_async(flight.wait, thread_sensitive=False)(settings.GPT_SINGLE_FLIGHT_WAIT)
+            if shared:
+                self.apply_result(AnswerResult(
+                    shared['text'], shared['prompt_tokens'], shared['completion_tokens'], self.model, HistoryAI.ServedFrom.SHARED
+                ))
+                logger.info('`%s`, ответ получен от одинакового одновременного запроса', self.model.title)
+                return
+        result = None
+        try:
+            await self.hedged_request(headers, data)
+            result = {
+                'text': self.return_text,
+                'prompt_tokens': self.query_text_tokens,
+                'completion_tokens': self.return_text_tokens,
+            }
+        finally:
+            await sync_to_async(flight.share)(result)
+
+    async def hedged_request(self, headers: dict, data: dict) -> None:
+        """
+        Запрос к модели с резервной моделью `fallback_model`.
+
+        Если основной запрос не ответил за p95 задержки своей модели, параллельно
+        отправляется запрос к резервной модели. Первый ответ побеждает, второй запрос
+        отменяется. Из запросов гонки берутся только их `AnswerResult`: ответ и модель
+        победителя, а токены проигравшего, измеренные до отмены, попадают в историю.
+        При ошибке основного запроса резервный отправляется сразу.
+        """
+        if not self.model.fallback_model_id:
+            await self.timed_request(headers, data)
+            return
+        threshold = await sync_to_async(latency_tracker.p95)(self.model.id, self.stream)
+        race = HedgeRace()
+        primary = self.race_attempt(race, self.model)
+        primary_task = race.tasks[primary] = asyncio.create_task(primary.timed_request(headers, data, race))
+        await asyncio.wait([primary_task], timeout=threshold)
+        if race.winner is None and (not primary_task.done() or primary_task.exception()):
+            fallback_model = await self.get_fallback_model()
+            if fallback_model:
+                logger.info('`%s` не ответила за %s с, запрос к `%s`', self.model.title, threshold, fallback_model.title)
+                secondary = self.race_attempt(race, fallback_model)
+                race.tasks[secondary] = asyncio.create_task(secondary.timed_request(*secondary.request_payload(), race))
+        await asyncio.gather(*race.tasks.values(), return_exceptions=True)
+        if race.winner is None:
+            primary_task.result()
+        self.apply_result(race.tasks[race.winner].result())
+        for loser, task in race.tasks.items():
+            if loser is race.winner or not task.cancelled() and task.exception() is not None:
+                continue
+            usage = loser.answer_result()
+            # отменённый до отправки запрос не оплачивается
+            if usage.prompt_tokens is not None:
+                self.hedge_model = usage.model.title
+                self.hedge_question_tokens = usage.prompt_tokens
+                self.hedge_answer_tokens = usage.completion_tokens
+
+    def race_attempt(self, race: HedgeRace, model: GptModels) -> 'GetAnswerGPT':
+        """Копия запроса к модели `model`, частичный ответ передаётся исходным запросом только после победы."""
+        attempt = copy.copy(self)
+        attempt.model = model
+        attempt.return_text = attempt.query_text_tokens = attempt.return_text_tokens = None
+        attempt.stream_parts = []
+
+        async def race_stream_chunk(text: str) -> None:
+            if race.claim(attempt):
+                await self.stream_chunk(text)
+
+        attempt.stream_chunk = race_stream_chunk
+        return attempt
+
+    async def timed_request(self, headers: dict, data: dict, race: HedgeRace = None) -> AnswerResult:
+        """Запрос к модели с учётом его задержки в скользящей выборке модели."""
+        started = time.monotonic()
+        try:
+            await self.request_with_retries(headers, data)
+        except asyncio.CancelledError:
+            # отменённый медленный запрос учитывается временем до отмены, иначе p95 занижается
+            await sync_to_async(latency_tracker.record)(self.model.id, self.stream, time.monotonic() - started)
+            raise
+        if race:
+            race.claim(self)
+        latency = self.time_to_first_token if self.stream else time.monotonic() - started
+        await sync_to_async(latency_tracker.record)(self.model.id, self.stream, latency)
+        return self.answer_result()
+
+    @database_sync_to_async
+    def get_fallback_model(self) -> GptModels | None:
+        return GptModels.objects.filter(pk=self.model.fallback_model_id).first()
+
+    async def request_with_retries(self, headers: dict, data: dict) -> None:
+        """
+        Запрос к модели с учётом общих лимитов и повторами после 429.
+
+        Перед каждой попыткой резервируются запрос и оценка токенов в лимитах модели.
+        Резерв каждой попытки закрывается: после ответа уточняется по `usage`, после 429
+        или ошибки токены возвращаются в ведро целиком. Отменённый запрос уже отправлен
+        и оплачивается, поэтому его резерв уточняется по prompt и полученной части ответа,
+        они же остаются в полях ответа. Повтор ждёт `Retry-After` с разбросом и выполняется,
+        только если укладывается в `deadline`.
+        """
+        estimated = self.prompt_tokens + settings.GPT_COMPLETION_TOKENS_ESTIMATE
+        for attempt in range(settings.OPENAI_RETRY_ATTEMPTS + 1):
+            await rate_limiter.acquire(self.model, estimated, self.deadline)
+            used = 0
+            try:
+                if self.stream:
+                    await self.read_stream_from_openai(headers, data)
+                else:
+                    await self.read_completion_from_openai(headers, data)
+                used = estimated
+                if self.query_text_tokens is not None and self.return_text_tokens is not None:
+                    used = self.query_text_tokens + self.return_text_tokens
+                return
+            except asyncio.CancelledError:
+                self.return_text = ''.join(self.stream_parts) or None
+                self.query_text_tokens = self.prompt_tokens
+                self.return_text_tokens = await self.num_tokens(self.return_text) if self.return_text else None
+                used = self.query_text_tokens + (self.return_text_tokens or 0)
+                raise
+            except httpx.HTTPStatusError as http_err:
+                if http_err.response.status_code != httpx.codes.TOO_MANY_REQUESTS or attempt == settings.OPENAI_RETRY_ATTEMPTS:
+                    raise
+                delay = backoff_delay(attempt, retry_after_seconds(http_err.response))
+                if time.monotonic() + delay > self.deadline:
+                    raise
+            finally:
+                await rate_limiter.settle(self.model, estimated, used)
+            logger.warning('`%s`, 429 от OpenAI, повтор через %.1f с', self.model.title, delay)
+            await asyncio.sleep(delay)
+
+    async def read_completion_from_openai(self, headers: dict, data: dict) -> None:
+        """Получает ответ модели целиком."""
+        started = time.perf_counter()
+        response = await get_openai_client().post(
+            "/chat/completions",
+            headers=headers,
+            json=data,
+            timeout=60 * self.MAX_TYPING_TIME,
+        )
+        response.raise_for_status()
+        completion = response.json()
+        self.time_to_first_token = time.perf_counter() - started
+        choices = completion.get('choices')
+        if choices and len(choices) > 0:
+            first_choice = choices[0]
+            self.return_text = first_choice['message']['content']
+            self.return_text_tokens = completion.get('usage', {}).get('completion_tokens')
+            self.query_text_tokens = completion.get('usage', {}).get('prompt_tokens')
+        else:
+            raise ValueChoicesError(f"`GetAnswerGPT`, ответ не содержит полей 'choices': {json.dumps(completion, ensure_ascii=False, indent=4)}")
+
+    async def read_stream_from_openai(self, headers: dict, data: dict) -> None:
+        """
+        Получает ответ модели потоком SSE.
+
+        Накопленный текст передаётся в `stream_chunk` сразу после первого токена и далее
+        не чаще `STREAM_INTERVAL`. Количество токенов берётся из последнего чанка с `usage`,
+        поэтому в историю попадают те же значения, что и без потока.
+        """
+        started = time.perf_counter()
+        data = {**data, "stream": True, "stream_options": {"include_usage": True}}
+        parts, usage, last_flush = [], None, None
+        self.stream_parts = parts
+        async with get_openai_client().stream(
+            "POST",
+            "/chat/completions",
+            headers=headers,
+            json=data,
+            timeout=60 * self.MAX_TYPING_TIME,
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                payload = line[len('data:'):].strip()
+                if payload == '[DONE]':
+                    break
+                chunk = json.loads(payload)
+                usage = chunk.get('usage') or usage
+                choices = chunk.get('choices')
+                delta = choices[0].get('delta', {}).get('content') if choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - started
+                    if self.event:
+                        self.event.set()
+                if last_flush is None or time.perf_counter() - last_flush >= self.STREAM_INTERVAL:
+                    last_flush = time.perf_counter()
+                    await self.stream_chunk(''.join(parts))
+        if not parts:
+            raise ValueChoicesError("`GetAnswerGPT`, поток ответа не содержит текста в полях 'choices'")
+        self.return_text = ''.join(parts)
+        if usage:
+            self.return_text_tokens = usage.get('completion_tokens')
+            self.query_text_tokens = usage.get('prompt_tokens')
+        else:
+            self.return_text_tokens = await self.num_tokens(self.return_text)
+        logger.info('`%s`, первый токен через %.2f с', self.model.title, self.time_to_first_token)
+
+    async def read_answer_cache(self) -> bool:
+        """Берёт ответ из кэша для запросов без истории, True при попадании."""
+        if not self.is_stateless:
+            return False
+        self.answer_cache = AnswerCache(self.model.title, self.assist_prompt, self.temperature, self.answer_cache_owner)
+        cached = await sync_to_async(self.answer_cache.get)(self.query_text)
+        if cached is None:
+            return False
+        self.apply_result(AnswerResult(
+            cached['text'], cached['prompt_tokens'], cached['completion_tokens'], self.model, HistoryAI.ServedFrom.CACHE
+        ))
+        if self.event:
+            self.event.set()
+        return True
+
+    async def write_answer_cache(self) -> None:
+        if self.answer_cache and self.return_text:
+            await sync_to_async(self.answer_cache.set)(self.query_text, {
+                'text': self.return_text,
+                'prompt_tokens': self.query_text_tokens,
+                'completion_tokens': self.return_text_tokens,
+            })
+
+    async def stream_chunk(self, text: str) -> None:
+        """Получает накопленный текст потокового ответа, переопределяется в наследниках."""
+        pass
+
     async def create_history_ai(self):
         """Создаём запись истории в БД для моделей поддерживающих асинхронное сохранение."""
+        rendered = {'answer_html': self.return_html} if self.history_model is HistoryAI else {}
         self.history_instance = self.history_model(
             user=self.user,
             question=self.query_text,
             question_tokens=self.query_text_tokens,
             answer=self.return_text,
-            answer_tokens=self.return_text_tokens
+            answer_tokens=self.return_text_tokens,
+            model=self.model.title,
+            hedge_model=self.hedge_model,
+            hedge_question_tokens=self.hedge_question_tokens,
+            hedge_answer_tokens=self.hedge_answer_tokens,
+            served_from=self.served_from,
+            **rendered,
         )
         await sync_to_async(self.history_instance.save)()
 
     async def num_tokens(self, text: str) -> int:
         """Считает количество токенов."""
-        try:
-            encoding = await tiktoken_async.encoding_for_model(self.model.title)
-        except KeyError:
-            encoding = await tiktoken_async.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
+        count, = await count_tokens(self.model.title, [text])
+        return count
 
     async def add_to_prompt(self, role: str, content: str) -> None:
         """Добавляет элемент в список all_prompt."""
@@ -165,34 +483,101 @@ class GetAnswerGPT():
 
     async def get_prompt(self) -> None:
         """Prompt для запроса в OpenAI и модель user."""
-        history = []
         await self.add_to_prompt('system', self.assist_prompt)
-        if self.is_user_authenticated:
-            history = await sync_to_async(list)(self.history_model.objects.filter(
-                user=self.user,
-                created_at__range=[self.time_start, self.current_time]
-            ).exclude(
-                answer__isnull=True
-            ).values(
-                'question', 'question_tokens', 'answer', 'answer_tokens'
-            ))
         # +11 - токены для ролей и разделителей: 'system' - 7 'user' - 4
-        token_counter = self.query_text_tokens + self.assist_prompt_tokens + 11
-        for item in history:
-            question_tokens = item.get('question_tokens', 0)
-            answer_tokens = item.get('answer_tokens', 0)
-            token_counter += question_tokens + answer_tokens + 11
+        self.prompt_tokens = self.query_text_tokens + self.assist_prompt_tokens + 11
+        if self.is_user_authenticated:
+            stored_summary = await self.get_summary() if self.context_entries is None else self.context.summary
+            # краткое содержание действует, пока свёрнутые записи не вышли из окна истории
+            summary = stored_summary if stored_summary and stored_summary['until'] >= self.time_start.timestamp() else None
+            if summary:
+                await self.add_to_prompt('system', SUMMARY_MESSAGE.format(summary['text']))
+                # +7 - токены для роли 'system' и разделителей
+                self.prompt_tokens += summary['tokens'] + 7
+            budget = self.model.context_window - self.prompt_tokens
+            if self.context_entries is None:
+                history = await sync_to_async(list)(self.get_history(budget, summary['last_history_id'] if summary else None))
+                await sync_to_async(self.context.fill)(self.context_model_data, history, stored_summary)
+                entries = [
+                    {'role': role, 'content': item[field], 'tokens': item[f'{field}_tokens'] or 0}
+                    for item in history for role, field in (('user', 'question'), ('assistant', 'answer'))
+                ]
+            else:
+                entries = self.context.select(self.context_entries, self.time_start, budget, summary['last_history_id'] if summary else None)
+            self.context_kept = len(entries)
+            for entry in entries:
+                await self.add_to_prompt(entry['role'], entry['content'])
+            # +11 - токены для ролей и разделителей пары вопрос-ответ
+            self.history_tokens = sum(entry['tokens'] for entry in entries) + 11 * (len(entries) // 2)
+            self.prompt_tokens += self.history_tokens
 
-            if token_counter >= self.model.context_window:
-                break
+        await self.add_to_prompt('user', self.query_text)
 
-            await self.add_to_prompt('user', item['question'])
-            await self.add_to_prompt('assistant', item['answer'])
+    def get_history(self, budget: int, last_summarized_id: int = None) -> QuerySet:
+        """
+        Последние вопросы и ответы из окна истории, которые помещаются в бюджет токенов.
 
-        await self.add_to_prompt('user', self.query_text)
+        Нарастающая сумма токенов считается оконной функцией от новых записей к старым,
+        поэтому при нехватке бюджета отбрасываются самые старые записи, а из БД приходят
+        только попавшие в prompt строки в хронологическом порядке.
+
+        ### Args:
+        - budget (`int`): Количество токенов, доступное для истории.
+        - last_summarized_id (`int`, optional): ID последней записи, свёрнутой в краткое содержание.
+
+        """
+        # +11 - токены для ролей и разделителей пары вопрос-ответ
+        turn_tokens = Coalesce('question_tokens', 0) + Coalesce('answer_tokens', 0) + 11
+        return self.history_model.objects.filter(
+            user=self.user,
+            created_at__range=[self.time_start, self.current_time],
+            id__gt=last_summarized_id or 0,
+        ).exclude(
+            answer__isnull=True
+        ).annotate(
+            running_tokens=Window(
+                Sum(turn_tokens),
+                order_by=[F('created_at').desc(), F('id').desc()],
+                frame=RowRange(start=None, end=0),
+            )
+        ).filter(
+            running_tokens__lt=budget
+        ).order_by(
+            'created_at', 'id'
+        ).values(
+            'id', 'question', 'question_tokens', 'answer', 'answer_tokens', 'created_at'
+        )
+
+    @database_sync_to_async
+    def get_summary(self) -> dict | None:
+        """Краткое содержание свёрнутой части диалога из БД при промахе контекста Redis."""
+        if self.history_model is not HistoryAI:
+            return None
+        summary = HistorySummary.objects.filter(user=self.user).first()
+        return summary.context_data if summary else None
+
+    async def summarize_history(self) -> None:
+        """Запускает фоновое сворачивание истории, если она превысила порог токенов."""
+        if self.history_model is HistoryAI and self.history_tokens >= settings.GPT_SUMMARY_THRESHOLD:
+            await sync_to_async(summarize_history.delay)(self.user.id)
+
+    async def init_user_model(self) -> None:
+        """Активная модель юзера и начало окна истории из контекста Redis, при промахе из БД."""
+        if self.is_user_authenticated:
+            self.context = RedisContext(self.user.id)
+            model_data, self.context_entries = await sync_to_async(self.context.load)()
+            token = await database_sync_to_async(model_tokens.get)(model_data['model']['id']) if model_data else None
+            if token is not None:
+                self.model = GptModels(**{field: model_data['model'][field] for field in MODEL_FIELDS}, token=token)
+                time_window = timedelta(minutes=self.model.time_window)
+                self.time_start = max(self.current_time - time_window, datetime.fromisoformat(model_data['time_start']))
+                return
+            # модель удалена: контекст заполняется заново вместе с моделью из БД
+            self.context_entries = None
+        await self.init_user_model_from_db()
 
     @database_sync_to_async
-    def init_user_model(self):
+    def init_user_model_from_db(self):
         """Инициация активной модели юзера и начального времени истории в prompt для запроса."""
         if self.is_user_authenticated:
             self.user_models, created = UserGptModels.objects.get_or_create(user=self.user, defaults={'time_start': self.current_time})
@@ -205,15 +590,36 @@ class GetAnswerGPT():
         else:
             self.model = GptModels.objects.filter(default=True).first()
 
+    @property
+    def context_model_data(self) -> dict:
+        return {
+            'model': {field: getattr(self.model, field) for field in MODEL_FIELDS},
+            'time_start': self.user_models.time_start.isoformat(),
+        }
+
+    async def append_context(self) -> None:
+        """Дополняет контекст Redis вопросом и ответом этого запроса."""
+        if self.context and self.return_text and self.history_model is HistoryAI:
+            await sync_to_async(self.context.append)(
+                self.history_instance.id, self.query_text, self.query_text_tokens, self.return_text, self.return_text_tokens, self.context_kept
+            )
+
+    @database_sync_to_async
+    def check_token_quota(self) -> None:
+        """Проверяет суточный лимит токенов пользователя по модели одной строкой `TokenUsage`."""
+        if self.is_user_authenticated and self.model.daily_token_limit:
+            if TokenUsage.used_tokens(self.user.id, self.model.title) >= self.model.daily_token_limit:
+                raise TokenQuotaError(f'Лимит токенов модели `{self.model.title}` на сегодня исчерпан.', log_traceback=False)
+
     @sync_to_async
-    def check_in_works(self) -> bool:
-        """Проверяет нет ли уже в работе этого запроса в Redis и добавляет в противном случае."""
-        queries = redis_client.lrange(f'gpt_user:{self.user.id}', 0, -1)
-        if self.query_text.encode('utf-8') in queries:
+    def check_in_works(self) -> None:
+        """Отмечает запрос в работе в Redis, если такой же запрос уже в работе — InWorkError."""
+        self.in_flight = InFlightRequest('gpt', self.in_flight_owner, self.query_text, self.MAX_TYPING_TIME * 60 * 1000)
+        if not self.in_flight.acquire():
             raise InWorkError('Запрос уже находится в работе.')
-        redis_client.lpush(f'gpt_user:{self.user.id}', self.query_text)
 
     @sync_to_async
     def del_mess_in_redis(self) -> None:
-        """Удаляет входящее сообщение из Redis."""
-        redis_client.lrem(f'gpt_user:{self.user.id}', 1, self.query_text.encode('utf-8'))
+        """Снимает отметку запроса в работе."""
+        if self.in_flight:
+            self.in_flight.release()
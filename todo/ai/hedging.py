@@ -0,0 +1,75 @@
+import asyncio
+import math
+
+from django.conf import settings
+
+redis_client = settings.REDIS_CLIENT
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyTracker:
+    """
+    Скользящая задержка ответов моделей `GptModels` по последним `window` запросам.
+
+    Для потоковых запросов учитывается время до первого токена, для остальных — до
+    получения ответа целиком. Выборки общие для всех процессов и хранятся в Redis.
+
+    ### Args:
+    - window (`int`): Количество последних запросов в выборке.
+    - min_samples (`int`): Минимальный размер выборки для расчёта перцентиля.
+
+    """
+
+    def __init__(self, window: int, min_samples: int) -> None:
+        self.window = window
+        self.min_samples = min_samples
+
+    @staticmethod
+    def key(model_id: int, stream: bool) -> str:
+        return f'gpt_latency:{model_id}:{"first_token" if stream else "total"}'
+
+    def record(self, model_id: int, stream: bool, seconds: float) -> None:
+        key = self.key(model_id, stream)
+        pipe = redis_client.pipeline()
+        pipe.lpush(key, round(seconds, 3))
+        pipe.ltrim(key, 0, self.window - 1)
+        pipe.expire(key, 7 * 24 * 60 * 60)
+        pipe.execute()
+
+    def p95(self, model_id: int, stream: bool) -> float | None:
+        """95-й перцентиль задержки, None пока выборка меньше `min_samples`."""
+        samples = [float(value) for value in redis_client.lrange(self.key(model_id, stream), 0, -1)]
+        if len(samples) < self.min_samples:
+            return None
+        return percentile(samples, 95)
+
+
+latency_tracker = LatencyTracker(settings.GPT_LATENCY_WINDOW, settings.GPT_LATENCY_MIN_SAMPLES)
+
+
+class HedgeRace:
+    """
+    Выбор первого ответа из основного и резервного запросов к моделям.
+
+    Потоковый запрос побеждает на первом токене, остальные — получив ответ целиком.
+    Победитель отменяет остальные запросы, проигравшие не передают частичный ответ.
+    """
+
+    def __init__(self) -> None:
+        self.winner = None
+        self.tasks: dict[object, asyncio.Task] = {}
+
+    def claim(self, attempt: object) -> bool:
+        """Объявляет запрос победителем, если победителя ещё нет."""
+        if self.winner is None:
+            self.winner = attempt
+            for other, task in self.tasks.items():
+                if other is not attempt:
+                    task.cancel()
+        return self.winner is attempt
@@ -0,0 +1,53 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+
+redis_client = settings.REDIS_CLIENT
+
+# удаляет ключ, только если он всё ещё принадлежит этому запросу
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+class InFlightRequest:
+    """
+    Отметка запроса к ИИ, находящегося в работе.
+
+    Ключ — хэш владельца (пользователь или комната) и нормализованного текста,
+    устанавливается атомарно `SET NX PX` и сам истекает через `ttl_ms`, если воркер
+    упал до снятия отметки. Снимается только владельцем отметки.
+
+    ### Args:
+    - namespace (`str`): Пространство имён отметок: `gpt`, `dalle` и т.п.
+    - owner (`int | str`): Пользователь или комната, отправившие запрос.
+    - text (`str`): Текст запроса.
+    - ttl_ms (`int`): Время жизни отметки, мс.
+
+    """
+    release_script = redis_client.register_script(RELEASE_SCRIPT)
+
+    def __init__(self, namespace: str, owner: int | str, text: str, ttl_ms: int) -> None:
+        digest = hashlib.sha1(f'{owner}:{normalize_text(text)}'.encode('utf-8')).hexdigest()
+        self.key = f'in_flight:{namespace}:{digest}'
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+        self.acquired = False
+
+    def acquire(self) -> bool:
+        """Отмечает запрос, False если такой же запрос уже в работе."""
+        self.acquired = bool(redis_client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        return self.acquired
+
+    def release(self) -> None:
+        if self.acquired:
+            self.release_script(keys=[self.key], args=[self.token])
+            self.acquired = False
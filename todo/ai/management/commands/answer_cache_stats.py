@@ -0,0 +1,11 @@
+import json
+
+from ai.answer_cache import cache_stats
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Попадания и промахи кэша ответов ИИ'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(cache_stats(), indent=2))
@@ -0,0 +1,167 @@
+"""
+Сравнение клиента на каждый запрос и пула соединений `OpenAIClientPool` на локальном сервере-заглушке.
+
+    python manage.py benchmark_openai_client --updates 50 --requests-per-update 2 --handshake-ms 150
+
+Заглушка отвечает фиксированным chat completion и задерживает каждое новое соединение
+на `--handshake-ms`, имитируя рукопожатия SOCKS5 прокси и TLS до api.openai.com.
+Каждый апдейт Телеграм выполняется отдельным вызовом, как в обработчиках бота:
+`per_request` — `asyncio.run` и новый клиент на запрос (прежнее поведение),
+`pooled` — `run_in_thread_loop` и общий клиент пула.
+"""
+import asyncio
+import json
+import ssl
+import threading
+import time
+
+import httpx
+from ai.hedging import percentile
+from ai.openai_client import OpenAIClientPool, get_limits, run_in_thread_loop
+from django.core.management.base import BaseCommand
+
+COMPLETION = json.dumps({
+    'choices': [{'message': {'role': 'assistant', 'content': 'ok'}}],
+    'usage': {'prompt_tokens': 10, 'completion_tokens': 1},
+}).encode()
+
+
+class StandInServer:
+    """
+    HTTP/1.1 сервер-заглушка OpenAI в отдельном потоке с keep-alive.
+
+    ### Args:
+    - handshake_ms (`float`): Задержка установки каждого нового соединения, мс.
+    - ssl_context (`ssl.SSLContext`, optional): Контекст TLS, если нужен https.
+
+    """
+
+    def __init__(self, handshake_ms: float = 0, ssl_context: ssl.SSLContext = None) -> None:
+        self.handshake = handshake_ms / 1000
+        self.ssl_context = ssl_context
+        self.connections = 0
+        self.requests = 0
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f'{"https" if self.ssl_context else "http"}://{host}:{port}'
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.decode('latin-1').split('\r\n'):
+                    name, _, value = line.partition(':')
+                    if name.lower() == 'content-length':
+                        length = int(value)
+                await reader.readexactly(length)
+                self.requests += 1
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    + f'Content-Length: {len(COMPLETION)}\r\n\r\n'.encode() + COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def start(self) -> 'StandInServer':
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle, '127.0.0.1', 0, ssl=self.ssl_context), self.loop
+        ).result()
+        return self
+
+    def stop(self) -> None:
+        self.server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def post_completion(client: httpx.AsyncClient, latencies: list[float]) -> None:
+    started = time.perf_counter()
+    response = await client.post('/chat/completions', json={'model': 'stand-in', 'messages': []})
+    response.raise_for_status()
+    response.json()
+    latencies.append(time.perf_counter() - started)
+
+
+def run_per_request(base_url: str, updates: int, requests_per_update: int, verify) -> list[float]:
+    """Прежнее поведение: `asyncio.run` на апдейт и новый клиент на каждый запрос."""
+    latencies = []
+
+    async def update():
+        for _ in range(requests_per_update):
+            async with httpx.AsyncClient(base_url=base_url, verify=verify) as client:
+                await post_completion(client, latencies)
+
+    for _ in range(updates):
+        asyncio.run(update())
+    return latencies
+
+
+def run_pooled(base_url: str, updates: int, requests_per_update: int, verify) -> list[float]:
+    """Постоянный event loop потока и общий клиент из пула."""
+    latencies = []
+    pool = OpenAIClientPool(base_url, lambda: httpx.AsyncHTTPTransport(verify=verify, limits=get_limits()))
+
+    async def update():
+        for _ in range(requests_per_update):
+            await post_completion(pool.get(), latencies)
+
+    for _ in range(updates):
+        run_in_thread_loop(update())
+    run_in_thread_loop(pool.aclose())
+    return latencies
+
+
+MODES = {
+    'per_request': run_per_request,
+    'pooled': run_pooled,
+}
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк пула соединений OpenAI на локальном сервере-заглушке'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--updates', type=int, default=50, help='Количество апдейтов.')
+        parser.add_argument('--requests-per-update', type=int, default=1, help='Запросов в OpenAI на апдейт.')
+        parser.add_argument('--handshake-ms', type=float, default=100, help='Задержка установки соединения, мс.')
+        parser.add_argument('--certfile', help='Сертификат для TLS заглушки.')
+        parser.add_argument('--keyfile', help='Ключ для TLS заглушки.')
+
+    def handle(self, *args, **options):
+        ssl_context = None
+        if options['certfile']:
+            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            ssl_context.load_cert_chain(options['certfile'], options['keyfile'])
+        results = {}
+        for mode, runner in MODES.items():
+            server = StandInServer(options['handshake_ms'], ssl_context).start()
+            started = time.perf_counter()
+            try:
+                latencies = runner(server.url, options['updates'], options['requests_per_update'], not ssl_context)
+            finally:
+                server.stop()
+            results[mode] = {
+                'connections': server.connections,
+                'requests': server.requests,
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'elapsed_s': round(time.perf_counter() - started, 3),
+            }
+        self.stdout.write(json.dumps(results, indent=2))
+        saved = results['per_request']['elapsed_s'] - results['pooled']['elapsed_s']
+        self.stdout.write(self.style.SUCCESS(
+            f'Пул: {results["pooled"]["connections"]} соединений вместо {results["per_request"]["connections"]}, '
+            f'экономия {saved:.2f} с'
+        ))
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import weakref
+from typing import Any, Coroutine
+
+import httpx
+from django.conf import settings
+from httpx_socks import AsyncProxyTransport
+
+OPENAI_API_URL = 'https://api.openai.com/v1'
+
+
+def get_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def create_transport() -> httpx.AsyncBaseTransport:
+    """Транспорт с пулом соединений, через SOCKS5 прокси если он задан."""
+    if settings.SOCKS5:
+        return AsyncProxyTransport.from_url(settings.SOCKS5, http2=settings.OPENAI_HTTP2, limits=get_limits())
+    return httpx.AsyncHTTPTransport(http2=settings.OPENAI_HTTP2, limits=get_limits())
+
+
+class OpenAIClientPool:
+    """
+    Долгоживущие `httpx.AsyncClient` к OpenAI, по одному на event loop.
+
+    Соединения asyncio привязаны к циклу, в котором открыты, поэтому клиент создаётся
+    для каждого работающего цикла и переиспользуется всеми запросами в нём: прокси
+    и TLS рукопожатия выполняются один раз на соединение, а не на каждый запрос.
+    Клиенты закрытых циклов отбрасываются при следующем обращении.
+
+    ### Args:
+    - base_url (`str`, optional): Адрес API.
+    - transport_factory (`Callable`, optional): Фабрика транспорта для нового клиента.
+
+    """
+
+    def __init__(self, base_url: str = OPENAI_API_URL, transport_factory=create_transport) -> None:
+        self.base_url = base_url
+        self.transport_factory = transport_factory
+        self.clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def get(self) -> httpx.AsyncClient:
+        """Клиент текущего event loop, создаётся при первом обращении."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self.clients.get(loop)
+            if client is None or client.is_closed:
+                for stale_loop in [item for item in self.clients if item.is_closed()]:
+                    del self.clients[stale_loop]
+                client = self.clients[loop] = httpx.AsyncClient(
+                    base_url=self.base_url,
+                    transport=self.transport_factory(),
+                    timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=10),
+                )
+        return client
+
+    async def aclose(self) -> None:
+        """Закрывает клиент текущего event loop."""
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            client = self.clients.pop(loop, None)
+        if client:
+            await client.aclose()
+
+
+openai_pool = OpenAIClientPool()
+
+
+def get_openai_client() -> httpx.AsyncClient:
+    return openai_pool.get()
+
+
+_thread_loops = threading.local()
+
+
+def run_in_thread_loop(coro: Coroutine) -> Any:
+    """
+    Замена `asyncio.run` для синхронных обработчиков, вызываемых на каждый апдейт.
+
+    Event loop создаётся один раз на поток и не закрывается, поэтому пул соединений
+    `OpenAIClientPool` переживает обработку отдельных сообщений. Как и `asyncio.run`,
+    по завершении корутины отменяет оставшиеся в цикле задачи.
+
+    ### Args:
+    - coro (`Coroutine`): Выполняемая корутина.
+
+    """
+    loop = getattr(_thread_loops, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _thread_loops.loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        asyncio.set_event_loop(None)
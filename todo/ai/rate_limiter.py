@@ -0,0 +1,155 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+from ai.gpt_exception import OpenAIRateLimitError
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Model
+
+redis_client = settings.REDIS_CLIENT
+
+# Два ведра в одном хэше: запросы (RPM) и токены (TPM), наполняются непрерывно за минуту.
+# Возвращает 0 и списывает запрос с токенами, либо время ожидания в мс без списания.
+RESERVE_SCRIPT = """
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local now = tonumber(ARGV[1])
+local state = redis.call('hmget', KEYS[1], 'requests', 'tokens', 'ts')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+requests = math.min(rpm, requests + elapsed * rpm / 60000)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60000)
+local cost = math.min(tonumber(ARGV[4]), tpm)
+local wait = 0
+if rpm > 0 and requests < 1 then
+    wait = (1 - requests) * 60000 / rpm
+end
+if tpm > 0 and tokens < cost then
+    wait = math.max(wait, (cost - tokens) * 60000 / tpm)
+end
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - cost
+end
+redis.call('hset', KEYS[1], 'requests', tostring(requests), 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('pexpire', KEYS[1], 60000)
+return math.ceil(wait)
+"""
+
+# Возвращает в ведро TPM разницу между оценкой и фактическим расходом токенов.
+SETTLE_SCRIPT = """
+local tokens = tonumber(redis.call('hget', KEYS[1], 'tokens'))
+if tokens then
+    tokens = math.min(tonumber(ARGV[2]), tokens + tonumber(ARGV[1]))
+    redis.call('hset', KEYS[1], 'tokens', tostring(tokens))
+end
+return 0
+"""
+
+
+class OpenAIRateLimiter:
+    """
+    Общий для всех процессов лимит запросов к OpenAI по модели `GptModels`.
+
+    Запросы в минуту (`rpm_limit`) и токены в минуту (`tpm_limit`) учитываются
+    token bucket в Redis, резервирование атомарно выполняется скриптом Lua.
+    Нулевой лимит не ограничивает.
+
+    ### Args:
+    - prefix (`str`, optional): Префикс ключей Redis.
+
+    """
+    reserve_script = redis_client.register_script(RESERVE_SCRIPT)
+    settle_script = redis_client.register_script(SETTLE_SCRIPT)
+
+    def __init__(self, prefix: str = 'openai_rate') -> None:
+        self.prefix = prefix
+
+    def key(self, model: Model) -> str:
+        return f'{self.prefix}:{model.id}'
+
+    @staticmethod
+    def is_limited(model: Model) -> bool:
+        return bool(model.rpm_limit or model.tpm_limit)
+
+    def reserve(self, model: Model, tokens: int) -> float:
+        """Резервирует запрос и токены, возвращает время ожидания в секундах, 0 — резерв выполнен."""
+        now_ms = int(time.time() * 1000)
+        wait_ms = self.reserve_script(
+            keys=[self.key(model)],
+            args=[now_ms, model.rpm_limit, model.tpm_limit, tokens],
+        )
+        return int(wait_ms) / 1000
+
+    async def acquire(self, model: Model, tokens: int, deadline: float) -> None:
+        """
+        Ожидает свободного места в лимитах модели.
+
+        ### Args:
+        - model (`Model`): Модель GPT.
+        - tokens (`int`): Оценка токенов запроса вместе с ответом.
+        - deadline (`float`): Крайний срок по `time.monotonic()`.
+
+        ### Raises:
+        - OpenAIRateLimitError: Место не освободится до `deadline`.
+
+        """
+        if not self.is_limited(model):
+            return
+        while wait := await sync_to_async(self.reserve)(model, tokens):
+            # небольшой разброс, чтобы ожидающие процессы не пришли в Redis одновременно
+            wait += random.uniform(0, min(wait, 1))
+            if time.monotonic() + wait > deadline:
+                raise OpenAIRateLimitError(f'`{model.title}`, лимит освободится через {wait:.1f} с')
+            await asyncio.sleep(wait)
+
+    async def settle(self, model: Model, estimated: int, used: int) -> None:
+        """Корректирует ведро TPM по фактическому расходу токенов."""
+        if model.tpm_limit and used is not None and estimated != used:
+            await sync_to_async(self.settle_script)(keys=[self.key(model)], args=[estimated - used, model.tpm_limit])
+
+
+rate_limiter = OpenAIRateLimiter()
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """Задержка из заголовков `retry-after-ms` или `Retry-After` (секунды либо HTTP дата)."""
+    if retry_after_ms := response.headers.get('retry-after-ms'):
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = response.headers.get('retry-after')
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """
+    Задержка перед повтором запроса после 429.
+
+    Экспоненциальная задержка с разбросом в верхней половине интервала, но не меньше
+    `Retry-After`, если сервер его прислал.
+
+    ### Args:
+    - attempt (`int`): Номер повтора, начиная с 0.
+    - retry_after (`float`, optional): Задержка, запрошенная сервером, сек.
+
+    """
+    ceiling = settings.OPENAI_RETRY_BASE_DELAY * 2 ** attempt
+    delay = random.uniform(ceiling / 2, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, settings.OPENAI_RETRY_BASE_DELAY / 2))
+    return delay
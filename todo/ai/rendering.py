@@ -0,0 +1,15 @@
+import markdown
+
+
+def convert_markdown(text: str) -> str:
+    """
+    Конвертирует теги Markdown в HTML-теги
+
+    ### Args:
+    - text (str): Входной текст для конвертации.
+
+    ### Return:
+    - (str): Текст с замененными тегами
+    """
+
+    return markdown.markdown(text, extensions=['fenced_code'])
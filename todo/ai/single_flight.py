@@ -0,0 +1,100 @@
+import hashlib
+import json
+import time
+import uuid
+
+from ai.in_flight import RELEASE_SCRIPT
+from django.conf import settings
+
+redis_client = settings.REDIS_CLIENT
+
+
+class SingleFlight:
+    """
+    Один запрос к OpenAI на одинаковые одновременные prompt во всех процессах.
+
+    Ключ — хэш модели, полного списка сообщений и температуры. Первый запрос
+    становится ведущим (`SET NX PX` со своим токеном), остальные запоминают токен
+    ведущего, подписываются на его канал Redis и ждут ответа вместе с количеством
+    токенов. Ответ дублируется в ключ с токеном ведущего и коротким TTL для
+    подписавшихся после публикации, поэтому ответ завершённого запроса не попадает
+    к ожидающим следующего. Если ведущий завершился ошибкой или пропал,
+    ожидающие получают `None` и выполняют запрос сами.
+
+    ### Args:
+    - payload (`dict`): Модель, сообщения и температура запроса.
+    - ttl_ms (`int`): Время жизни отметки ведущего запроса, мс.
+
+    """
+    RESULT_TTL_MS = 10_000
+    POLL_INTERVAL = 0.5  # проверка, что ведущий запрос ещё жив, сек
+    release_script = redis_client.register_script(RELEASE_SCRIPT)
+
+    def __init__(self, payload: dict, ttl_ms: int) -> None:
+        self.digest = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        self.lock_key = f'single_flight:lock:{self.digest}'
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+        self.leader = False
+        self.leader_token = None
+
+    def result_key(self, token: str) -> str:
+        return f'single_flight:result:{self.digest}:{token}'
+
+    def channel(self, token: str) -> str:
+        return f'single_flight:{self.digest}:{token}'
+
+    def lead(self) -> bool:
+        """Становится ведущим, если такого запроса ещё нет в работе, иначе запоминает токен ведущего."""
+        while True:
+            self.leader = bool(redis_client.set(self.lock_key, self.token, nx=True, px=self.ttl_ms))
+            if self.leader:
+                self.leader_token = self.token
+                return True
+            # ведущий мог завершиться между SET и GET
+            if leader_token := redis_client.get(self.lock_key):
+                self.leader_token = leader_token.decode()
+                return False
+
+    def wait(self, timeout: float) -> dict | None:
+        """
+        Ожидает ответа ведущего запроса, блокирует поток.
+
+        ### Args:
+        - timeout (`float`): Максимальное время ожидания, сек.
+
+        ### Returns:
+        - dict | None: Ответ `{text, prompt_tokens, completion_tokens}` или None.
+
+        """
+        result_key = self.result_key(self.leader_token)
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel(self.leader_token))
+        try:
+            # ответ мог быть опубликован до подписки
+            if result := redis_client.get(result_key):
+                return json.loads(result)
+            stop = time.monotonic() + timeout
+            while (remaining := stop - time.monotonic()) > 0:
+                message = pubsub.get_message(timeout=min(self.POLL_INTERVAL, remaining))
+                if message:
+                    return json.loads(message['data']) or None
+                if redis_client.get(self.lock_key) != self.leader_token.encode():
+                    result = redis_client.get(result_key)
+                    return json.loads(result) if result else None
+            return None
+        finally:
+            pubsub.close()
+
+    def share(self, result: dict | None) -> None:
+        """Публикует ответ ведущего запроса, `None` — запрос завершился ошибкой."""
+        if not self.leader:
+            return
+        message = json.dumps(result or {}, ensure_ascii=False)
+        pipe = redis_client.pipeline()
+        if result:
+            pipe.set(self.result_key(self.token), message, px=self.RESULT_TTL_MS)
+        pipe.publish(self.channel(self.token), message)
+        pipe.execute()
+        self.release_script(keys=[self.lock_key], args=[self.token])
+        self.leader = False
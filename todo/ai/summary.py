@@ -0,0 +1,161 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from ai.context import RedisContext
+from ai.openai_client import get_openai_client, run_in_thread_loop
+from ai.rate_limiter import rate_limiter
+from ai.tokenizer import count_tokens
+from django.conf import settings
+from django.utils.timezone import localdate, now
+from telbot.models import (GptModels, HistoryAI, HistorySummary, TokenUsage,
+                           UserGptModels)
+
+redis_client = settings.REDIS_CLIENT
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    'Ты сворачиваешь начало диалога пользователя с ассистентом Ева в краткое содержание, '
+    'которое заменит эти сообщения в следующих запросах. Сохрани факты о пользователе, '
+    'темы и выводы, договорённости, открытые вопросы и точные детали: имена, числа, даты, код. '
+    'Если дано предыдущее краткое содержание, дополни его. Пиши кратко, без вступлений.'
+)
+
+SUMMARY_MESSAGE = 'Краткое содержание предыдущей части диалога:\n{}'
+
+
+class HistorySummarizer:
+    """
+    Сворачивает старые вопросы и ответы пользователя в краткое содержание `HistorySummary`.
+
+    Берутся ещё не свёрнутые записи `HistoryAI` из окна истории. Если вместе они больше
+    `GPT_SUMMARY_THRESHOLD` токенов, все, кроме последних `GPT_SUMMARY_KEEP_TOKENS` токенов,
+    вместе с прежним кратким содержанием отправляются модели пользователя на пересказ.
+    Результат сохраняется в Postgres и в контекст Redis, одновременно для пользователя
+    работает только один пересказ. Токены пересказа учитываются в `TokenUsage` пользователя,
+    при исчерпанном суточном лимите модели история не сворачивается.
+
+    ### Args:
+    - user_id (`int`): ID пользователя.
+
+    """
+    LOCK_TTL = 5 * 60
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+        self.lock_key = f'gpt_summary_lock:{user_id}'
+
+    def run(self) -> HistorySummary | None:
+        """Сворачивает историю, если она превысила порог, и возвращает новое краткое содержание."""
+        if not redis_client.set(self.lock_key, 1, nx=True, ex=self.LOCK_TTL):
+            return None
+        try:
+            return self.summarize()
+        finally:
+            redis_client.delete(self.lock_key)
+
+    def summarize(self) -> HistorySummary | None:
+        model, time_start = self.get_model()
+        if not model:
+            return None
+        if model.daily_token_limit and TokenUsage.used_tokens(self.user_id, model.title) >= model.daily_token_limit:
+            return None
+        previous = HistorySummary.objects.filter(user_id=self.user_id).first()
+        if previous and previous.summarized_until < time_start:
+            # всё свёрнутое вышло из окна истории, содержание собирается заново
+            previous = None
+        turns = list(
+            HistoryAI.objects.filter(
+                user_id=self.user_id,
+                created_at__gte=time_start,
+                id__gt=previous.last_history_id if previous else 0,
+            ).exclude(
+                answer__isnull=True
+            ).order_by(
+                'created_at', 'id'
+            ).values(
+                'id', 'question', 'question_tokens', 'answer', 'answer_tokens', 'created_at'
+            )
+        )
+        folded = self.split_turns(turns)
+        if not folded:
+            return None
+
+        summary, prompt_tokens, summary_tokens = run_in_thread_loop(self.request_summary(model, previous, folded))
+        TokenUsage.add(self.user_id, model.title, localdate(), 1, prompt_tokens, summary_tokens)
+        instance, _ = HistorySummary.objects.update_or_create(
+            user_id=self.user_id,
+            defaults={
+                'summary': summary,
+                'summary_tokens': summary_tokens,
+                'last_history_id': folded[-1]['id'],
+                'started_at': previous.started_at if previous else folded[0]['created_at'],
+                'summarized_until': folded[-1]['created_at'],
+            }
+        )
+        RedisContext(self.user_id).set_summary(instance.context_data)
+        return instance
+
+    def get_model(self) -> tuple[GptModels | None, datetime]:
+        """Активная модель пользователя и начало окна истории, как в `GetAnswerGPT`."""
+        current_time = now()
+        user_models = UserGptModels.objects.select_related('active_model').filter(user_id=self.user_id).first()
+        model = user_models.active_model if user_models else None
+        model = model or GptModels.objects.filter(default=True).first()
+        if not model:
+            return None, current_time
+        time_start = current_time - timedelta(minutes=model.time_window)
+        if user_models:
+            time_start = max(time_start, user_models.time_start)
+        return model, time_start
+
+    @staticmethod
+    def split_turns(turns: list[dict]) -> list[dict]:
+        """
+        Старые записи, которые нужно свернуть, или пустой список, если история меньше порога.
+
+        Последние записи на `GPT_SUMMARY_KEEP_TOKENS` токенов остаются в prompt как есть.
+        """
+        # +11 - токены для ролей и разделителей пары вопрос-ответ
+        tokens = [(turn['question_tokens'] or 0) + (turn['answer_tokens'] or 0) + 11 for turn in turns]
+        if sum(tokens) < settings.GPT_SUMMARY_THRESHOLD:
+            return []
+        split, kept = len(turns), 0
+        while split and kept + tokens[split - 1] <= settings.GPT_SUMMARY_KEEP_TOKENS:
+            split -= 1
+            kept += tokens[split]
+        return turns[:split]
+
+    @staticmethod
+    async def request_summary(model: GptModels, previous: HistorySummary | None, turns: list[dict]) -> tuple[str, int, int]:
+        """Запрос краткого содержания к модели с учётом её общих лимитов, возвращает текст и токены запроса и ответа."""
+        dialog = '\n\n'.join(f'Пользователь: {turn["question"]}\nЕва: {turn["answer"]}' for turn in turns)
+        content = f'Предыдущее краткое содержание:\n{previous.summary}\n\nДиалог:\n{dialog}' if previous else f'Диалог:\n{dialog}'
+        messages = [{'role': 'system', 'content': SUMMARY_PROMPT}, {'role': 'user', 'content': content}]
+        prompt_tokens = sum(await count_tokens(model.title, [SUMMARY_PROMPT, content])) + 11
+        estimated = prompt_tokens + settings.GPT_SUMMARY_MAX_TOKENS
+        await rate_limiter.acquire(model, estimated, time.monotonic() + settings.GPT_LATENCY_BUDGET)
+        used = 0
+        try:
+            response = await get_openai_client().post(
+                '/chat/completions',
+                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {model.token}'},
+                json={
+                    'model': model.title,
+                    'messages': messages,
+                    'temperature': 0.2,
+                    'max_tokens': settings.GPT_SUMMARY_MAX_TOKENS,
+                },
+            )
+            response.raise_for_status()
+            completion = response.json()
+            usage = completion.get('usage', {})
+            summary = completion['choices'][0]['message']['content']
+            prompt_tokens = usage.get('prompt_tokens', prompt_tokens)
+            summary_tokens = usage.get('completion_tokens') or (await count_tokens(model.title, [summary]))[0]
+            used = prompt_tokens + summary_tokens
+        finally:
+            await rate_limiter.settle(model, estimated, used)
+        logger.info('История пользователя свёрнута: %s записей, %s токенов в prompt', len(turns), prompt_tokens)
+        return summary, prompt_tokens, summary_tokens
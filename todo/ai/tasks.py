@@ -0,0 +1,13 @@
+from ai.summary import HistorySummarizer
+
+from todo.celery import app
+
+
+@app.task(ignore_result=True)
+def summarize_history(user_id: int) -> None:
+    """
+    Сворачивает старую историю диалога пользователя с ИИ в краткое содержание.
+    ### Args:
+    - user_id (:obj:`int`)
+    """
+    HistorySummarizer(user_id).run()
@@ -0,0 +1,35 @@
+from unittest import mock
+
+import httpx
+from ai.gpt_query import GetAnswerGPT
+
+
+class OpenAIMockMixin:
+    """Запросы `GetAnswerGPT` к OpenAI без сети: модель без лимитов и клиент на `httpx.MockTransport`."""
+
+    @staticmethod
+    def mock_model(**fields) -> mock.Mock:
+        """Модель без лимитов запросов и резервной модели, `fields` заменяют или дополняют поля."""
+        return mock.Mock(**{'title': 'gpt-test', 'token': 'token', 'rpm_limit': 0, 'tpm_limit': 0, 'fallback_model_id': None, **fields})
+
+    def make_answer(self, query_text: str = 'вопрос', assist_prompt: str = 'prompt', *, answer_class: type = GetAnswerGPT, user=None, model=None, **kwargs) -> GetAnswerGPT:
+        """
+        Запрос к модели `model` или `mock_model()` от аутентифицированного пользователя.
+
+        ### Args:
+        - answer_class (`type`, optional): Класс запроса, наследник `GetAnswerGPT`.
+        - user (optional): Пользователь запроса.
+        - model (optional): Модель запроса.
+        - kwargs: Остальные аргументы конструктора `answer_class`.
+
+        """
+        answer = answer_class(query_text, assist_prompt, user or mock.Mock(is_authenticated=True), mock.Mock(), **kwargs)
+        answer.model = model or self.mock_model()
+        return answer
+
+    def mock_openai(self, handler) -> None:
+        """Подменяет клиент OpenAI до конца теста, запросы обрабатывает `handler`."""
+        client = httpx.AsyncClient(base_url='http://openai', transport=httpx.MockTransport(handler))
+        patcher = mock.patch('ai.gpt_query.get_openai_client', return_value=client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
@@ -0,0 +1,168 @@
+import asyncio
+import json
+from unittest import mock
+from uuid import uuid4
+
+import httpx
+from ai.answer_cache import (STATS_KEY, AnswerCache, cache_stats,
+                             normalize_question, numbers_signature,
+                             redis_client, simhash)
+from ai.gpt_query import GetAnswerGPT
+from ai.tests.mixins import OpenAIMockMixin
+from django.test import SimpleTestCase, override_settings
+
+
+def hamming(first, second):
+    return bin(first ^ second).count('1')
+
+
+@override_settings(GPT_ANSWER_CACHE_TTL=60, GPT_ANSWER_CACHE_MAX_ENTRIES=3, GPT_ANSWER_CACHE_SIMHASH_DISTANCE=8)
+class AnswerCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = AnswerCache('gpt-test', uuid4().hex, 0.1)
+        self.answer = {'text': '20.11.2025 17:35|30|N|Запись к врачу', 'prompt_tokens': 40, 'completion_tokens': 12}
+        redis_client.delete(STATS_KEY)
+
+    def tearDown(self):
+        keys = list(redis_client.scan_iter(f'{self.cache.prefix}*'))
+        redis_client.delete(STATS_KEY, *keys)
+
+    def test_exact_hit_on_normalized_text(self):
+        self.cache.set('Запись к врачу 20.11.2025 в 17:35', self.answer)
+
+        self.assertEqual(self.cache.get('  запись к ВРАЧУ 20.11.2025   в 17:35 '), self.answer)
+
+    def test_near_duplicate_hit(self):
+        text = 'Напомни записаться к врачу-терапевту 20.11.2025 в 17:35 за полчаса'
+        near = 'Напомни записатся к врачу-терапевту 20.11.2025 в 17:35 за полчаса'
+        self.assertLessEqual(hamming(simhash(normalize_question(text)), simhash(normalize_question(near))), 8)
+        self.cache.set(text, self.answer)
+
+        self.assertEqual(self.cache.get(near), self.answer)
+
+    def test_different_numbers_never_near(self):
+        """Тексты, различающиеся датой или временем, не считаются близкими."""
+        self.cache.set('Напомни записаться к врачу-терапевту 20.11.2025 в 17:35 за полчаса', self.answer)
+
+        self.assertIsNone(self.cache.get('Напомни записаться к врачу-терапевту 21.11.2025 в 17:35 за полчаса'))
+
+    def test_unrelated_text_misses(self):
+        self.cache.set('Напомни записаться к врачу 20.11.2025 в 17:35', self.answer)
+
+        self.assertIsNone(self.cache.get('Купить хлеб и молоко 20.11.2025 в 17:35'))
+
+    def test_scope_by_prompt(self):
+        self.cache.set('Вопрос', self.answer)
+        other = AnswerCache('gpt-test', 'другой промпт', 0.1)
+
+        self.assertIsNone(other.get('Вопрос'))
+
+    def test_scope_by_owner(self):
+        """Записи с владельцем не видны другим пользователям и общему кэшу."""
+        own = AnswerCache('gpt-test', self.cache.prefix, 0.1, owner=1)
+        self.addCleanup(lambda: redis_client.delete(*redis_client.scan_iter(f'{own.prefix}*')))
+        own.set('Напомни забрать посылку завтра в 10:00', self.answer)
+
+        self.assertEqual(own.get('Напомни забрать посылку завтра в 10:00'), self.answer)
+        self.assertIsNone(AnswerCache('gpt-test', self.cache.prefix, 0.1, owner=2).get('Напомни забрать посылку завтра в 10:00'))
+        self.assertIsNone(AnswerCache('gpt-test', self.cache.prefix, 0.1).get('Напомни забрать посылку завтра в 10:00'))
+
+    def test_size_bound_evicts_oldest(self):
+        for number in range(5):
+            self.cache.set(f'вопрос номер {number}', {**self.answer, 'text': str(number)})
+
+        self.assertEqual(redis_client.zcard(self.cache.index_key), 3)
+        self.assertEqual(redis_client.hlen(self.cache.simhash_key), 3)
+        self.assertIsNone(self.cache.get('вопрос номер 0'))
+        self.assertEqual(self.cache.get('вопрос номер 4')['text'], '4')
+
+    def test_ttl(self):
+        self.cache.set('Вопрос', self.answer)
+
+        self.assertLessEqual(redis_client.ttl(self.cache.entry_key(self.cache.digest('вопрос'))), 60)
+
+    def test_hit_ratio(self):
+        self.cache.set('Напомни записаться к врачу-терапевту 20.11.2025 в 17:35 за полчаса', self.answer)
+        self.cache.get('напомни записаться к врачу-терапевту 20.11.2025 в 17:35 за полчаса')
+        self.cache.get('Напомни записатся к врачу-терапевту 20.11.2025 в 17:35 за полчаса')
+        self.cache.get('Купить хлеб')
+        self.cache.get('Купить молоко')
+
+        self.assertEqual(cache_stats(), {'hits_exact': 1, 'hits_near': 1, 'misses': 2, 'hit_ratio': 0.5})
+
+    def test_numbers_signature(self):
+        self.assertEqual(numbers_signature('20.11.2025 17:35'), '20,11,2025,17,35')
+
+
+@override_settings(GPT_ANSWER_CACHE_TTL=60)
+class AnswerCacheDefaultDistanceTest(SimpleTestCase):
+    """По умолчанию ищется только точное совпадение: близкие по simhash тексты могут значить разное."""
+
+    def setUp(self):
+        self.cache = AnswerCache('gpt-test', uuid4().hex, 0.1)
+        self.addCleanup(lambda: redis_client.delete(STATS_KEY, *redis_client.scan_iter(f'{self.cache.prefix}*')))
+
+    def assert_near_miss(self, cached, asked, distance):
+        self.assertLessEqual(hamming(simhash(normalize_question(cached)), simhash(normalize_question(asked))), distance)
+        self.cache.set(cached, {'text': cached, 'prompt_tokens': 1, 'completion_tokens': 1})
+
+        self.assertIsNone(self.cache.get(asked))
+
+    def test_sort_order_differs(self):
+        self.assert_near_miss(
+            'Напиши функцию на Python, которая сортирует список по возрастанию',
+            'Напиши функцию на Python, которая сортирует список по убыванию',
+            5,
+        )
+
+    def test_negation_differs(self):
+        self.assert_near_miss(
+            'Напомни завтра в 10:00 забрать посылку на почте',
+            'Напомни завтра в 10:00 не забрать посылку на почте',
+            6,
+        )
+
+
+class StatelessAnswerTest(OpenAIMockMixin, SimpleTestCase):
+
+    def setUp(self):
+        self.calls = 0
+        self.prompt = uuid4().hex
+        patcher = mock.patch('ai.gpt_query.count_tokens', mock.AsyncMock(return_value=[3, 5]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        keys = list(redis_client.scan_iter(f'{AnswerCache("gpt-test", self.prompt, 0.1).prefix}*'))
+        if keys:
+            redis_client.delete(*keys)
+
+    def handler(self, request):
+        self.calls += 1
+        body = {'choices': [{'message': {'content': 'ответ'}}], 'usage': {'prompt_tokens': 9, 'completion_tokens': 2}}
+        return httpx.Response(200, text=json.dumps(body))
+
+    def run_answer(self, stateless):
+        answer = self.make_answer(
+            'Вопрос', self.prompt, user=mock.Mock(is_authenticated=False), model=self.mock_model(max_request_token=1000), temperature=0.1
+        )
+        answer.init_user_model = mock.AsyncMock()
+        self.mock_openai(self.handler)
+        with mock.patch.object(GetAnswerGPT, 'is_stateless', stateless):
+            asyncio.run(answer.get_answer_chat_gpt())
+        return answer
+
+    def test_repeated_stateless_question_costs_one_call(self):
+        first, second = self.run_answer(True), self.run_answer(True)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((second.return_text, second.query_text_tokens, second.return_text_tokens), ('ответ', 9, 2))
+        self.assertEqual(first.return_text, second.return_text)
+        self.assertEqual((first.served_from, second.served_from), ('model', 'cache'))
+
+    def test_history_dependent_answers_not_cached(self):
+        self.run_answer(False)
+        self.run_answer(False)
+
+        self.assertEqual(self.calls, 2)
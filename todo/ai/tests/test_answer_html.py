@@ -0,0 +1,72 @@
+import asyncio
+import json
+from unittest import mock
+
+from ai.gpt_query import GetAnswerGPT
+from ai.rendering import convert_markdown
+from ai.utilities import WSAnswerChatGPT
+from ai.views import AI
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from telbot.models import HistoryAI
+
+User = get_user_model()
+
+ANSWER = 'Пример:\n\n```python\nprint("ok")\n```\n\n**готово**'
+
+
+class AnswerHtmlTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(tg_id=176432323996, username='user_answer_html_test', password='1234GLKLl5')
+
+    def test_history_and_chat_share_one_render(self):
+        """HTML ответа отрисовывается один раз и для записи в историю, и для отправки в чат."""
+        answer = WSAnswerChatGPT(mock.AsyncMock(), 'chat_room', self.user, 'вопрос', 1)
+        answer.model = mock.Mock(title='gpt-test')
+        answer.return_text = ANSWER
+
+        with mock.patch('ai.gpt_query.convert_markdown', side_effect=convert_markdown) as render:
+            async_to_sync(answer.create_history_ai)()
+            asyncio.run(answer.send_chat_message(ANSWER))
+
+        render.assert_called_once_with(ANSWER)
+        history = HistoryAI.objects.get(user=self.user)
+        self.assertEqual(history.answer_html, convert_markdown(ANSWER))
+        self.assertEqual(answer.channel_layer.group_send.call_args.args[1]['message'], history.answer_html)
+
+    def test_other_history_models_without_html(self):
+        history_model = mock.Mock()
+        answer = GetAnswerGPT('вопрос', 'prompt', self.user, history_model)
+        answer.model = mock.Mock(title='gpt-test')
+        answer.return_text = ANSWER
+
+        asyncio.run(answer.create_history_ai())
+
+        self.assertNotIn('answer_html', history_model.call_args.kwargs)
+
+    def test_history_view_serves_stored_html(self):
+        HistoryAI.objects.create(user=self.user, question='вопрос', answer=ANSWER, answer_html='<p>сохранённый HTML</p>')
+        request = RequestFactory().get('/ai/last-message/')
+        request.user = self.user
+
+        with mock.patch('ai.rendering.markdown.markdown') as render:
+            response = AI.as_view()(request)
+
+        render.assert_not_called()
+        self.assertEqual(json.loads(response.content)['history'], [{'question': 'вопрос', 'answer': '<p>сохранённый HTML</p>'}])
+
+    def test_backfill_in_batches(self):
+        rendered = HistoryAI.objects.create(user=self.user, question='вопрос', answer=ANSWER, answer_html='<p>готово</p>')
+        for number in range(5):
+            HistoryAI.objects.create(user=self.user, question='вопрос', answer=f'ответ **{number}**')
+
+        call_command('backfill_answer_html', batch_size=2, stdout=mock.Mock())
+
+        self.assertFalse(HistoryAI.objects.filter(answer_html__isnull=True).exists())
+        self.assertEqual(HistoryAI.objects.exclude(pk=rendered.pk).latest('pk').answer_html, '<p>ответ <strong>4</strong></p>')
+        rendered.refresh_from_db()
+        self.assertEqual(rendered.answer_html, '<p>готово</p>')
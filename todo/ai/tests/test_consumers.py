@@ -0,0 +1,193 @@
+import asyncio
+import json
+import tracemalloc
+from unittest import mock
+from uuid import uuid4
+
+from ai.routing import websocket_urlpatterns
+from ai.tests.mixins import OpenAIMockMixin
+from ai.utilities import WSAnswerChatGPT
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase, override_settings
+from telbot.models import GptModels
+
+application = URLRouter(websocket_urlpatterns)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    WS_AI_CONCURRENCY=1,
+    WS_AI_QUEUE_SIZE=2,
+)
+class ChatConsumerQueueTest(SimpleTestCase):
+
+    def setUp(self):
+        self.running, self.started, self.cancelled = 0, 0, 0
+        test = self
+
+        async def answer_from_ai(answer):
+            return await test.slow_answer(answer)
+
+        patcher = mock.patch.object(WSAnswerChatGPT, 'answer_from_ai', answer_from_ai)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def slow_answer(self, answer):
+        """Ответ ИИ, который держит свой запрос и не успевает закончиться до отключения клиента."""
+        self.assertTrue(answer.query_text)
+        self.running += 1
+        self.started += 1
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+
+    @staticmethod
+    async def connect():
+        communicator = WebsocketCommunicator(application, f'/ws/{uuid4()}/')
+        communicator.scope['user'] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    @staticmethod
+    async def flood(communicator, frames, message='вопрос'):
+        """Отправляет вопросы подряд и ждёт на каждый эхо в комнату или кадр `busy`."""
+        for _ in range(frames):
+            await communicator.send_to(text_data=json.dumps({'message': message}))
+        outputs = [json.loads(await communicator.receive_from(timeout=5)) for _ in range(frames)]
+        return sum(1 for output in outputs if output.get('busy'))
+
+    def test_excess_messages_rejected(self):
+        """Сверх одной задачи и очереди на два вопроса соединение отвечает `busy`."""
+        async def main():
+            communicator = await self.connect()
+            busy = await self.flood(communicator, 6)
+            await asyncio.sleep(0.05)
+            running = self.running
+            await communicator.disconnect()
+            return busy, running
+
+        busy, running = asyncio.run(main())
+
+        self.assertEqual(busy, 3)
+        self.assertEqual(running, 1)
+
+    def test_disconnect_cancels_tasks(self):
+        async def main():
+            communicator = await self.connect()
+            await self.flood(communicator, 3)
+            await asyncio.sleep(0.05)
+            await communicator.disconnect()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+
+        self.assertEqual((self.started, self.cancelled, self.running), (1, 1, 0))
+
+    def test_memory_under_abusive_connections(self):
+        """
+        Память процесса с consumer под множеством соединений, засыпающих его вопросами.
+
+        Без ограничения каждое сообщение держало бы свою задачу с текстом вопроса,
+        с очередью удерживается не больше `WS_AI_CONCURRENCY + WS_AI_QUEUE_SIZE` вопросов
+        на соединение, а после отключения задачи соединений отменяются и память освобождается.
+        """
+        connections, frames, message = 50, 40, 'х' * 10_000
+
+        async def main():
+            tasks_before = len(asyncio.all_tasks())
+            tracemalloc.start()
+            try:
+                baseline, _ = tracemalloc.get_traced_memory()
+                communicators = await asyncio.gather(*[self.connect() for _ in range(connections)])
+                busy = await asyncio.gather(*[self.flood(communicator, frames, message) for communicator in communicators])
+                await asyncio.sleep(0.05)
+                loaded, peak = tracemalloc.get_traced_memory()
+                running = self.running
+                await asyncio.gather(*[communicator.disconnect() for communicator in communicators])
+                del communicators
+                await asyncio.sleep(0.05)
+                released, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return {
+                'busy': sum(busy),
+                'running': running,
+                'loaded': loaded - baseline,
+                'peak': peak - baseline,
+                'released': released - baseline,
+                'leftover_tasks': len(asyncio.all_tasks()) - tasks_before,
+            }
+
+        stats = asyncio.run(main())
+
+        # ответ ИИ заменён: каждое соединение занимает одну задачу, двое ждут в очереди
+        self.assertEqual(stats['running'], connections)
+        self.assertEqual(stats['busy'], connections * (frames - 3))
+        self.assertEqual((self.started, self.cancelled), (connections, connections))
+        self.assertEqual(stats['leftover_tasks'], 0)
+        # вопросы всех кадров без очереди заняли бы 50 * 40 * 20 КБ (UTF-8) = 40 МБ
+        unbounded = connections * frames * len(message.encode())
+        self.assertLess(stats['loaded'], unbounded / 4)
+        self.assertLess(stats['released'], stats['loaded'])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class CancelledAnswerTest(OpenAIMockMixin, TestCase):
+    """Отмена настоящего `answer_from_ai`, заменён только запрос к OpenAI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        GptModels.objects.create(title='gpt-test', default=True, token='token', context_window=16000, max_request_token=4000)
+
+    def setUp(self):
+        self.requested = None
+        patcher = mock.patch('ai.gpt_query.count_tokens', mock.AsyncMock(return_value=[3, 5]))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_openai(self.handler)
+
+    async def handler(self, request):
+        self.requested.set()
+        await asyncio.sleep(60)
+
+    def test_cancelled_answer_sends_nothing(self):
+        """Отменённый ответ не отправляет в комнату ни приветствие, ни пустой ответ."""
+        answer = WSAnswerChatGPT(mock.AsyncMock(), 'chat_room', AnonymousUser(), 'вопрос', 1)
+
+        async def main():
+            self.requested = asyncio.Event()
+            task = asyncio.create_task(answer.answer_from_ai())
+            await asyncio.wait_for(self.requested.wait(), 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        async_to_sync(main)()
+
+        answer.channel_layer.group_send.assert_not_awaited()
+
+    def test_disconnect_silences_room(self):
+        async def main():
+            self.requested = asyncio.Event()
+            path = f'/ws/{uuid4()}/'
+            asker, watcher = WebsocketCommunicator(application, path), WebsocketCommunicator(application, path)
+            for communicator in (asker, watcher):
+                communicator.scope['user'] = AnonymousUser()
+                await communicator.connect()
+            await asker.send_to(text_data=json.dumps({'message': 'вопрос'}))
+            await watcher.receive_from(timeout=5)
+            await asyncio.wait_for(self.requested.wait(), 5)
+            await asker.disconnect()
+            silent = await watcher.receive_nothing(timeout=0.2)
+            await watcher.disconnect()
+            return silent
+
+        self.assertTrue(async_to_sync(main)())
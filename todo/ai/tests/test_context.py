@@ -0,0 +1,121 @@
+import json
+from datetime import datetime, timedelta
+
+from ai.context import RedisContext, model_tokens, redis_client
+from ai.gpt_query import GetAnswerGPT
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from telbot.models import GptModels, HistoryAI, UserGptModels
+
+User = get_user_model()
+
+
+def pair(question, tokens, ts, history_id):
+    return [
+        {'role': 'user', 'content': question, 'tokens': tokens, 'ts': ts, 'id': history_id},
+        {'role': 'assistant', 'content': f'ответ на {question}', 'tokens': tokens, 'ts': ts, 'id': history_id},
+    ]
+
+
+class RedisContextSelectTest(SimpleTestCase):
+
+    def setUp(self):
+        self.now = datetime.now()
+        ts = self.now.timestamp()
+        self.entries = pair('первый', 50, ts - 1800, 1) + pair('второй', 50, ts - 600, 2) + pair('третий', 50, ts - 60, 3)
+
+    def test_newest_pairs_fit_budget(self):
+        """Из контекста берутся последние пары, которые помещаются в бюджет."""
+        selected = RedisContext.select(self.entries, self.now - timedelta(hours=1), 2 * 111 + 1)
+
+        self.assertEqual([entry['content'] for entry in selected], ['второй', 'ответ на второй', 'третий', 'ответ на третий'])
+
+    def test_time_window(self):
+        """Сообщения старше начала окна не попадают в prompt."""
+        selected = RedisContext.select(self.entries, self.now - timedelta(minutes=20), 10_000)
+
+        self.assertEqual([entry['content'] for entry in selected][::2], ['второй', 'третий'])
+
+    def test_summarized_pairs_by_history_id(self):
+        """Свёрнутые пары отбрасываются по ID записи истории, а не по времени добавления в Redis."""
+        entries = [{**entry, 'ts': self.now.timestamp()} for entry in self.entries]
+
+        selected = RedisContext.select(entries, self.now - timedelta(hours=1), 10_000, last_history_id=2)
+
+        self.assertEqual([entry['content'] for entry in selected][::2], ['третий'])
+
+    def test_empty_context(self):
+        self.assertEqual(RedisContext.select([], self.now, 1000), [])
+
+
+class ContextModelTokenTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(tg_id=176432323995, username='user_context_token_test', password='1234GLKLl5')
+        cls.model = GptModels.objects.create(
+            title='gpt-test', default=True, token='sk-secret', context_window=16000, max_request_token=4000
+        )
+        UserGptModels.objects.filter(user=cls.user).update(active_model=cls.model)
+
+    def setUp(self):
+        self.context = RedisContext(self.user.id)
+        self.addCleanup(self.context.clear)
+        self.addCleanup(model_tokens.forget, self.model.id)
+        self.history = {
+            'id': 1, 'question': 'вопрос', 'question_tokens': 1, 'answer': 'ответ', 'answer_tokens': 1, 'created_at': datetime.now(),
+        }
+
+    def init_model(self):
+        answer = GetAnswerGPT('вопрос', 'prompt', self.user, HistoryAI)
+        async_to_sync(answer.init_user_model)()
+        if answer.context_entries is None:
+            self.context.fill(answer.context_model_data, [self.history])
+        return answer
+
+    def test_token_not_stored_in_redis(self):
+        """Модель восстанавливается из Redis с токеном из БД, сам токен в Redis не попадает."""
+        self.init_model()
+
+        answer = self.init_model()
+
+        self.assertNotIn(b'sk-secret', redis_client.get(self.context.model_key))
+        self.assertIsNotNone(answer.context_entries)
+        self.assertEqual((answer.model.id, answer.model.token), (self.model.id, 'sk-secret'))
+
+    def test_token_change_applied(self):
+        self.init_model()
+        self.model.token = 'sk-new'
+        self.model.save()
+        self.init_model()
+
+        self.assertEqual(self.init_model().model.token, 'sk-new')
+
+    def test_entries_without_history_id_miss(self):
+        """Контекст, записанный до появления ID записи истории, заполняется заново из БД."""
+        self.init_model()
+        redis_client.rpush(self.context.key, '{"role": "user", "content": "вопрос", "tokens": 1, "ts": 0}')
+
+        answer = self.init_model()
+
+        self.assertIsNone(answer.context_entries)
+
+    def test_model_without_field_miss(self):
+        """Модель, записанная до изменения `MODEL_FIELDS`, читается заново из БД."""
+        self.init_model()
+        model_data = json.loads(redis_client.get(self.context.model_key))
+        del model_data['model']['daily_token_limit']
+        redis_client.set(self.context.model_key, json.dumps(model_data))
+
+        answer = self.init_model()
+
+        self.assertIsNone(answer.context_entries)
+        self.assertEqual(answer.model, self.model)
+
+    def test_expired_entries_miss(self):
+        """Если список сообщений истёк раньше модели, история читается из Postgres."""
+        self.init_model()
+        redis_client.delete(self.context.key)
+
+        self.assertIsNone(self.init_model().context_entries)
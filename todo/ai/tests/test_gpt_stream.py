@@ -0,0 +1,72 @@
+import asyncio
+import json
+from unittest import mock
+
+import httpx
+from ai.gpt_exception import UnhandledError
+from ai.gpt_query import GetAnswerGPT
+from ai.tests.mixins import OpenAIMockMixin
+from django.test import SimpleTestCase
+
+
+def sse(*chunks):
+    lines = [f'data: {json.dumps(chunk)}\n\n' for chunk in chunks]
+    return ''.join(lines) + 'data: [DONE]\n\n'
+
+
+def delta(text):
+    return {'choices': [{'index': 0, 'delta': {'content': text}}]}
+
+
+class RecordingAnswer(GetAnswerGPT):
+    STREAM_INTERVAL = 0
+
+    async def stream_chunk(self, text):
+        self.chunks.append(text)
+
+
+class StreamCompletionTest(OpenAIMockMixin, SimpleTestCase):
+
+    def make_answer(self, body):
+        def handler(request):
+            self.request_data = json.loads(request.content)
+            return httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'})
+
+        answer = super().make_answer(answer_class=RecordingAnswer, stream=True)
+        answer.chunks = []
+        self.mock_openai(handler)
+        return answer
+
+    def test_chunks_text_and_usage(self):
+        """Текст приходит частями, итог и токены такие же, как без потока."""
+        answer = self.make_answer(sse(
+            delta('Прив'), delta('ет'), delta('!'),
+            {'choices': [], 'usage': {'prompt_tokens': 12, 'completion_tokens': 3}},
+        ))
+
+        asyncio.run(answer.httpx_request_to_openai())
+
+        self.assertTrue(self.request_data['stream'])
+        self.assertEqual(answer.chunks, ['Прив', 'Привет', 'Привет!'])
+        self.assertEqual(answer.return_text, 'Привет!')
+        self.assertEqual((answer.query_text_tokens, answer.return_text_tokens), (12, 3))
+        self.assertIsNotNone(answer.time_to_first_token)
+
+    def test_throttled_chunks(self):
+        """Между вызовами stream_chunk выдерживается STREAM_INTERVAL, первый токен — сразу."""
+        answer = self.make_answer(sse(delta('a'), delta('b'), delta('c')))
+        answer.STREAM_INTERVAL = 60
+        answer.num_tokens = mock.AsyncMock(return_value=3)
+
+        asyncio.run(answer.httpx_request_to_openai())
+
+        self.assertEqual(answer.chunks, ['a'])
+        self.assertEqual(answer.return_text, 'abc')
+        self.assertEqual(answer.return_text_tokens, 3)
+
+    def test_empty_stream(self):
+        """Поток без текста — ошибка ответа модели."""
+        answer = self.make_answer(sse({'choices': []}))
+
+        with self.assertRaises(UnhandledError):
+            asyncio.run(answer.httpx_request_to_openai())
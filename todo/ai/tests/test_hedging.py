@@ -0,0 +1,206 @@
+import asyncio
+import json
+import random
+import time
+from unittest import mock
+
+import httpx
+from ai.gpt_exception import OpenAIResponseError
+from ai.gpt_query import GetAnswerGPT
+from ai.hedging import LatencyTracker, latency_tracker, redis_client
+from ai.tests.mixins import OpenAIMockMixin
+from django.test import SimpleTestCase
+from telbot.models import HistoryAI
+
+
+class LatencyTrackerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.model_id = random.randint(10 ** 6, 10 ** 9)
+        self.tracker = LatencyTracker(window=50, min_samples=10)
+
+    def tearDown(self):
+        redis_client.delete(self.tracker.key(self.model_id, False), self.tracker.key(self.model_id, True))
+
+    def test_p95_needs_min_samples(self):
+        for _ in range(9):
+            self.tracker.record(self.model_id, False, 1)
+
+        self.assertIsNone(self.tracker.p95(self.model_id, False))
+
+    def test_rolling_window(self):
+        for seconds in range(1, 101):
+            self.tracker.record(self.model_id, False, seconds / 10)
+
+        self.assertEqual(redis_client.llen(self.tracker.key(self.model_id, False)), 50)
+        self.assertEqual(self.tracker.p95(self.model_id, False), 9.8)
+        self.assertIsNone(self.tracker.p95(self.model_id, True))
+
+
+class RecordingAnswer(GetAnswerGPT):
+    STREAM_INTERVAL = 0
+
+    async def stream_chunk(self, text):
+        self.chunks.append(text)
+
+
+class HedgedRequestTest(OpenAIMockMixin, SimpleTestCase):
+
+    def setUp(self):
+        base_id = random.randint(10 ** 6, 10 ** 9)
+        self.fallback = self.mock_model(id=base_id + 1, title='gpt-fast', token='fast')
+        self.primary = self.mock_model(id=base_id, title='gpt-slow', token='slow', fallback_model_id=self.fallback.id)
+        self.delays = {'gpt-slow': 0, 'gpt-fast': 0}
+        self.statuses = {'gpt-slow': 200, 'gpt-fast': 200}
+        self.requested, self.cancelled = [], []
+
+    def tearDown(self):
+        keys = [latency_tracker.key(model.id, stream) for model in (self.primary, self.fallback) for stream in (True, False)]
+        redis_client.delete(*keys)
+
+    def seed_latency(self, seconds, stream=False):
+        for _ in range(latency_tracker.min_samples):
+            latency_tracker.record(self.primary.id, stream, seconds)
+
+    async def handler(self, request):
+        payload = json.loads(request.content)
+        model = payload['model']
+        self.requested.append(model)
+        try:
+            await asyncio.sleep(self.delays[model])
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        if self.statuses[model] != 200:
+            return httpx.Response(self.statuses[model])
+        usage = {'prompt_tokens': 40, 'completion_tokens': 3 if model == 'gpt-fast' else 5}
+        if payload.get('stream'):
+            chunks = [{'choices': [{'index': 0, 'delta': {'content': part}}]} for part in (f'{model} ', 'ответ')]
+            body = ''.join(f'data: {json.dumps(chunk)}\n\n' for chunk in chunks + [{'choices': [], 'usage': usage}])
+            return httpx.Response(200, text=body + 'data: [DONE]\n\n', headers={'Content-Type': 'text/event-stream'})
+        body = {'choices': [{'message': {'content': f'{model} ответ'}}], 'usage': usage}
+        return httpx.Response(200, text=json.dumps(body))
+
+    def make_answer(self, stream=False):
+        answer = super().make_answer(f'вопрос {random.random()}', answer_class=RecordingAnswer, model=self.primary, stream=stream)
+        answer.chunks = []
+        answer.prompt_tokens = 40
+        answer.all_prompt = [{'role': 'user', 'content': answer.query_text}]
+        answer.get_fallback_model = mock.AsyncMock(return_value=self.fallback)
+        return answer
+
+    def run_request(self, answer):
+        self.mock_openai(self.handler)
+
+        async def main():
+            started = time.monotonic()
+            await answer.httpx_request_to_openai()
+            return time.monotonic() - started
+
+        return asyncio.run(main())
+
+    def test_slow_primary_hedged_to_fallback(self):
+        """После p95 основной модели отправляется резервный запрос, первый ответ побеждает."""
+        self.seed_latency(0.05)
+        self.delays['gpt-slow'] = 2
+        answer = self.make_answer()
+
+        elapsed = self.run_request(answer)
+
+        self.assertLess(elapsed, 1)
+        self.assertEqual(answer.return_text, 'gpt-fast ответ')
+        self.assertEqual(answer.model, self.fallback)
+        self.assertEqual((answer.query_text_tokens, answer.return_text_tokens), (40, 3))
+        self.assertEqual((answer.hedge_model, answer.hedge_question_tokens, answer.hedge_answer_tokens), ('gpt-slow', 40, None))
+        self.assertEqual(self.cancelled, ['gpt-slow'])
+
+    def test_cancelled_request_counts_in_latency(self):
+        self.seed_latency(0.05)
+        self.delays['gpt-slow'] = 2
+
+        self.run_request(self.make_answer())
+
+        samples = redis_client.lrange(latency_tracker.key(self.primary.id, False), 0, -1)
+        self.assertEqual(len(samples), latency_tracker.min_samples + 1)
+        self.assertGreaterEqual(float(samples[0]), 0.05)
+
+    def test_fast_primary_not_hedged(self):
+        self.seed_latency(0.5)
+        answer = self.make_answer()
+
+        self.run_request(answer)
+
+        self.assertEqual(self.requested, ['gpt-slow'])
+        self.assertEqual(answer.return_text, 'gpt-slow ответ')
+        self.assertIsNone(answer.hedge_model)
+        answer.get_fallback_model.assert_not_awaited()
+
+    def test_fallback_on_primary_error(self):
+        """Ошибка основной модели сразу переключает на резервную, даже без выборки задержек."""
+        self.statuses['gpt-slow'] = 500
+        answer = self.make_answer()
+
+        self.run_request(answer)
+
+        self.assertEqual(self.requested, ['gpt-slow', 'gpt-fast'])
+        self.assertEqual(answer.return_text, 'gpt-fast ответ')
+
+    def test_both_failed(self):
+        self.statuses = {'gpt-slow': 500, 'gpt-fast': 503}
+
+        with self.assertRaises(OpenAIResponseError):
+            self.run_request(self.make_answer())
+
+    def test_stream_only_winner_chunks(self):
+        """Частичный ответ передаёт только победивший потоковый запрос."""
+        self.seed_latency(0.05, stream=True)
+        self.delays['gpt-slow'] = 2
+        answer = self.make_answer(stream=True)
+
+        self.run_request(answer)
+
+        self.assertTrue(answer.chunks)
+        self.assertTrue(all(text.startswith('gpt-fast ') for text in answer.chunks))
+        self.assertEqual(answer.return_text, 'gpt-fast ответ')
+
+    def test_winner_result_only(self):
+        """Из запроса-победителя переносятся только ответ, его токены и модель."""
+        self.seed_latency(0.05)
+        self.delays['gpt-slow'] = 2
+        answer = self.make_answer()
+        deadline, prompt = answer.deadline, answer.all_prompt
+
+        self.run_request(answer)
+
+        self.assertEqual(answer.model, self.fallback)
+        self.assertEqual(answer.served_from, HistoryAI.ServedFrom.MODEL)
+        self.assertIs(answer.all_prompt, prompt)
+        self.assertEqual(answer.deadline, deadline)
+        self.assertEqual(answer.stream_chunk.__self__, answer)
+
+    def test_failed_loser_not_recorded(self):
+        """Резервная модель ответила после ошибки основной, запрос с ошибкой не оплачивается."""
+        self.statuses['gpt-slow'] = 500
+        answer = self.make_answer()
+
+        self.run_request(answer)
+
+        self.assertIsNone(answer.hedge_model)
+
+    def test_history_records_winner_and_hedge_tokens(self):
+        self.seed_latency(0.05)
+        self.delays['gpt-slow'] = 2
+        answer = self.make_answer()
+        self.run_request(answer)
+
+        asyncio.run(answer.create_history_ai())
+
+        kwargs = answer.history_model.call_args.kwargs
+        self.assertEqual(
+            (kwargs['model'], kwargs['question_tokens'], kwargs['answer_tokens']),
+            ('gpt-fast', 40, 3),
+        )
+        self.assertEqual(
+            (kwargs['hedge_model'], kwargs['hedge_question_tokens'], kwargs['hedge_answer_tokens']),
+            ('gpt-slow', 40, None),
+        )
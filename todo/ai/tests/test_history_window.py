@@ -0,0 +1,85 @@
+from datetime import timedelta
+from unittest import mock
+
+from ai.context import RedisContext
+from ai.gpt_query import GetAnswerGPT
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils.timezone import now
+from telbot.models import HistoryAI
+
+User = get_user_model()
+
+
+class HistoryWindowTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            tg_id=176432323999,
+            username='user_history_window_test',
+            password='1234GLKLl5',
+        )
+        cls.current_time = now()
+        for minutes in (40, 30, 20, 10):
+            history = HistoryAI.objects.create(
+                user=cls.user,
+                question=f'вопрос {minutes}',
+                question_tokens=100,
+                answer=f'ответ {minutes}',
+                answer_tokens=100,
+            )
+            HistoryAI.objects.filter(pk=history.pk).update(created_at=cls.current_time - timedelta(minutes=minutes))
+
+    def setUp(self):
+        self.answer = GetAnswerGPT('новый вопрос', 'prompt', self.user, HistoryAI)
+        self.answer.time_start = self.current_time - timedelta(hours=1)
+        self.answer.current_time = self.current_time
+        self.answer.context = mock.Mock()
+        self.answer.user_models = mock.Mock(time_start=self.answer.time_start)
+
+    def test_newest_turns_are_kept(self):
+        """При нехватке бюджета отбрасываются старые записи, порядок хронологический."""
+        # каждая пара вопрос-ответ стоит 100 + 100 + 11 токенов
+        history = list(self.answer.get_history(2 * 211 + 1))
+
+        self.assertEqual([item['question'] for item in history], ['вопрос 20', 'вопрос 10'])
+
+    def test_whole_window_fits(self):
+        history = list(self.answer.get_history(10_000))
+
+        self.assertEqual([item['question'] for item in history], ['вопрос 40', 'вопрос 30', 'вопрос 20', 'вопрос 10'])
+
+    def test_prompt_ends_with_newest_turn_and_query(self):
+        """В prompt попадает последняя пара вопрос-ответ перед новым вопросом."""
+        self.answer.model = mock.Mock(context_window=10 + 5 + 11 + 211 + 1)
+        self.answer.query_text_tokens, self.answer.assist_prompt_tokens = 10, 5
+
+        async_to_sync(self.answer.get_prompt)()
+
+        self.assertEqual(self.answer.all_prompt, [
+            {'role': 'system', 'content': 'prompt'},
+            {'role': 'user', 'content': 'вопрос 10'},
+            {'role': 'assistant', 'content': 'ответ 10'},
+            {'role': 'user', 'content': 'новый вопрос'},
+        ])
+        self.answer.context.fill.assert_called_once()
+
+    def test_prompt_from_redis_context(self):
+        """При попадании в контекст Redis prompt собирается без запросов к БД."""
+        self.answer.model = mock.Mock(context_window=10 + 5 + 11 + 211 + 1)
+        self.answer.query_text_tokens, self.answer.assist_prompt_tokens = 10, 5
+        self.answer.context = RedisContext(self.user.id)
+        ts = self.current_time.timestamp()
+        self.answer.context_entries = [
+            {'role': 'user', 'content': 'старый вопрос', 'tokens': 100, 'ts': ts - 60, 'id': 1},
+            {'role': 'assistant', 'content': 'старый ответ', 'tokens': 100, 'ts': ts - 60, 'id': 1},
+            {'role': 'user', 'content': 'вопрос', 'tokens': 100, 'ts': ts, 'id': 2},
+            {'role': 'assistant', 'content': 'ответ', 'tokens': 100, 'ts': ts, 'id': 2},
+        ]
+
+        with self.assertNumQueries(0):
+            async_to_sync(self.answer.get_prompt)()
+
+        self.assertEqual([item['content'] for item in self.answer.all_prompt], ['prompt', 'вопрос', 'ответ', 'новый вопрос'])
+        self.assertEqual(self.answer.context_kept, 2)
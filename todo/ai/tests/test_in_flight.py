@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from uuid import uuid4
+
+from ai.gpt_query import GetAnswerGPT
+from ai.in_flight import InFlightRequest, redis_client
+from django.test import SimpleTestCase
+
+
+class InFlightRequestTest(SimpleTestCase):
+
+    def setUp(self):
+        self.namespace = f'test_{uuid4().hex}'
+
+    def tearDown(self):
+        keys = list(redis_client.scan_iter(f'in_flight:{self.namespace}:*'))
+        if keys:
+            redis_client.delete(*keys)
+
+    def request(self, owner=1, text='Привет', ttl_ms=60_000):
+        return InFlightRequest(self.namespace, owner, text, ttl_ms)
+
+    def test_concurrent_acquire_single_winner(self):
+        """Из одновременных одинаковых запросов в работу попадает ровно один."""
+        workers = 32
+        barrier = threading.Barrier(workers)
+
+        def acquire(_):
+            request = self.request()
+            barrier.wait()
+            return request.acquire()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(acquire, range(workers)))
+
+        self.assertEqual(results.count(True), 1)
+
+    def test_normalized_text_is_same_request(self):
+        self.assertTrue(self.request(text='Привет,  мир').acquire())
+        self.assertFalse(self.request(text=' привет, МИР\n').acquire())
+
+    def test_different_owners_and_texts_are_independent(self):
+        self.assertTrue(self.request(owner=1).acquire())
+        self.assertTrue(self.request(owner=2).acquire())
+        self.assertTrue(self.request(owner=1, text='Другой вопрос').acquire())
+
+    def test_release_frees_request(self):
+        request = self.request()
+        request.acquire()
+        request.release()
+
+        self.assertTrue(self.request().acquire())
+
+    def test_loser_release_keeps_winner_mark(self):
+        """Отклонённый запрос не снимает отметку запроса, который в работе."""
+        winner, loser = self.request(), self.request()
+        winner.acquire()
+        loser.acquire()
+        loser.release()
+
+        self.assertFalse(self.request().acquire())
+
+    def test_expired_mark_is_not_released_by_previous_owner(self):
+        """Истёкшая отметка освобождает запрос, и прежний владелец не снимает чужую."""
+        stale = self.request(ttl_ms=50)
+        stale.acquire()
+        time.sleep(0.2)
+        fresh = self.request()
+
+        self.assertTrue(fresh.acquire())
+        stale.release()
+        self.assertFalse(self.request().acquire())
+        self.assertGreater(redis_client.pttl(fresh.key), 0)
+
+
+class AnswerInFlightTest(SimpleTestCase):
+
+    def test_mark_released_when_tokenizer_fails(self):
+        """Ошибка подсчёта токенов не оставляет запрос в работе."""
+        answer = GetAnswerGPT(f'вопрос {uuid4().hex}', 'prompt', mock.Mock(is_authenticated=False), mock.Mock())
+        answer.model = mock.Mock(title='gpt-test')
+        answer.init_user_model = mock.AsyncMock()
+        answer.check_token_quota = mock.AsyncMock()
+
+        async def count_tokens(*args):
+            await asyncio.sleep(0.1)
+            raise ValueError
+
+        with mock.patch('ai.gpt_query.count_tokens', count_tokens):
+            with self.assertRaises(ValueError):
+                asyncio.run(answer.get_answer_chat_gpt())
+
+        request = InFlightRequest('gpt', answer.in_flight_owner, answer.query_text, 60_000)
+        self.assertTrue(request.acquire())
+        request.release()
@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+from ai.management.commands.benchmark_openai_client import (StandInServer,
+                                                            run_per_request,
+                                                            run_pooled)
+from ai.openai_client import OpenAIClientPool, run_in_thread_loop
+from django.test import SimpleTestCase
+
+
+class OpenAIClientPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = OpenAIClientPool('http://openai', lambda: httpx.MockTransport(lambda request: httpx.Response(200)))
+
+    def test_client_is_shared_within_loop(self):
+        """В одном event loop все запросы идут через один клиент."""
+        async def get_twice():
+            return self.pool.get(), self.pool.get()
+
+        first, second = asyncio.run(get_twice())
+        self.assertIs(first, second)
+
+    def test_closed_loops_are_dropped(self):
+        """Клиенты закрытых циклов не переиспользуются и удаляются из пула."""
+        async def get():
+            return self.pool.get()
+
+        first = asyncio.run(get())
+        second = asyncio.run(get())
+
+        self.assertIsNot(first, second)
+        self.assertLessEqual(len(self.pool.clients), 1)
+
+    def test_thread_loop_keeps_client(self):
+        """`run_in_thread_loop` сохраняет цикл, а с ним и клиент между вызовами."""
+        async def get():
+            return self.pool.get()
+
+        self.assertIs(run_in_thread_loop(get()), run_in_thread_loop(get()))
+
+    def test_thread_loop_cancels_leftover_tasks(self):
+        """Незавершённые задачи отменяются, как в `asyncio.run`."""
+        async def spawn():
+            return asyncio.create_task(asyncio.sleep(60))
+
+        task = run_in_thread_loop(spawn())
+        self.assertTrue(task.cancelled())
+
+
+class StandInServerTest(SimpleTestCase):
+
+    def test_pool_reuses_connection_across_updates(self):
+        """Пул открывает одно соединение на все апдейты, клиент на запрос — по одному на запрос."""
+        for runner, expected in ((run_per_request, 6), (run_pooled, 1)):
+            server = StandInServer().start()
+            try:
+                latencies = runner(server.url, 3, 2, True)
+            finally:
+                server.stop()
+            self.assertEqual(len(latencies), 6)
+            self.assertEqual(server.requests, 6)
+            self.assertEqual(server.connections, expected)
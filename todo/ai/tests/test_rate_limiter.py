@@ -0,0 +1,200 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest import mock
+from uuid import uuid4
+
+import httpx
+from ai.gpt_exception import OpenAIRateLimitError
+from ai.rate_limiter import (OpenAIRateLimiter, backoff_delay, rate_limiter,
+                             redis_client, retry_after_seconds)
+from ai.tests.mixins import OpenAIMockMixin
+from django.test import SimpleTestCase, override_settings
+
+
+class OpenAIRateLimiterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.limiter = OpenAIRateLimiter(prefix=f'test_rate_{uuid4().hex}')
+
+    def tearDown(self):
+        redis_client.delete(self.limiter.key(self.model()))
+
+    @staticmethod
+    def model(rpm_limit=0, tpm_limit=0):
+        return mock.Mock(id=1, title='gpt-test', rpm_limit=rpm_limit, tpm_limit=tpm_limit)
+
+    def test_requests_per_minute(self):
+        model = self.model(rpm_limit=3)
+
+        waits = [self.limiter.reserve(model, 0) for _ in range(4)]
+
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 20, delta=0.1)
+
+    def test_tokens_per_minute(self):
+        model = self.model(tpm_limit=1000)
+
+        self.assertEqual(self.limiter.reserve(model, 700), 0)
+        self.assertAlmostEqual(self.limiter.reserve(model, 600), 18, delta=0.1)
+
+    def test_rejected_reserve_takes_nothing(self):
+        """Отказ не списывает запрос, меньший запрос проходит."""
+        model = self.model(tpm_limit=1000)
+        self.limiter.reserve(model, 700)
+        self.limiter.reserve(model, 600)
+
+        self.assertEqual(self.limiter.reserve(model, 300), 0)
+
+    def test_settle_returns_unused_tokens(self):
+        model = self.model(tpm_limit=1000)
+        self.limiter.reserve(model, 900)
+        asyncio.run(self.limiter.settle(model, 900, 100))
+
+        self.assertEqual(self.limiter.reserve(model, 800), 0)
+
+    def test_acquire_waits_for_refill(self):
+        model = self.model(rpm_limit=600)
+        self.limiter.reserve(model, 0)
+        redis_client.hset(self.limiter.key(model), 'requests', 0)
+        started = time.monotonic()
+
+        asyncio.run(self.limiter.acquire(model, 0, time.monotonic() + 5))
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_acquire_past_deadline(self):
+        model = self.model(rpm_limit=1)
+        self.limiter.reserve(model, 0)
+
+        with self.assertRaises(OpenAIRateLimitError):
+            asyncio.run(self.limiter.acquire(model, 0, time.monotonic() + 1))
+
+    def test_unlimited_model_skips_redis(self):
+        with mock.patch.object(self.limiter, 'reserve') as reserve:
+            asyncio.run(self.limiter.acquire(self.model(), 10_000, time.monotonic()))
+
+        reserve.assert_not_called()
+
+
+class RetryAfterTest(SimpleTestCase):
+
+    def test_retry_after_headers(self):
+        date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+
+        self.assertEqual(retry_after_seconds(httpx.Response(429, headers={'retry-after-ms': '1500'})), 1.5)
+        self.assertEqual(retry_after_seconds(httpx.Response(429, headers={'retry-after': '7'})), 7)
+        self.assertAlmostEqual(retry_after_seconds(httpx.Response(429, headers={'retry-after': date})), 30, delta=2)
+        self.assertIsNone(retry_after_seconds(httpx.Response(429)))
+
+    @override_settings(OPENAI_RETRY_BASE_DELAY=1)
+    def test_backoff_honors_retry_after(self):
+        for attempt in range(4):
+            delay = backoff_delay(attempt)
+            self.assertTrue(2 ** attempt / 2 <= delay <= 2 ** attempt)
+        self.assertGreaterEqual(backoff_delay(0, retry_after=10), 10)
+
+
+@override_settings(OPENAI_RETRY_ATTEMPTS=3, OPENAI_RETRY_BASE_DELAY=0.01)
+class RetryOn429Test(OpenAIMockMixin, SimpleTestCase):
+
+    def make_answer(self, responses):
+        self.requests = 0
+
+        def handler(request):
+            self.requests += 1
+            return responses.pop(0)
+
+        self.mock_openai(handler)
+        return super().make_answer()
+
+    @staticmethod
+    def completion():
+        body = {'choices': [{'message': {'content': 'ответ'}}], 'usage': {'prompt_tokens': 5, 'completion_tokens': 2}}
+        return httpx.Response(200, text=json.dumps(body))
+
+    def test_retries_after_429(self):
+        answer = self.make_answer([
+            httpx.Response(429, headers={'retry-after-ms': '10'}),
+            httpx.Response(429),
+            self.completion(),
+        ])
+
+        asyncio.run(answer.httpx_request_to_openai())
+
+        self.assertEqual(self.requests, 3)
+        self.assertEqual(answer.return_text, 'ответ')
+
+    def test_retry_after_beyond_deadline(self):
+        """Повтор, который не укладывается в бюджет ожидания, не выполняется."""
+        answer = self.make_answer([httpx.Response(429, headers={'retry-after': '120'}), self.completion()])
+
+        with self.assertRaises(OpenAIRateLimitError):
+            asyncio.run(answer.httpx_request_to_openai())
+        self.assertEqual(self.requests, 1)
+
+    def test_attempts_exhausted(self):
+        answer = self.make_answer([httpx.Response(429) for _ in range(4)])
+
+        with self.assertRaises(OpenAIRateLimitError):
+            asyncio.run(answer.httpx_request_to_openai())
+        self.assertEqual(self.requests, 4)
+
+
+@override_settings(OPENAI_RETRY_ATTEMPTS=3, OPENAI_RETRY_BASE_DELAY=0.01, GPT_COMPLETION_TOKENS_ESTIMATE=100)
+class SettleReservationTest(OpenAIMockMixin, SimpleTestCase):
+    """Резерв токенов каждой попытки закрывается: по `usage` после ответа, целиком после отказа, по prompt после отмены."""
+
+    def setUp(self):
+        self.responses = []
+        self.model = self.mock_model(id=uuid4().int, tpm_limit=10_000)
+        self.addCleanup(redis_client.delete, rate_limiter.key(self.model))
+
+    async def handler(self, request):
+        response = self.responses.pop(0)
+        if response is None:
+            await asyncio.sleep(60)
+        return response
+
+    def bucket_tokens(self):
+        return float(redis_client.hget(rate_limiter.key(self.model), 'tokens'))
+
+    def run_request(self, cancel_after=None):
+        answer = self.make_answer(model=self.model)
+        answer.prompt_tokens = 40
+        self.mock_openai(self.handler)
+
+        async def main():
+            task = asyncio.create_task(answer.request_with_retries(*answer.request_payload()))
+            if cancel_after is not None:
+                await asyncio.sleep(cancel_after)
+                task.cancel()
+            await task
+
+        asyncio.run(main())
+        return answer
+
+    def test_rejected_attempts_refunded(self):
+        body = {'choices': [{'message': {'content': 'ответ'}}], 'usage': {'prompt_tokens': 5, 'completion_tokens': 2}}
+        self.responses = [httpx.Response(429), httpx.Response(429), httpx.Response(200, text=json.dumps(body))]
+
+        self.run_request()
+
+        self.assertAlmostEqual(self.bucket_tokens(), 10_000 - 7, delta=1)
+
+    def test_error_refunded(self):
+        self.responses = [httpx.Response(500)]
+
+        with self.assertRaises(httpx.HTTPStatusError):
+            self.run_request()
+        self.assertEqual(self.bucket_tokens(), 10_000)
+
+    def test_cancelled_keeps_sent_prompt(self):
+        """Отменённый запрос уже отправлен, в ведре остаётся его prompt."""
+        self.responses = [None]
+
+        with self.assertRaises(asyncio.CancelledError):
+            self.run_request(cancel_after=0.05)
+        self.assertAlmostEqual(self.bucket_tokens(), 10_000 - 40, delta=1)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from uuid import uuid4
+
+import httpx
+from ai.single_flight import SingleFlight, redis_client
+from ai.tests.mixins import OpenAIMockMixin
+from django.test import SimpleTestCase, override_settings
+
+
+class SingleFlightTest(SimpleTestCase):
+
+    def setUp(self):
+        self.payload = {'model': 'gpt-test', 'messages': [{'role': 'user', 'content': uuid4().hex}], 'temperature': 0.1}
+        self.result = {'text': 'ответ', 'prompt_tokens': 5, 'completion_tokens': 2}
+
+    def tearDown(self):
+        flight = SingleFlight(self.payload, 1000)
+        redis_client.delete(flight.lock_key, *redis_client.keys(flight.result_key('*')))
+
+    def waiter(self):
+        flight = SingleFlight(self.payload, 60_000)
+        self.assertFalse(flight.lead())
+        return flight
+
+    def test_single_leader(self):
+        workers = 16
+        barrier = threading.Barrier(workers)
+
+        def lead(_):
+            flight = SingleFlight(self.payload, 60_000)
+            barrier.wait()
+            return flight.lead()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lead, range(workers)))
+
+        self.assertEqual(results.count(True), 1)
+
+    def test_waiters_get_leader_result(self):
+        leader = SingleFlight(self.payload, 60_000)
+        leader.lead()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            waiters = [executor.submit(self.waiter().wait, 5) for _ in range(4)]
+            threading.Timer(0.2, leader.share, [self.result]).start()
+
+            self.assertEqual([waiter.result() for waiter in waiters], [self.result] * 4)
+
+    def test_result_shared_before_subscribe(self):
+        leader = SingleFlight(self.payload, 60_000)
+        leader.lead()
+        waiter = self.waiter()
+        leader.share(self.result)
+
+        self.assertEqual(waiter.wait(1), self.result)
+
+    def test_previous_flight_result_not_shared(self):
+        """Ответ завершённого запроса не достаётся ожидающим следующего одинакового запроса."""
+        previous = SingleFlight(self.payload, 60_000)
+        previous.lead()
+        previous.share(self.result)
+        SingleFlight(self.payload, 60_000).lead()
+
+        self.assertIsNone(self.waiter().wait(0.2))
+
+    def test_leader_failure(self):
+        """После ошибки ведущего ожидающие выполняют запрос сами, ключ свободен."""
+        leader = SingleFlight(self.payload, 60_000)
+        leader.lead()
+        threading.Timer(0.2, leader.share, [None]).start()
+
+        self.assertIsNone(self.waiter().wait(5))
+        self.assertTrue(SingleFlight(self.payload, 60_000).lead())
+
+    def test_different_temperature_is_different_flight(self):
+        SingleFlight(self.payload, 60_000).lead()
+        other = SingleFlight({**self.payload, 'temperature': 0.9}, 60_000)
+
+        self.assertTrue(other.lead())
+        redis_client.delete(other.lock_key)
+
+
+class CoalescedRequestTest(OpenAIMockMixin, SimpleTestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.delay = 0.3
+        self.question = f'Ева, который час? {uuid4().hex}'
+
+    async def handler(self, request):
+        self.calls.append(json.loads(request.content))
+        await asyncio.sleep(self.delay)
+        body = {'choices': [{'message': {'content': 'Полдень'}}], 'usage': {'prompt_tokens': 9, 'completion_tokens': 2}}
+        return httpx.Response(200, text=json.dumps(body))
+
+    def make_answer(self):
+        answer = super().make_answer(self.question, user=mock.Mock(is_authenticated=False))
+        answer.all_prompt = [{'role': 'user', 'content': self.question}]
+        return answer
+
+    def run_requests(self, answers):
+        self.mock_openai(self.handler)
+
+        async def main():
+            await asyncio.gather(*[answer.httpx_request_to_openai() for answer in answers])
+
+        asyncio.run(main())
+
+    def test_identical_prompts_make_one_upstream_call(self):
+        """Одновременные одинаковые запросы получают ответ и токены одного вызова OpenAI."""
+        answers = [self.make_answer() for _ in range(5)]
+        self.run_requests(answers)
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual({answer.return_text for answer in answers}, {'Полдень'})
+        self.assertEqual({(answer.query_text_tokens, answer.return_text_tokens) for answer in answers}, {(9, 2)})
+        self.assertEqual(sorted(answer.served_from for answer in answers), ['model'] + ['shared'] * 4)
+
+    @override_settings(GPT_SINGLE_FLIGHT_WAIT=0.1)
+    def test_slow_leader_not_awaited(self):
+        """Не дождавшись ведущего за `GPT_SINGLE_FLIGHT_WAIT`, запрос выполняется сам."""
+        answers = [self.make_answer() for _ in range(2)]
+        self.run_requests(answers)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual([answer.served_from for answer in answers], ['model', 'model'])
@@ -0,0 +1,211 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+import httpx
+from ai.context import RedisContext, redis_client
+from ai.gpt_query import GetAnswerGPT
+from ai.summary import SUMMARY_MESSAGE, HistorySummarizer
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils.timezone import localdate, now
+from telbot.models import GptModels, HistoryAI, HistorySummary, TokenUsage
+
+User = get_user_model()
+
+
+@override_settings(GPT_SUMMARY_THRESHOLD=3000, GPT_SUMMARY_KEEP_TOKENS=1000)
+class HistorySummarizerTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(tg_id=176432323998, username='user_summary_test', password='1234GLKLl5')
+        cls.model = GptModels.objects.create(
+            title='gpt-test', default=True, token='token', context_window=16000, max_request_token=4000, time_window=600
+        )
+
+    def setUp(self):
+        self.requests = []
+        self.current_time = now()
+        self.context = RedisContext(self.user.id)
+        self.addCleanup(self.context.clear)
+        patchers = [
+            mock.patch('ai.summary.count_tokens', mock.AsyncMock(side_effect=lambda title, texts: [10] * len(texts))),
+            mock.patch('ai.summary.get_openai_client', side_effect=self.openai_client),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def openai_client(self):
+        return httpx.AsyncClient(base_url='http://openai', transport=httpx.MockTransport(self.handler))
+
+    def handler(self, request):
+        self.requests.append(json.loads(request.content))
+        body = {
+            'choices': [{'message': {'content': f'краткое содержание {len(self.requests)}'}}],
+            'usage': {'prompt_tokens': 100, 'completion_tokens': 40},
+        }
+        return httpx.Response(200, text=json.dumps(body))
+
+    def add_turns(self, count, start=0):
+        """Пары вопрос-ответ по 400 токенов с учётом разделителей, раз в минуту."""
+        turns = []
+        for number in range(start, start + count):
+            history = HistoryAI.objects.create(
+                user=self.user, question=f'вопрос {number}', question_tokens=200, answer=f'ответ {number}', answer_tokens=189
+            )
+            HistoryAI.objects.filter(pk=history.pk).update(created_at=self.current_time - timedelta(minutes=60 - number))
+            history.refresh_from_db()
+            turns.append(history)
+        return turns
+
+    def test_below_threshold(self):
+        self.add_turns(7)
+
+        self.assertIsNone(HistorySummarizer(self.user.id).run())
+        self.assertEqual(self.requests, [])
+
+    def test_old_turns_folded(self):
+        """Старые записи сворачиваются, последние на `GPT_SUMMARY_KEEP_TOKENS` токенов остаются."""
+        turns = self.add_turns(10)
+
+        summary = HistorySummarizer(self.user.id).run()
+
+        self.assertEqual(summary.summary, 'краткое содержание 1')
+        self.assertEqual((summary.summary_tokens, summary.last_history_id), (40, turns[7].id))
+        self.assertEqual((summary.started_at, summary.summarized_until), (turns[0].created_at, turns[7].created_at))
+        content = self.requests[0]['messages'][1]['content']
+        self.assertIn('вопрос 7', content)
+        self.assertNotIn('вопрос 8', content)
+        self.assertEqual(json.loads(redis_client.get(self.context.summary_key)), summary.context_data)
+
+    def test_rolling_summary(self):
+        """Следующее сворачивание дополняет прежнее содержание только новыми записями."""
+        self.add_turns(10)
+        HistorySummarizer(self.user.id).run()
+        turns = self.add_turns(6, start=10)
+
+        summary = HistorySummarizer(self.user.id).run()
+
+        content = self.requests[1]['messages'][1]['content']
+        self.assertTrue(content.startswith('Предыдущее краткое содержание:\nкраткое содержание 1'))
+        self.assertNotIn('вопрос 7\n', content)
+        self.assertIn('вопрос 8', content)
+        self.assertEqual(summary.last_history_id, turns[3].id)
+        self.assertEqual(HistorySummary.objects.count(), 1)
+
+    def test_summary_tokens_in_ledger(self):
+        """Токены пересказа попадают в суточный расход пользователя по его модели."""
+        self.add_turns(10)
+
+        HistorySummarizer(self.user.id).run()
+
+        self.assertEqual(
+            TokenUsage.objects.filter(user=self.user, model='gpt-test').values_list('requests', 'question_tokens', 'answer_tokens').get(),
+            (1, 100, 40),
+        )
+
+    def test_quota_exhausted(self):
+        self.add_turns(10)
+        GptModels.objects.filter(pk=self.model.pk).update(daily_token_limit=1000)
+        TokenUsage.add(self.user.id, 'gpt-test', localdate(), 1, 600, 400)
+
+        self.assertIsNone(HistorySummarizer(self.user.id).run())
+        self.assertEqual(self.requests, [])
+
+    def test_one_summarizer_per_user(self):
+        self.add_turns(10)
+        redis_client.set(HistorySummarizer(self.user.id).lock_key, 1, ex=60)
+        self.addCleanup(redis_client.delete, HistorySummarizer(self.user.id).lock_key)
+
+        self.assertIsNone(HistorySummarizer(self.user.id).run())
+        self.assertEqual(self.requests, [])
+
+
+class SummaryInPromptTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(tg_id=176432323997, username='user_summary_prompt_test', password='1234GLKLl5')
+        cls.current_time = now()
+        cls.turns = []
+        for minutes in range(50, 0, -5):
+            history = HistoryAI.objects.create(
+                user=cls.user, question=f'вопрос {minutes}', question_tokens=200, answer=f'ответ {minutes}', answer_tokens=189
+            )
+            HistoryAI.objects.filter(pk=history.pk).update(created_at=cls.current_time - timedelta(minutes=minutes))
+            history.refresh_from_db()
+            cls.turns.append(history)
+        cls.summary = HistorySummary.objects.create(
+            user=cls.user,
+            summary='пользователь изучает Django',
+            summary_tokens=50,
+            last_history_id=cls.turns[7].id,
+            started_at=cls.turns[0].created_at,
+            summarized_until=cls.turns[7].created_at,
+        )
+
+    def make_answer(self):
+        answer = GetAnswerGPT('новый вопрос', 'prompt', self.user, HistoryAI)
+        answer.model = mock.Mock(context_window=16000)
+        answer.time_start = self.current_time - timedelta(hours=1)
+        answer.current_time = self.current_time
+        answer.query_text_tokens, answer.assist_prompt_tokens = 10, 5
+        answer.context = mock.Mock()
+        answer.user_models = mock.Mock(time_start=answer.time_start)
+        return answer
+
+    def test_summary_replaces_folded_turns(self):
+        """Свёрнутые записи заменяются одним системным сообщением, prompt становится намного короче."""
+        with mock.patch.object(GetAnswerGPT, 'get_summary', mock.AsyncMock(return_value=None)):
+            full = self.make_answer()
+            async_to_sync(full.get_prompt)()
+        answer = self.make_answer()
+
+        async_to_sync(answer.get_prompt)()
+
+        self.assertEqual(answer.all_prompt[:2], [
+            {'role': 'system', 'content': 'prompt'},
+            {'role': 'system', 'content': SUMMARY_MESSAGE.format('пользователь изучает Django')},
+        ])
+        self.assertEqual([item['content'] for item in answer.all_prompt[2:]], ['вопрос 10', 'ответ 10', 'вопрос 5', 'ответ 5', 'новый вопрос'])
+        self.assertEqual(answer.history_tokens, 800)
+        self.assertLess(answer.prompt_tokens, full.prompt_tokens / 4)
+        self.assertEqual(answer.context.fill.call_args.args[2], self.summary.context_data)
+
+    def test_summary_from_redis_context(self):
+        answer = self.make_answer()
+        answer.context = RedisContext(self.user.id)
+        answer.context.summary = self.summary.context_data
+        answer.context_entries = [
+            {'role': role, 'content': f'{role} {turn.id}', 'tokens': 200, 'ts': turn.created_at.timestamp(), 'id': turn.id}
+            for turn in self.turns for role in ('user', 'assistant')
+        ]
+
+        async_to_sync(answer.get_prompt)()
+
+        self.assertEqual(answer.all_prompt[1]['content'], SUMMARY_MESSAGE.format('пользователь изучает Django'))
+        self.assertEqual(answer.all_prompt[2]['content'], f'user {self.turns[8].id}')
+        self.assertEqual(len(answer.all_prompt), 2 + 4 + 1)
+
+    def test_summary_outside_window_ignored(self):
+        answer = self.make_answer()
+        answer.time_start = self.turns[8].created_at
+
+        async_to_sync(answer.get_prompt)()
+
+        self.assertEqual([item['role'] for item in answer.all_prompt[:2]], ['system', 'user'])
+
+    @override_settings(GPT_SUMMARY_THRESHOLD=3000)
+    def test_summarization_triggered_by_history_size(self):
+        answer = self.make_answer()
+        with mock.patch('ai.gpt_query.summarize_history') as task:
+            answer.history_tokens = 2999
+            async_to_sync(answer.summarize_history)()
+            task.delay.assert_not_called()
+
+            answer.history_tokens = 3000
+            async_to_sync(answer.summarize_history)()
+            task.delay.assert_called_once_with(self.user.id)
@@ -0,0 +1,62 @@
+import asyncio
+from unittest import mock
+
+from ai.tokenizer import TokenizerRegistry
+from django.test import SimpleTestCase
+
+
+class FakeEncoding:
+    name = 'fake'
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text, disallowed_special=()):
+        self.encoded.append(text)
+        return text.split()
+
+
+class TokenizerRegistryTest(SimpleTestCase):
+
+    def setUp(self):
+        self.encoding = FakeEncoding()
+        self.registry = TokenizerRegistry(cache_size=3)
+        patcher = mock.patch('ai.tokenizer.tiktoken_async.encoding_for_model', mock.AsyncMock(return_value=self.encoding))
+        self.encoding_for_model = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def count(self, texts, model='gpt-test'):
+        return asyncio.run(self.registry.count_tokens(model, texts))
+
+    def test_batch_counts(self):
+        """Батч считается одним вызовом, повторы внутри батча токенизируются один раз."""
+        self.assertEqual(self.count(['один два', 'три', 'один два']), [2, 1, 2])
+        self.assertEqual(sorted(self.encoding.encoded), ['один два', 'три'])
+
+    def test_counts_are_memoized(self):
+        """Постоянный промпт токенизируется только при первом подсчёте."""
+        self.count(['промпт ассистента', 'вопрос'])
+        self.count(['промпт ассистента', 'другой вопрос'])
+
+        self.assertEqual(self.encoding.encoded.count('промпт ассистента'), 1)
+
+    def test_encoding_loaded_once_per_model(self):
+        """Кодировка модели загружается один раз."""
+        self.count(['а'])
+        self.count(['б'])
+
+        self.encoding_for_model.assert_awaited_once_with('gpt-test')
+
+    def test_unknown_model_falls_back(self):
+        """Для неизвестной tiktoken модели используется cl100k_base."""
+        self.encoding_for_model.side_effect = KeyError('gpt-new')
+        with mock.patch('ai.tokenizer.tiktoken_async.get_encoding', mock.AsyncMock(return_value=self.encoding)) as get_encoding:
+            self.assertEqual(self.count(['a b c'], 'gpt-new'), [3])
+        get_encoding.assert_awaited_once_with('cl100k_base')
+
+    def test_cache_is_bounded(self):
+        """Старые подсчёты вытесняются."""
+        self.count(['a', 'b', 'c', 'd'])
+
+        self.assertEqual(len(self.registry.counts), 3)
+        self.assertNotIn(('fake', 'a'), self.registry.counts)
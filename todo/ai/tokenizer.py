@@ -0,0 +1,84 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+
+import tiktoken_async
+from django.conf import settings
+from tiktoken_async.core import Encoding
+
+# tiktoken_async читает BPE файлы из этого каталога и обращается в сеть только при промахе
+os.environ.setdefault('TIKTOKEN_CACHE_DIR', str(settings.TIKTOKEN_CACHE_DIR))
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+
+class TokenizerRegistry:
+    """
+    Кодировки tiktoken по названию модели `GptModels.title` и память подсчётов токенов.
+
+    Кодировка загружается из локального кэша BPE один раз на процесс. Количество токенов
+    запоминается для последних `cache_size` текстов, поэтому постоянные промпты
+    ассистентов не токенизируются на каждое сообщение. Токенизация промахов выполняется
+    в пуле потоков одним вызовом на батч.
+
+    ### Args:
+    - cache_size (`int`, optional): Количество запоминаемых подсчётов.
+
+    """
+
+    def __init__(self, cache_size: int = 2048) -> None:
+        self.cache_size = cache_size
+        self.encodings: dict[str, Encoding] = {}
+        self.counts: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self.lock = threading.Lock()
+
+    async def get_encoding(self, model_title: str) -> Encoding:
+        """Кодировка модели, для неизвестных tiktoken моделей — `cl100k_base`."""
+        encoding = self.encodings.get(model_title)
+        if encoding is None:
+            try:
+                encoding = await tiktoken_async.encoding_for_model(model_title)
+            except KeyError:
+                encoding = await tiktoken_async.get_encoding(DEFAULT_ENCODING)
+            self.encodings[model_title] = encoding
+        return encoding
+
+    async def count_tokens(self, model_title: str, texts: list[str]) -> list[int]:
+        """
+        Количество токенов в каждом тексте.
+
+        ### Args:
+        - model_title (`str`): Название модели GPT.
+        - texts (`list[str]`): Тексты для подсчёта.
+
+        """
+        encoding = await self.get_encoding(model_title)
+        keys = [(encoding.name, text) for text in texts]
+        with self.lock:
+            counts = [self.counts.get(key) for key in keys]
+            for key, count in zip(keys, counts):
+                if count is not None:
+                    self.counts.move_to_end(key)
+        missed = list(dict.fromkeys(key[1] for key, count in zip(keys, counts) if count is None))
+        if missed:
+            computed = await asyncio.get_running_loop().run_in_executor(None, self.encode_lengths, encoding, missed)
+            with self.lock:
+                for text, count in zip(missed, computed):
+                    self.counts[(encoding.name, text)] = count
+                while len(self.counts) > self.cache_size:
+                    self.counts.popitem(last=False)
+            known = dict(zip(missed, computed))
+            counts = [known[key[1]] if count is None else count for key, count in zip(keys, counts)]
+        return counts
+
+    @staticmethod
+    def encode_lengths(encoding: Encoding, texts: list[str]) -> list[int]:
+        return [len(encoding.encode(text, disallowed_special=())) for text in texts]
+
+
+tokenizers = TokenizerRegistry(settings.TOKEN_COUNT_CACHE_SIZE)
+
+
+async def count_tokens(model_title: str, texts: list[str]) -> list[int]:
+    return await tokenizers.count_tokens(model_title, texts)
@@ -1,6 +1,9 @@
-import markdown
+import asyncio
+from uuid import uuid4
+
 from ai.gpt_exception import handle_exceptions
 from ai.gpt_query import GetAnswerGPT
+from ai.rendering import convert_markdown
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.conf import settings
 from django.db.models import Model
@@ -12,42 +15,73 @@ ADMIN_ID = settings.TELEGRAM_ADMIN_ID
 
 class WSAnswerChatGPT(GetAnswerGPT):
     MAX_TYPING_TIME = 3
+    STREAM_INTERVAL = 0.1
 
     def __init__(self, channel_layer: AsyncWebsocketConsumer, room_group_name: str, user: Model, query_text: str, message_count: int) -> None:
         assist_prompt = self.init_model_prompt()
         history_model = HistoryAI
-        super().__init__(query_text, assist_prompt, user, history_model)
+        super().__init__(query_text, assist_prompt, user, history_model, stream=settings.GPT_STREAM)
         self.channel_layer = channel_layer
         self.room_group_name = room_group_name
         self.message_count = message_count
+        self.stream_id = uuid4().hex
+        self.streamed_length = 0
+
+    @property
+    def is_stateless(self) -> bool:
+        """У гостей нет истории диалога."""
+        return not self.is_user_authenticated
+
+    @property
+    def in_flight_owner(self) -> int | str:
+        """У гостей нет id, запросы различаются по комнате."""
+        return self.user.id if self.is_user_authenticated else self.room_group_name
 
     async def answer_from_ai(self) -> dict:
         """Основная логика."""
         try:
             await self.get_answer_chat_gpt()
+        except asyncio.CancelledError:
+            # соединение закрыто, ответ в комнату больше не отправляется
+            raise
         except Exception as err:
             self.return_text, *_ = await handle_exceptions(err)
             await self.handle_error(f'Ошибка в `GetAnswerGPT.answer_from_ai()`: {str(err)}')
-        finally:
-            if self.user.is_anonymous and self.message_count == 1:
-                welcome_text = (
-                    'С большой радостью приветствуем тебя! 🌟\n'
-                    'Завершив процесс регистрации и авторизации, ты получишь доступ к уникальной возможности: '
-                    'вести диалог с ИИ Ева. Это гораздо больше, чем простые ответы на вопросы — это целый новый мир, '
-                    'где ты можешь общаться, учиться и исследовать. Ваш диалог будет тщательно сохранён, '
-                    'что позволит легко продолжить общение даже при переходе между страницами сайта. '
-                )
-                await self.send_chat_message(welcome_text)
-
-            await self.send_chat_message(self.return_text)
-
-    async def send_chat_message(self, message):
+
+        if self.user.is_anonymous and self.message_count == 1:
+            welcome_text = (
+                'С большой радостью приветствуем тебя! 🌟\n'
+                'Завершив процесс регистрации и авторизации, ты получишь доступ к уникальной возможности: '
+                'вести диалог с ИИ Ева. Это гораздо больше, чем простые ответы на вопросы — это целый новый мир, '
+                'где ты можешь общаться, учиться и исследовать. Ваш диалог будет тщательно сохранён, '
+                'что позволит легко продолжить общение даже при переходе между страницами сайта. '
+            )
+            await self.send_chat_message(welcome_text)
+
+        await self.send_chat_message(self.return_text, self.stream_id if self.streamed_length else None)
+
+    async def stream_chunk(self, text: str) -> None:
+        """Отправляет в комнату новую часть потокового ответа."""
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat.stream',
+                'chunk': text[self.streamed_length:],
+                'stream_id': self.stream_id,
+                'username': 'Eva',
+            }
+        )
+        self.streamed_length = len(text)
+
+    async def send_chat_message(self, message, stream_id: str = None):
+        """Отправляет сообщение в комнату, `stream_id` заменяет им частичный потоковый ответ."""
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat.message',
-                'message': markdown.markdown(message, extensions=['fenced_code']),
+                'message': self.return_html if message == self.return_text else convert_markdown(message),
                 'username': 'Eva',
+                'stream_id': stream_id,
             }
         )
 
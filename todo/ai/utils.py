@@ -4,8 +4,10 @@ import traceback
 from datetime import timedelta
 
 import httpx
-import markdown
-import tiktoken_async
+from ai.in_flight import InFlightRequest
+from ai.openai_client import get_openai_client
+from ai.rendering import convert_markdown
+from ai.tokenizer import count_tokens
 from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
@@ -13,14 +15,12 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Model
 from django.utils.timezone import now
-from httpx_socks import AsyncProxyTransport
 from openai import AsyncOpenAI
 from telbot.loader import bot
 from telbot.models import GptModels, HistoryAI
 
 ADMIN_ID = settings.TELEGRAM_ADMIN_ID
 User = get_user_model()
-redis_client = settings.REDIS_CLIENT
 
 
 class AnswerChatGPT():
@@ -41,8 +41,10 @@ class AnswerChatGPT():
         self.time_start = None
         self.answer_tokens = None
         self.answer_text = AnswerChatGPT.ERROR_TEXT
+        self.rendered_answer = None
         self.model = None
         self.prompt = self.init_prompt()
+        self.in_flight = None
         self.message_tokens = None
         self.set_windows_time()
 
@@ -58,7 +60,7 @@ class AnswerChatGPT():
 
         if self.check_long_query:
             response_message = f'{self.user}, у Вас слишком большой текст запроса. Попробуйте сформулировать его короче.'
-            await self.send_chat_message(response_message)
+            await asyncio.gather(self.send_chat_message(response_message), self.del_mess_in_redis())
             return None
 
         try:
@@ -100,7 +102,6 @@ class AnswerChatGPT():
 
     async def httpx_request_to_openai(self) -> None:
         """Делает запрос в OpenAI и выключает typing."""
-        transport = AsyncProxyTransport.from_url(settings.SOCKS5)
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.model.token}"
@@ -111,24 +112,23 @@ class AnswerChatGPT():
             "temperature": 0.3
         }
         try:
-            async with httpx.AsyncClient(transport=transport) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=60 * self.MAX_TYPING_TIME,
-                )
-                response.raise_for_status()
-                completion = response.json()
-                choices = completion.get('choices')
-                if choices and len(choices) > 0:
-                    first_choice = choices[0]
-                    self.answer_text = first_choice['message']['content']
-                    self.answer_tokens = completion.get('usage', {}).get('completion_tokens')
-                    self.message_tokens = completion.get('usage', {}).get('prompt_tokens')
-                else:
-                    await self.handle_error(json.dumps(completion, ensure_ascii=False, indent=4))
-                    raise ValueError("`AnswerChatGPT`, ответ не содержит полей 'choices'")
+            response = await get_openai_client().post(
+                "/chat/completions",
+                headers=headers,
+                json=data,
+                timeout=60 * self.MAX_TYPING_TIME,
+            )
+            response.raise_for_status()
+            completion = response.json()
+            choices = completion.get('choices')
+            if choices and len(choices) > 0:
+                first_choice = choices[0]
+                self.answer_text = first_choice['message']['content']
+                self.answer_tokens = completion.get('usage', {}).get('completion_tokens')
+                self.message_tokens = completion.get('usage', {}).get('prompt_tokens')
+            else:
+                await self.handle_error(json.dumps(completion, ensure_ascii=False, indent=4))
+                raise ValueError("`AnswerChatGPT`, ответ не содержит полей 'choices'")
 
         except httpx.HTTPStatusError as http_err:
             raise RuntimeError(f'`AnswerChatGPT`, ответ сервера был получен, но код состояния указывает на ошибку: {http_err}') from http_err
@@ -139,12 +139,19 @@ class AnswerChatGPT():
         except Exception as error:
             raise RuntimeError(f'Необработанная ошибка в `AnswerChatGPT.httpx_request_to_openai()`: {error}') from error
 
+    @property
+    def answer_html(self) -> str:
+        """HTML ответа, отрисовывается один раз для чата и записи в историю."""
+        if self.rendered_answer is None or self.rendered_answer[0] != self.answer_text:
+            self.rendered_answer = (self.answer_text, convert_markdown(self.answer_text))
+        return self.rendered_answer[1]
+
     async def send_chat_message(self, message):
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat.message',
-                'message': markdown.markdown(message, extensions=['fenced_code']),
+                'message': self.answer_html if message == self.answer_text else convert_markdown(message),
                 'username': 'Eva',
             }
         )
@@ -156,11 +163,8 @@ class AnswerChatGPT():
 
     async def num_tokens_from_message(self):
         """Считает количество токенов в сообщении пользователя."""
-        try:
-            encoding = await tiktoken_async.encoding_for_model(self.model.title)
-        except KeyError:
-            encoding = await tiktoken_async.get_encoding("cl100k_base")
-        self.message_tokens = len(encoding.encode(self.message_text)) + 4
+        count, = await count_tokens(self.model.title, [self.message_text])
+        self.message_tokens = count + 4
 
     async def create_history_ai(self):
         """Создаём запись в БД."""
@@ -170,7 +174,9 @@ class AnswerChatGPT():
             question=self.message_text,
             question_tokens=self.message_tokens,
             answer=self.answer_text,
-            answer_tokens=self.answer_tokens
+            answer_html=self.answer_html,
+            answer_tokens=self.answer_tokens,
+            model=self.model.title,
         )
         await instance.save()
 
@@ -226,17 +232,15 @@ class AnswerChatGPT():
 
     @sync_to_async
     def check_in_works(self) -> bool:
-        """Проверяет нет ли уже в работе этого запроса в Redis."""
-        queries = redis_client.lrange(f'gpt_:{self.room_group_name}', 0, -1)
-        if self.message_text.encode('utf-8') in queries:
-            return True
-        redis_client.lpush(f'gpt_:{self.room_group_name}', self.message_text)
-        return False
+        """Проверяет нет ли уже в работе этого запроса в Redis и отмечает его в противном случае."""
+        self.in_flight = InFlightRequest('gpt_web', self.room_group_name, self.message_text, self.MAX_TYPING_TIME * 60 * 1000)
+        return not self.in_flight.acquire()
 
     @sync_to_async
-    def del_mess_in_redis(self) -> bool:
-        """Удаляет входящее сообщение из Redis."""
-        redis_client.lrem(f'gpt_:{self.room_group_name}', 1, self.message_text.encode('utf-8'))
+    def del_mess_in_redis(self) -> None:
+        """Снимает отметку запроса в работе."""
+        if self.in_flight:
+            self.in_flight.release()
 
     @property
     def check_long_query(self) -> bool:
@@ -254,17 +258,3 @@ class AnswerChatGPT():
             },
             {'role': 'user', 'content': self.message_text}
         ]
-
-
-def convert_markdown(text: str) -> str:
-    """
-    Конвертирует теги Markdown в HTML-теги
-
-    ### Args:
-    - text (str): Входной текст для конвертации.
-
-    ### Return:
-    - (str): Текст с замененными тегами
-    """
-
-    return markdown.markdown(text, extensions=['fenced_code'])
@@ -1,9 +1,9 @@
-import asyncio
-
+from django.db.models.functions import Coalesce
 from django.http import HttpRequest, JsonResponse
 from django.views import View
 
-from .utils import AnswerChatGPT, convert_markdown
+from .openai_client import run_in_thread_loop
+from .utils import AnswerChatGPT
 
 
 class AI(View):
@@ -17,12 +17,13 @@ class AI(View):
                 .history_ai
                 .exclude(answer__in=[None, AnswerChatGPT.ERROR_TEXT])
                 .order_by('-created_at')
-                .values('question', 'answer')[:20]
+                # HTML сохраняется при записи ответа, до `backfill_answer_html` у старых записей - исходный текст
+                .values('question', html=Coalesce('answer_html', 'answer'))[:20]
             )
             for item in history[::-1]:
                 data.append({
                     'question': item['question'],
-                    'answer': convert_markdown(item['answer']),
+                    'answer': item['html'],
                 })
 
         response_data = {
@@ -38,13 +39,12 @@ class AI(View):
         response_data = {}
 
         get_answer = AnswerChatGPT(request.user, question)
-        message = asyncio.run(get_answer.get_answer_from_ai())
+        message = run_in_thread_loop(get_answer.get_answer_from_ai())
 
         if message:
-            message_html = convert_markdown(message)
             response_data = {
                 'chat_id': chat_id,
-                'message': message_html,
+                'message': get_answer.answer_html,
             }
             return JsonResponse(response_data, status=200)
         return JsonResponse(response_data, status=102)
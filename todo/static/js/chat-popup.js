@@ -23,6 +23,19 @@ $(document).ready(function () {
     socket.onmessage = function(event) {
         var messages = $('.messages');
         const data = JSON.parse(event.data);
+        if (data.stream_id) {
+            var streaming = messages.children('[data-stream="' + data.stream_id + '"]');
+            if (data.chunk !== undefined) {
+                if (!streaming.length) {
+                    streaming = $('<li class="other"></li>').attr('data-stream', data.stream_id).appendTo(messages);
+                }
+                streaming.text(streaming.text() + data.chunk);
+                messages.scrollTop(messages.prop("scrollHeight"));
+                updateTypingIndicator();
+                return;
+            }
+            streaming.remove();
+        }
         messages.append(data.message);
         messages.scrollTop(messages.prop("scrollHeight"));
         updateTypingIndicator();
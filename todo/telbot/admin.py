@@ -5,7 +5,7 @@ from django.db.models.functions import Concat
 from django.utils.safestring import mark_safe
 
 from .models import (GptModels, HistoryAI, HistoryDALLE, ReminderAI,
-                     UserGptModels)
+                     TokenUsage, UserGptModels)
 
 User = get_user_model()
 
@@ -112,3 +112,13 @@ class HistoryDALLEAdmin(admin.ModelAdmin):
         return mark_safe(
             f'<img src="{obj.answer.get("media")}" style="max-height: 800px;">'
         )
+
+
+@admin.register(TokenUsage)
+class TokenUsageAdmin(admin.ModelAdmin):
+    list_display = ('user', 'model', 'day', 'requests', 'question_tokens', 'answer_tokens')
+    list_filter = (
+        ('day', admin.DateFieldListFilter),
+        ('model', admin.AllValuesFieldListFilter),
+    )
+    search_fields = ('user__username', 'user__first_name')
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+import httpx
+from django.conf import settings
+
+TELEGRAM_API_URL = 'https://api.telegram.org'
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class ChatActionEntry:
+    """Действие в чате, которое показывается до `deadline` или установки `stop_event`."""
+    chat_id: int
+    action: str
+    deadline: float
+    stop_event: asyncio.Event = None
+
+    @property
+    def is_active(self) -> bool:
+        return time.monotonic() < self.deadline and not (self.stop_event and self.stop_event.is_set())
+
+
+class ChatActionBroadcaster:
+    """
+    Общая рассылка действий `typing`, `upload_photo` и т.п. для всех задач ИИ в event loop.
+
+    Задачи регистрируют действие контекстным менеджером `action`, а одна фоновая задача
+    отправляет действия всех активных чатов одновременно через асинхронный клиент Bot API,
+    не блокируя event loop: новое действие — сразу, далее раз в `TICK` секунд. Одинаковые
+    действия в одном чате отправляются один раз. Задача рассылки завершается, когда
+    активных действий нет.
+
+    ### Args:
+    - token (`str`, optional): Токен бота.
+    - base_url (`str`, optional): Адрес Bot API.
+    - transport (`httpx.AsyncBaseTransport`, optional): Транспорт клиента Bot API.
+
+    """
+    TICK = 4.0  # Телеграм показывает действие 5 секунд
+
+    def __init__(self, token: str = None, base_url: str = TELEGRAM_API_URL, transport: httpx.AsyncBaseTransport = None) -> None:
+        self.token = token or settings.TELEGRAM_TOKEN
+        self.base_url = base_url
+        self.transport = transport
+        self.entries: set[ChatActionEntry] = set()
+        self.task: asyncio.Task = None
+        self.wakeup = asyncio.Event()
+
+    @asynccontextmanager
+    async def action(self, chat_id: int, action: str, timeout: float, stop_event: asyncio.Event = None) -> AsyncIterator[ChatActionEntry]:
+        """
+        Показывает действие в чате на время выполнения блока.
+
+        ### Args:
+        - chat_id (`int`): ID чата.
+        - action (`str`): Действие `telegram.ChatAction`.
+        - timeout (`float`): Максимальное время показа, сек.
+        - stop_event (`asyncio.Event`, optional): Событие досрочного завершения показа.
+
+        """
+        entry = ChatActionEntry(chat_id, action, time.monotonic() + timeout, stop_event)
+        self.entries.add(entry)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        else:
+            self.wakeup.set()
+        try:
+            yield entry
+        finally:
+            self.entries.discard(entry)
+            self.wakeup.set()
+
+    def active_actions(self) -> set[tuple[int, str]]:
+        self.entries = {entry for entry in self.entries if entry.is_active}
+        return {(entry.chat_id, entry.action) for entry in self.entries}
+
+    async def run(self) -> None:
+        sent_at: dict[tuple[int, str], float] = {}
+        async with httpx.AsyncClient(base_url=f'{self.base_url}/bot{self.token}', transport=self.transport, timeout=self.TICK) as client:
+            while actions := self.active_actions():
+                self.wakeup.clear()
+                now = time.monotonic()
+                due = [item for item in actions if now - sent_at.get(item, -self.TICK) >= self.TICK]
+                sent_at = {item: now if item in due else sent_at[item] for item in actions}
+                await asyncio.gather(*[self.send(client, chat_id, action) for chat_id, action in due])
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), min(sent_at.values()) + self.TICK - time.monotonic())
+                except asyncio.TimeoutError:
+                    pass
+
+    @staticmethod
+    async def send(client: httpx.AsyncClient, chat_id: int, action: str) -> None:
+        try:
+            response = await client.post('/sendChatAction', json={'chat_id': chat_id, 'action': action})
+            response.raise_for_status()
+        except httpx.HTTPError as err:
+            logger.warning('sendChatAction `%s` в чат %s: %s', action, chat_id, err)
+
+
+_broadcasters: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ChatActionBroadcaster] = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_broadcaster() -> ChatActionBroadcaster:
+    """Рассылка действий текущего event loop, создаётся при первом обращении."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        broadcaster = _broadcasters.get(loop)
+        if broadcaster is None:
+            broadcaster = _broadcasters[loop] = ChatActionBroadcaster()
+    return broadcaster
+
+
+def chat_action(chat_id: int, action: str, timeout: float, stop_event: asyncio.Event = None):
+    """Контекстный менеджер показа действия в чате, см. `ChatActionBroadcaster.action`."""
+    return get_broadcaster().action(chat_id, action, timeout, stop_event)
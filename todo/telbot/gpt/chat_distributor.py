@@ -1,15 +1,15 @@
 import asyncio
-import json
 from functools import partial
 
-import httpx
-from django.conf import settings
+from ai.openai_client import run_in_thread_loop
 from telbot.notes.add_notes import NoteManager
 from telegram import Update
 from telegram.ext import CallbackContext
 
 from ..checking import check_registration
 from .chat_gpt import TelegramAnswerGPT
+from .intents import dispatch_intent
+from .predict_client import get_predict_client
 
 
 async def async_check_registration(update, context):
@@ -26,29 +26,24 @@ async def async_check_registration(update, context):
 
 
 async def check_request_in_distributor(update, context):
-    url = 'http://127.0.0.1:8100/tasks/check/' if settings.DEBUG else 'http://predict:8100/tasks/check/'
     text = update.effective_message.text
-    data = {'text': text}
-
-    async with httpx.AsyncClient() as client:
-        user_task = asyncio.create_task(async_check_registration(update, context))
-        post_task = asyncio.create_task(client.post(url, json=data))
-        user, response = await asyncio.gather(user_task, post_task)
-
-    completion = json.loads(response.content)
+    user, prediction = await asyncio.gather(
+        async_check_registration(update, context),
+        get_predict_client().classify(text),
+    )
 
-    if completion['predicted_class'] == 'task':
+    if prediction.is_task:
         note_manager = NoteManager(update, context, user)
         await note_manager.add_notes()
-    else:
+    elif not await dispatch_intent(update, context, user, prediction):
         get_answer = TelegramAnswerGPT(update, context, user)
         await get_answer.answer_from_ai()
 
 
 def get_answer_chat_gpt_public(update: Update, context: CallbackContext):
-    asyncio.run(check_request_in_distributor(update, context))
+    run_in_thread_loop(check_request_in_distributor(update, context))
 
 
 def get_answer_chat_gpt_person(update: Update, context: CallbackContext):
     if update.effective_chat.type == 'private':
-        asyncio.run(check_request_in_distributor(update, context))
+        run_in_thread_loop(check_request_in_distributor(update, context))
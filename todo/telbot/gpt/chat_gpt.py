@@ -1,17 +1,25 @@
+import asyncio
+import time
+
 from ai.gpt_exception import handle_exceptions
 from ai.gpt_query import GetAnswerGPT
 from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db.models import Model
+from telbot.loader import bot
 from telbot.models import HistoryAI
 from telbot.service_message import send_message_to_chat
 from telegram import ParseMode, Update
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import BadRequest, RetryAfter, TelegramError
 from telegram.ext import CallbackContext
 
 ADMIN_ID = settings.TELEGRAM_ADMIN_ID
 
 
 class TelegramAnswerGPT(GetAnswerGPT):
+    # Телеграм ограничивает частоту редактирования сообщений в чате
+    STREAM_INTERVAL = settings.GPT_STREAM_EDIT_INTERVAL
 
     def __init__(self, update: Update, _: CallbackContext, user: 'Model') -> None:
         query_text = update.effective_message.text
@@ -19,7 +27,9 @@ class TelegramAnswerGPT(GetAnswerGPT):
         history_model = HistoryAI
         self.chat_id = update.effective_chat.id
         self.message_id = update.message.message_id
-        super().__init__(query_text, assist_prompt, user, history_model, self.chat_id, 0.3)
+        self.reply_messages = []  # сообщения потокового ответа: [message_id, показанный текст]
+        self.edit_paused_until = 0  # правки сообщения отложены до этого времени по time.monotonic()
+        super().__init__(query_text, assist_prompt, user, history_model, self.chat_id, 0.3, settings.GPT_STREAM)
 
     async def answer_from_ai(self) -> dict:
         """Основная логика."""
@@ -36,10 +46,81 @@ class TelegramAnswerGPT(GetAnswerGPT):
         error_message = f"Ошибка в блоке Telegram-ChatGPT:\n{err}"
         send_message_to_chat(ADMIN_ID, error_message)
 
+    @staticmethod
+    def split_reply(text: str) -> list[str]:
+        """
+        Части ответа по `MAX_MESSAGE_LENGTH` символов, по возможности по границе строки.
+
+        Граница части зависит только от текста до неё, поэтому при дописывании
+        потокового ответа уже отправленные части не меняются.
+        """
+        parts, start = [], 0
+        while len(text) - start > MAX_MESSAGE_LENGTH:
+            end = text.rfind('\n', start + MAX_MESSAGE_LENGTH // 2, start + MAX_MESSAGE_LENGTH) + 1 or start + MAX_MESSAGE_LENGTH
+            parts.append(text[start:end])
+            start = end
+        parts.append(text[start:])
+        return parts
+
+    @sync_to_async
+    def stream_chunk(self, text: str) -> None:
+        """
+        Показывает частичный ответ: сообщение отправляется и далее редактируется,
+        после `MAX_MESSAGE_LENGTH` ответ продолжается в новом сообщении.
+
+        Частичный ответ не обязателен: при ошибке Телеграма правка пропускается,
+        после `RetryAfter` следующие правки ждут разрешённое время.
+        """
+        if time.monotonic() < self.edit_paused_until:
+            return
+        try:
+            for index, part in enumerate(self.split_reply(text)):
+                if index == len(self.reply_messages):
+                    message_id = bot.send_message(self.chat_id, part, reply_to_message_id=self.message_id).message_id
+                    self.reply_messages.append([message_id, part])
+                elif self.reply_messages[index][1] != part:
+                    bot.edit_message_text(part, self.chat_id, self.reply_messages[index][0])
+                    self.reply_messages[index][1] = part
+        except RetryAfter as err:
+            self.edit_paused_until = time.monotonic() + err.retry_after
+        except TelegramError:
+            pass
+
+    async def reply_to_user(self) -> None:
+        """
+        Отправляет ответ пользователю или дописывает сообщения потокового ответа.
+
+        Правки ждут паузу после `RetryAfter`. Если правка всё равно не прошла, отдельным
+        сообщением отправляется только та часть ответа, которой в сообщении ещё нет.
+        """
+        parts = self.split_reply(self.return_text)
+        if not self.reply_messages:
+            for part in parts:
+                await sync_to_async(send_message_to_chat)(self.chat_id, part, self.message_id, ParseMode.MARKDOWN)
+            return
+        await asyncio.sleep(max(0, self.edit_paused_until - time.monotonic()))
+        for index, part in enumerate(parts):
+            if index < len(self.reply_messages):
+                message_id, shown = self.reply_messages[index]
+                if await self.edit_reply(message_id, part):
+                    continue
+                part = part[len(shown):] if part.startswith(shown) else part
+            if part:
+                await sync_to_async(send_message_to_chat)(self.chat_id, part, self.message_id)
+
     @sync_to_async
-    def reply_to_user(self) -> None:
-        """Отправляет ответ пользователю."""
-        send_message_to_chat(self.chat_id, self.return_text, self.message_id, ParseMode.MARKDOWN)
+    def edit_reply(self, message_id: int, text: str) -> bool:
+        """Дописывает сообщение потокового ответа частью полного текста, False - правка не прошла."""
+        try:
+            try:
+                bot.edit_message_text(text, self.chat_id, message_id, parse_mode=ParseMode.MARKDOWN)
+            except BadRequest as err:
+                if 'not modified' in str(err):
+                    return True
+                bot.edit_message_text(text, self.chat_id, message_id)
+        except TelegramError as err:
+            return 'not modified' in str(err)
+        return True
 
     @property
     def init_model_prompt(self) -> str:
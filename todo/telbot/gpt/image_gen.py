@@ -6,6 +6,8 @@ from io import BytesIO
 
 import httpx
 import requests
+from ai.in_flight import InFlightRequest
+from ai.openai_client import get_openai_client, run_in_thread_loop
 from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -18,13 +20,13 @@ from telegram import ChatAction, ParseMode, Update
 from telegram.ext import CallbackContext, ConversationHandler
 from urllib3 import Retry
 
+from ..chat_actions import chat_action
 from ..checking import check_registration
 from ..cleaner import remove_keyboard
 from ..models import HistoryDALLE
 
 load_dotenv()
 
-redis_client = settings.REDIS_CLIENT
 User = get_user_model()
 
 
@@ -54,6 +56,7 @@ class GetAnswerDallE():
         self.chat_id = update.effective_chat.id
         self.message_text = update.effective_message.text
         self.event = asyncio.Event()
+        self.in_flight = None
         self.set_user()
         self.set_windows_time()
 
@@ -66,19 +69,19 @@ class GetAnswerDallE():
             return {'code': 423}
 
         try:
-            asyncio.create_task(self.send_typing_periodically())
-            await self.request_to_openai()
-            if self.media_group:
-                await self.reply_to_user_requests()  # TODO переделать на HTTPX для сокращения библиотек
-                self.event.set()
-                await self.save_request()
-            else:
-                self.context.bot.send_message(
-                    chat_id=self.chat_id,
-                    text='Лимит бесплатной генерации картинок превышен. Попробуйте позже, через месяц...',
-                    reply_to_message_id=self.update.message.message_id,
-                )
-                self.event.set()
+            async with chat_action(self.chat_id, ChatAction.UPLOAD_PHOTO, self.MAX_TYPING_TIME * 60, self.event):
+                await self.request_to_openai()
+                if self.media_group:
+                    await self.reply_to_user_requests()  # TODO переделать на HTTPX для сокращения библиотек
+                    self.event.set()
+                    await self.save_request()
+                else:
+                    self.context.bot.send_message(
+                        chat_id=self.chat_id,
+                        text='Лимит бесплатной генерации картинок превышен. Попробуйте позже, через месяц...',
+                        reply_to_message_id=self.update.message.message_id,
+                    )
+                    self.event.set()
 
         except Exception as err:
             traceback_str = traceback.format_exc()
@@ -161,26 +164,10 @@ class GetAnswerDallE():
             )
             await instance.save()
 
-    async def send_typing_periodically(self) -> None:
-        """"
-        Передаёт TYPING в чат Телеграм откуда пришёл запрос.
-        """
-        time_stop = datetime.now() + timedelta(minutes=GetAnswerDallE.MAX_TYPING_TIME)
-
-        while not self.event.is_set():
-            self.context.bot.send_chat_action(
-                chat_id=self.chat_id,
-                action=ChatAction.UPLOAD_PHOTO
-            )
-            await asyncio.sleep(2)
-            if datetime.now() > time_stop:
-                break
-
     async def request_to_openai(self) -> list:
         """
         Делает запрос в OpenAI.
         """
-        transport = AsyncProxyTransport.from_url(settings.SOCKS5)
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {settings.CHAT_GPT_TOKEN}"
@@ -192,13 +179,12 @@ class GetAnswerDallE():
             "n": self.IMAGE_COUNT,
             "quality": "hd"
         }
-        async with httpx.AsyncClient(transport=transport) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/images/generations",
-                headers=headers,
-                json=data,
-                timeout=60 * self.MAX_TYPING_TIME,
-            )
+        response = await get_openai_client().post(
+            "/images/generations",
+            headers=headers,
+            json=data,
+            timeout=60 * self.MAX_TYPING_TIME,
+        )
         completion = json.loads(response.content)
         if 'error' in completion:
             return
@@ -218,17 +204,15 @@ class GetAnswerDallE():
 
     @sync_to_async
     def check_in_works(self) -> bool:
-        """Проверяет нет ли уже в работе этого запроса в Redis."""
-        queries = redis_client.lrange(f'dal_e_user:{self.user.id}', 0, -1)
-        if self.message_text.encode('utf-8') in queries:
-            return True
-        redis_client.lpush(f'dal_e_user:{self.user.id}', self.message_text)
-        return False
+        """Проверяет нет ли уже в работе этого запроса в Redis и отмечает его в противном случае."""
+        self.in_flight = InFlightRequest('dalle', self.user.id, self.message_text, self.MAX_TYPING_TIME * 60 * 1000)
+        return not self.in_flight.acquire()
 
     @sync_to_async
-    def del_mess_in_redis(self) -> bool:
-        """Удаляет входящее сообщение из Redis."""
-        redis_client.lrem(f'dal_e_user:{self.user.id}', 1, self.message_text.encode('utf-8'))
+    def del_mess_in_redis(self) -> None:
+        """Снимает отметку запроса в работе."""
+        if self.in_flight:
+            self.in_flight.release()
 
 
 def for_check(update: Update, context: CallbackContext):
@@ -264,5 +248,5 @@ def get_image_dall_e(update: Update, context: CallbackContext):
     if del_id:
         context.bot.delete_message(update.effective_chat.id, del_id)
     get_answer = GetAnswerDallE(update, context)
-    asyncio.run(get_answer.get_image_dall_e())
+    run_in_thread_loop(get_answer.get_image_dall_e())
     return ConversationHandler.END
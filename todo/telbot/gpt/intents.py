@@ -0,0 +1,98 @@
+import asyncio
+import traceback
+from functools import partial
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from ..geoservis.weather import current_weather
+from ..notes.del_notes import TaskDeleter
+from ..notes.parse_note import TaskParse
+from ..notes.show_notes import ShowEvents
+from ..parse.jokes import joke_parsing
+from .predict_client import Prediction
+
+User = get_user_model()
+
+
+def has_location(user: User) -> bool:
+    return bool(user and not user.is_blocked_bot and user.locations.all())
+
+
+def handle_weather(update: Update, context: CallbackContext, user: User) -> bool:
+    """Текущая погода по последним координатам, только в личном чате."""
+    if update.effective_chat.type != 'private' or not has_location(user):
+        return False
+    current_weather(update, context)
+    return True
+
+
+def handle_show_notes(update: Update, context: CallbackContext, user: User) -> bool:
+    """Записи на дату из сообщения или весь список, если дата не указана."""
+    if not has_location(user):
+        return False
+    task_parse = TaskParse(update.effective_message.text, user.locations.all()[0].timezone, user, update.effective_chat.id, True)
+    try:
+        asyncio.run(task_parse.parse_message())
+    except ValueError:
+        task_parse.user_datetime = None
+    ShowEvents(update, context, task_parse.user_datetime).run()
+    return True
+
+
+def handle_delete_note(update: Update, context: CallbackContext, user: User) -> bool:
+    """Удаление напоминания по тексту и дате из сообщения."""
+    if not has_location(user):
+        return False
+    TaskDeleter(update, context).run()
+    return True
+
+
+def handle_joke(update: Update, context: CallbackContext, user: User) -> bool:
+    """Анекдот в ответ на сообщение."""
+    update.effective_message.reply_text(joke_parsing())
+    return True
+
+
+INTENT_HANDLERS: dict[str, Callable[[Update, CallbackContext, User], bool]] = {
+    'weather': handle_weather,
+    'show_notes': handle_show_notes,
+    'delete_note': handle_delete_note,
+    'joke': handle_joke,
+}
+
+
+async def dispatch_intent(update: Update, context: CallbackContext, user: User, prediction: Prediction) -> bool:
+    """
+    Обрабатывает дешёвый интент существующим обработчиком бота без запроса к ИИ.
+
+    Интент обрабатывается, только если уверенность модели не ниже `PREDICT_INTENT_THRESHOLD`
+    и у пользователя есть всё необходимое обработчику. Синхронные обработчики выполняются
+    в пуле потоков, т.к. обращаются к БД и внешним API.
+
+    ### Args:
+    - update (`Update`): Обновление Telegram.
+    - context (`CallbackContext`): Контекст колбэка.
+    - user (`User`): Пользователь, отправивший сообщение.
+    - prediction (`Prediction`): Результат классификации сообщения.
+
+    ### Returns:
+    - `bool`: True, если сообщение обработано и ответ ИИ не нужен.
+
+    """
+    handler = INTENT_HANDLERS.get(prediction.predicted_class)
+    if handler is None or prediction.confidence < settings.PREDICT_INTENT_THRESHOLD:
+        return False
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, partial(handler, update, context, user))
+    except Exception as err:
+        traceback_str = traceback.format_exc()
+        context.bot.send_message(
+            chat_id=settings.TELEGRAM_ADMIN_ID,
+            text=f'Ошибка в обработке интента `{prediction.predicted_class}`: {str(err)[:1024]}\n\nТрассировка:\n{traceback_str[-1024:]}',
+        )
+        return False
@@ -0,0 +1,105 @@
+import os
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+class PredictError(Exception):
+    """Ошибки обращения к сервису predict."""
+    pass
+
+
+@dataclass(frozen=True)
+class Prediction:
+    """
+    Результат классификации текста сервисом predict.
+
+    ### Fields:
+    - predicted_class (`str`): Предсказанный класс.
+    - probabilities (`dict[str, float]`): Вероятности классов, если сервис их вернул.
+    - confidence (`float`): Уверенность модели в предсказанном классе.
+
+    """
+    predicted_class: str
+    probabilities: dict[str, float] = field(default_factory=dict)
+    confidence: float = None
+
+    def __post_init__(self) -> None:
+        if self.confidence is None:
+            # старые версии predict не возвращали confidence
+            object.__setattr__(self, 'confidence', self.probabilities.get(self.predicted_class, 1.0))
+
+    @property
+    def is_task(self) -> bool:
+        return self.predicted_class == 'task'
+
+
+class PredictClient:
+    """
+    Долгоживущий клиент сервиса predict с пулом keep-alive соединений.
+
+    Синхронный `httpx.Client` не привязан к event loop, поэтому соединения переживают
+    `asyncio.run` на каждый апдейт Телеграм и переиспользуются между сообщениями.
+    Асинхронный `classify` выполняет запрос в пуле потоков. Неудачные подключения
+    повторяет транспорт, ответы 502/503/504 — `classify_sync` с паузой.
+
+    ### Args:
+    - base_url (`str`): Адрес сервиса predict.
+    - uds (`str`, optional): Путь к Unix-сокету, если predict запущен рядом.
+    - timeout (`float`, optional): Таймаут запроса, сек.
+    - retries (`int`, optional): Количество повторов при ошибках подключения и 502/503/504.
+    - transport (`httpx.BaseTransport`, optional): Транспорт, заменяющий стандартный, повторы подключения — на его стороне.
+
+    """
+    RETRY_STATUSES = {502, 503, 504}
+    BACKOFF = 0.2
+
+    def __init__(self, base_url: str, uds: str = None, timeout: float = 10, retries: int = 2, transport: httpx.BaseTransport = None) -> None:
+        self.retries = retries
+        self.client = httpx.Client(
+            base_url=base_url,
+            transport=transport or httpx.HTTPTransport(
+                uds=uds,
+                retries=retries,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+            ),
+            timeout=httpx.Timeout(timeout, connect=2),
+        )
+
+    def classify_sync(self, text: str) -> Prediction:
+        """Классифицирует текст, повторяя запрос при ответах 502/503/504."""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.client.post('/tasks/check/', json={'text': text})
+            except httpx.TransportError as err:
+                raise PredictError(f'`PredictClient`, проблемы соединения: {err}') from err
+            if response.status_code in self.RETRY_STATUSES and attempt < self.retries:
+                time.sleep(self.BACKOFF * 2 ** attempt)
+                continue
+            try:
+                response.raise_for_status()
+                completion = response.json()
+                return Prediction(completion['predicted_class'], completion.get('probabilities', {}), completion.get('confidence'))
+            except (httpx.HTTPStatusError, ValueError, KeyError) as err:
+                raise PredictError(f'`PredictClient`, некорректный ответ сервиса: {err}') from err
+
+    async def classify(self, text: str) -> Prediction:
+        return await sync_to_async(self.classify_sync, thread_sensitive=False)(text)
+
+    def close(self) -> None:
+        self.client.close()
+
+
+_clients: dict[int, PredictClient] = {}
+
+
+def get_predict_client() -> PredictClient:
+    """Клиент predict текущего процесса, после fork воркера Celery создаётся новый."""
+    pid = os.getpid()
+    if pid not in _clients:
+        _clients.clear()
+        _clients[pid] = PredictClient(settings.PREDICT_URL, settings.PREDICT_UDS, settings.PREDICT_TIMEOUT)
+    return _clients[pid]
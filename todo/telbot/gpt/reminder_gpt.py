@@ -22,6 +22,15 @@ class ReminderGPT(GetAnswerGPT):
             raise type_err(f'Ошибка в процессе `ReminderGPT`: {err}{traceback_str}') from err
         return self.return_text
 
+    @property
+    def is_stateless(self) -> bool:
+        return True
+
+    @property
+    def answer_cache_owner(self) -> int:
+        """Тело напоминания личное, ответ не передаётся другим пользователям."""
+        return self.user.id
+
     async def get_prompt(self) -> None:
         self.all_prompt = [
             {'role': 'system', 'content': self.init_model_prompt},
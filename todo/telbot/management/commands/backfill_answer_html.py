@@ -0,0 +1,26 @@
+from ai.rendering import convert_markdown
+from django.core.management.base import BaseCommand
+from telbot.models import HistoryAI
+
+
+class Command(BaseCommand):
+    help = 'Отрисовывает в HTML ответы HistoryAI, сохранённые без answer_html.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Количество записей истории в одном проходе.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id, rendered = 0, 0
+        while True:
+            batch = list(
+                HistoryAI.objects.filter(pk__gt=last_id, answer_html__isnull=True).order_by('pk').only('pk', 'answer')[:batch_size]
+            )
+            if not batch:
+                break
+            for history in batch:
+                history.answer_html = convert_markdown(history.answer)
+            HistoryAI.objects.bulk_update(batch, ['answer_html'])
+            last_id = batch[-1].pk
+            rendered += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Отрисовано ответов: {rendered}'))
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from telbot.models import HistoryAI, HistoryDALLE, ReminderAI, TokenUsage
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит суточный расход токенов TokenUsage из истории HistoryAI, ReminderAI и HistoryDALLE '
+        'для дней пользователя, у которых ещё нет строк расхода. Дни, уже учтённые сигналами, '
+        'и токены сворачивания истории не изменяются, поэтому команду можно запускать повторно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Количество строк истории в одном проходе.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        with transaction.atomic():
+            counted_days = set(TokenUsage.objects.values_list('user_id', 'day').distinct())
+            last_ids = {model: model.objects.aggregate(last_id=Max('pk'))['last_id'] or 0 for model in (HistoryAI, ReminderAI, HistoryDALLE)}
+
+        for model in (HistoryAI, ReminderAI, HistoryDALLE):
+            requests = 0
+            for chunk in self.chunks(model, last_ids[model], chunk_size):
+                requests += self.add_chunk(model, chunk, counted_days)
+            self.stdout.write(f'{model.__name__}: {requests} запросов')
+        self.stdout.write(self.style.SUCCESS(f'Строк расхода: {TokenUsage.objects.count()}'))
+
+    @staticmethod
+    def chunks(model, last_id, chunk_size):
+        """Диапазоны первичных ключей по `chunk_size` строк истории."""
+        start = 0
+        while True:
+            ids = list(model.objects.filter(pk__gt=start, pk__lte=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return
+            yield model.objects.filter(pk__gte=ids[0], pk__lte=ids[-1], user__isnull=False)
+            start = ids[-1]
+
+    @staticmethod
+    def add_chunk(model, queryset, counted_days: set) -> int:
+        """
+        Суммирует строки диапазона по (user, model, day), прибавляет к расходу и возвращает число запросов.
+
+        Дни из `counted_days`, у которых строки расхода были до запуска, пропускаются.
+        """
+        queryset = queryset.annotate(day=TruncDate('created_at')).order_by()
+        if model is HistoryDALLE:
+            groups = queryset.values('user_id', 'day').annotate(requests=Count('pk'))
+            groups = [{**group, 'usage_model': TokenUsage.DALLE_MODEL, 'question': 0, 'answer': 0} for group in groups]
+        else:
+            # ответы из кэша и от одинакового одновременного запроса не тратили токены
+            queryset = queryset.filter(served_from=HistoryAI.ServedFrom.MODEL)
+            usage = {
+                'requests': Count('pk'),
+                'question': Sum(Coalesce('question_tokens', 0)),
+                'answer': Sum(Coalesce('answer_tokens', 0)),
+            }
+            hedge_usage = {
+                'requests': Count('pk'),
+                'question': Sum(Coalesce('hedge_question_tokens', 0)),
+                'answer': Sum(Coalesce('hedge_answer_tokens', 0)),
+            }
+            groups = [
+                *queryset.values('user_id', 'day', usage_model=F('model')).annotate(**usage),
+                *queryset.filter(hedge_model__isnull=False).values('user_id', 'day', usage_model=F('hedge_model')).annotate(**hedge_usage),
+            ]
+        groups = [group for group in groups if (group['user_id'], group['day']) not in counted_days]
+        for group in groups:
+            TokenUsage.add(group['user_id'], group['usage_model'], group['day'], group['requests'], group['question'], group['answer'])
+        return sum(group['requests'] for group in groups)
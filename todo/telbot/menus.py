@@ -1,5 +1,6 @@
 from typing import Any, Iterable
 
+from ai.context import clear_context
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.utils.timezone import now
@@ -161,6 +162,7 @@ def reset_bot_history(update: Update, context: CallbackContext) -> None:
     user = check_registration(update, context, answers, return_user=True)
     current_time = now()
     UserGptModels.objects.update_or_create(user=user, defaults={'time_start': current_time})
+    clear_context(user.id)
     context.bot.send_message(
         user.tg_id,
         'История запросов успешно очищена 🗑'
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telbot', '0006_alter_gptmodels_context_window_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gptmodels',
+            name='rpm_limit',
+            field=models.PositiveIntegerField(default=0, verbose_name='лимит запросов в минуту, 0 - без лимита'),
+        ),
+        migrations.AddField(
+            model_name='gptmodels',
+            name='tpm_limit',
+            field=models.PositiveIntegerField(default=0, verbose_name='лимит токенов в минуту, 0 - без лимита'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telbot', '0007_gptmodels_rpm_limit_gptmodels_tpm_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gptmodels',
+            name='fallback_model',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='telbot.gptmodels', verbose_name='резервная модель при медленном ответе или ошибке'),
+        ),
+        migrations.AddField(
+            model_name='historyai',
+            name='hedge_answer_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='historyai',
+            name='hedge_model',
+            field=models.CharField(blank=True, max_length=28, null=True, verbose_name='модель отменённого параллельного запроса'),
+        ),
+        migrations.AddField(
+            model_name='historyai',
+            name='hedge_question_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='historyai',
+            name='model',
+            field=models.CharField(blank=True, max_length=28, null=True, verbose_name='модель, давшая ответ'),
+        ),
+        migrations.AddField(
+            model_name='reminderai',
+            name='hedge_answer_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reminderai',
+            name='hedge_model',
+            field=models.CharField(blank=True, max_length=28, null=True, verbose_name='модель отменённого параллельного запроса'),
+        ),
+        migrations.AddField(
+            model_name='reminderai',
+            name='hedge_question_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reminderai',
+            name='model',
+            field=models.CharField(blank=True, max_length=28, null=True, verbose_name='модель, давшая ответ'),
+        ),
+    ]
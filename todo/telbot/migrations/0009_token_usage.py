@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('telbot', '0008_hedged_requests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gptmodels',
+            name='daily_token_limit',
+            field=models.PositiveIntegerField(default=0, verbose_name='лимит токенов пользователя в сутки, 0 - без лимита'),
+        ),
+        migrations.CreateModel(
+            name='TokenUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(blank=True, default='', max_length=28, verbose_name='модель')),
+                ('day', models.DateField(verbose_name='день')),
+                ('requests', models.PositiveIntegerField(default=0, verbose_name='запросов')),
+                ('question_tokens', models.PositiveBigIntegerField(default=0, verbose_name='токенов в запросах')),
+                ('answer_tokens', models.PositiveBigIntegerField(default=0, verbose_name='токенов в ответах')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Расход токенов за день',
+                'verbose_name_plural': 'Расход токенов по дням',
+                'ordering': ('-day',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tokenusage',
+            constraint=models.UniqueConstraint(fields=('user', 'model', 'day'), name='unique_token_usage_per_day'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('telbot', '0009_token_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('summary', models.TextField(verbose_name='Краткое содержание')),
+                ('summary_tokens', models.PositiveIntegerField(default=0)),
+                ('last_history_id', models.PositiveBigIntegerField(verbose_name='последняя свёрнутая запись истории')),
+                ('started_at', models.DateTimeField(verbose_name='начало свёрнутой истории')),
+                ('summarized_until', models.DateTimeField(verbose_name='конец свёрнутой истории')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='history_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Краткое содержание истории ИИ',
+                'verbose_name_plural': 'Краткое содержание истории ИИ',
+            },
+        ),
+    ]
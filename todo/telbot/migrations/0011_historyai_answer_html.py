@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telbot', '0010_historysummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historyai',
+            name='answer_html',
+            field=models.TextField(blank=True, null=True, verbose_name='Ответ в HTML'),
+        ),
+    ]
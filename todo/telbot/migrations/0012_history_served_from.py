@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('telbot', '0011_historyai_answer_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historyai',
+            name='served_from',
+            field=models.CharField(choices=[('model', 'запрос к модели'), ('cache', 'кэш ответов'), ('shared', 'одинаковый одновременный запрос')], default='model', max_length=8, verbose_name='источник ответа'),
+        ),
+        migrations.AddField(
+            model_name='reminderai',
+            name='served_from',
+            field=models.CharField(choices=[('model', 'запрос к модели'), ('cache', 'кэш ответов'), ('shared', 'одинаковый одновременный запрос')], default='model', max_length=8, verbose_name='источник ответа'),
+        ),
+    ]
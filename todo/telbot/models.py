@@ -1,8 +1,11 @@
+from ai.context import forget_model, model_tokens
 from core.models import Create
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.utils.timezone import now
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.timezone import localdate, now
 from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
@@ -15,6 +18,17 @@ class GptModels(models.Model):
     context_window = models.IntegerField(_('окно количества токенов для передачи истории в запросе'))
     max_request_token = models.IntegerField(_('максимальное количество токенов в запросе'))
     time_window = models.IntegerField(_('окно времени для передачи истории в запросе, мин'), default=30)
+    rpm_limit = models.PositiveIntegerField(_('лимит запросов в минуту, 0 - без лимита'), default=0)
+    tpm_limit = models.PositiveIntegerField(_('лимит токенов в минуту, 0 - без лимита'), default=0)
+    daily_token_limit = models.PositiveIntegerField(_('лимит токенов пользователя в сутки, 0 - без лимита'), default=0)
+    fallback_model = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('резервная модель при медленном ответе или ошибке'),
+    )
 
     class Meta:
         verbose_name = _('модель GPT OpenAi')
@@ -63,6 +77,19 @@ class UserGptModels(models.Model):
                 self.approved_models.add(default_model)
 
 
+@receiver(post_save, sender=GptModels)
+def forget_gpt_model_in_context(sender, instance, **kwargs):
+    """Сбрасывает модель в контексте Redis у пользователей, для которых она активна."""
+    model_tokens.forget(instance.id)
+    forget_model(*instance.active_for_users.values_list('user_id', flat=True))
+
+
+@receiver(post_save, sender=UserGptModels)
+def forget_user_model_in_context(sender, instance, **kwargs):
+    """Сбрасывает модель в контексте Redis после смены активной модели или окна истории."""
+    forget_model(instance.user_id)
+
+
 class HistoryAI(Create):
     """
     Модель для хранения истории вопросов и ответов AI.
@@ -72,15 +99,32 @@ class HistoryAI(Create):
     - question (`TextField`): Вопрос, заданный пользователем.
     - question_tokens (`PositiveIntegerField`): Количество токенов в вопросе (может быть null).
     - answer (`TextField`): Ответ, сгенерированный AI.
+    - answer_html (`TextField`): Ответ, отрисованный из Markdown в HTML при записи (null до `backfill_answer_html`).
     - answer_tokens (`PositiveIntegerField`): Количество токенов в ответе (может быть null).
+    - model (`CharField`): Модель, давшая ответ.
+    - hedge_model (`CharField`): Модель параллельного запроса, отменённого после ответа `model`.
+    - hedge_question_tokens (`PositiveIntegerField`): Токены запроса отменённой модели.
+    - hedge_answer_tokens (`PositiveIntegerField`): Токены ответа отменённой модели, если он был получен.
+    - served_from (`CharField`): Откуда получен ответ, токены ответов не от модели не входят в `TokenUsage`.
 
     """
+    class ServedFrom(models.TextChoices):
+        MODEL = 'model', _('запрос к модели')
+        CACHE = 'cache', _('кэш ответов')
+        SHARED = 'shared', _('одинаковый одновременный запрос')
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='history_ai', null=True, blank=True)
     room_group_name = models.CharField(_('WEB чат'), max_length=128, null=True, blank=True)
     question = models.TextField(_('Вопрос'))
     question_tokens = models.PositiveIntegerField(null=True)
     answer = models.TextField(_('Ответ'))
+    answer_html = models.TextField(_('Ответ в HTML'), null=True, blank=True)
     answer_tokens = models.PositiveIntegerField(null=True)
+    model = models.CharField(_('модель, давшая ответ'), max_length=28, null=True, blank=True)
+    hedge_model = models.CharField(_('модель отменённого параллельного запроса'), max_length=28, null=True, blank=True)
+    hedge_question_tokens = models.PositiveIntegerField(null=True, blank=True)
+    hedge_answer_tokens = models.PositiveIntegerField(null=True, blank=True)
+    served_from = models.CharField(_('источник ответа'), max_length=8, choices=ServedFrom.choices, default=ServedFrom.MODEL)
 
     class Meta:
         verbose_name = _('История запросов к ИИ')
@@ -101,6 +145,11 @@ class ReminderAI(Create):
     - question_tokens (`PositiveIntegerField`): Количество токенов в вопросе (может быть null).
     - answer (`TextField`): Ответ, сгенерированный AI.
     - answer_tokens (`PositiveIntegerField`): Количество токенов в ответе (может быть null).
+    - model (`CharField`): Модель, давшая ответ.
+    - hedge_model (`CharField`): Модель параллельного запроса, отменённого после ответа `model`.
+    - hedge_question_tokens (`PositiveIntegerField`): Токены запроса отменённой модели.
+    - hedge_answer_tokens (`PositiveIntegerField`): Токены ответа отменённой модели, если он был получен.
+    - served_from (`CharField`): Откуда получен ответ, токены ответов не от модели не входят в `TokenUsage`.
 
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reminder_history_ai', null=True, blank=True)
@@ -108,6 +157,13 @@ class ReminderAI(Create):
     question_tokens = models.PositiveIntegerField(null=True)
     answer = models.TextField(_('Ответ'))
     answer_tokens = models.PositiveIntegerField(null=True)
+    model = models.CharField(_('модель, давшая ответ'), max_length=28, null=True, blank=True)
+    hedge_model = models.CharField(_('модель отменённого параллельного запроса'), max_length=28, null=True, blank=True)
+    hedge_question_tokens = models.PositiveIntegerField(null=True, blank=True)
+    hedge_answer_tokens = models.PositiveIntegerField(null=True, blank=True)
+    served_from = models.CharField(
+        _('источник ответа'), max_length=8, choices=HistoryAI.ServedFrom.choices, default=HistoryAI.ServedFrom.MODEL
+    )
 
     class Meta:
         verbose_name = _('История запросов на преобразования напоминания к ИИ')
@@ -118,6 +174,48 @@ class ReminderAI(Create):
         return f'User: {self.user}, Question: {self.question}'
 
 
+class HistorySummary(models.Model):
+    """
+    Краткое содержание старой части диалога пользователя с ИИ.
+
+    Собирается фоновой задачей `ai.tasks.summarize_history`, когда история в окне превышает
+    `GPT_SUMMARY_THRESHOLD` токенов, и передаётся в prompt одним системным сообщением
+    вместо свёрнутых вопросов и ответов.
+
+    ### Fields:
+    - user (`OneToOneField`): Пользователь.
+    - summary (`TextField`): Краткое содержание.
+    - summary_tokens (`PositiveIntegerField`): Количество токенов в кратком содержании.
+    - last_history_id (`PositiveBigIntegerField`): ID последней свёрнутой записи `HistoryAI`.
+    - started_at (`DateTimeField`): Время первой свёрнутой записи.
+    - summarized_until (`DateTimeField`): Время последней свёрнутой записи.
+
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='history_summary')
+    summary = models.TextField(_('Краткое содержание'))
+    summary_tokens = models.PositiveIntegerField(default=0)
+    last_history_id = models.PositiveBigIntegerField(_('последняя свёрнутая запись истории'))
+    started_at = models.DateTimeField(_('начало свёрнутой истории'))
+    summarized_until = models.DateTimeField(_('конец свёрнутой истории'))
+
+    class Meta:
+        verbose_name = _('Краткое содержание истории ИИ')
+        verbose_name_plural = _('Краткое содержание истории ИИ')
+
+    def __str__(self):
+        return f'User: {self.user}, Until: {self.summarized_until}'
+
+    @property
+    def context_data(self) -> dict:
+        """Данные для контекста Redis, см. `ai.context.RedisContext`."""
+        return {
+            'text': self.summary,
+            'tokens': self.summary_tokens,
+            'last_history_id': self.last_history_id,
+            'until': self.summarized_until.timestamp(),
+        }
+
+
 class HistoryDALLE(Create):
     """
     Модель для хранения истории запросов и ответов от DALL·E.
@@ -139,3 +237,112 @@ class HistoryDALLE(Create):
 
     def __str__(self):
         return f'User: {self.user}, Question: {self.question}'
+
+
+class TokenUsage(models.Model):
+    """
+    Суточный расход токенов пользователя по модели.
+
+    Обновляется при записи каждой строки истории `HistoryAI`, `ReminderAI` и `HistoryDALLE`
+    и после сворачивания истории в `HistorySummary`, поэтому квоты и отчёты читают одну строку
+    вместо суммирования всей истории. Существующая история переносится командой
+    `backfill_token_usage` только в дни без строк расхода: токены сворачиваний нигде, кроме
+    этих строк, не хранятся и пересобрать их нельзя.
+
+    ### Fields:
+    - user (`ForeignKey`): Пользователь.
+    - model (`CharField`): Модель GPT или DALL·E.
+    - day (`DateField`): День расхода.
+    - requests (`PositiveIntegerField`): Количество запросов к модели.
+    - question_tokens (`PositiveBigIntegerField`): Токены запросов.
+    - answer_tokens (`PositiveBigIntegerField`): Токены ответов.
+
+    """
+    DALLE_MODEL = 'dall-e'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='token_usage')
+    model = models.CharField(_('модель'), max_length=28, blank=True, default='')
+    day = models.DateField(_('день'))
+    requests = models.PositiveIntegerField(_('запросов'), default=0)
+    question_tokens = models.PositiveBigIntegerField(_('токенов в запросах'), default=0)
+    answer_tokens = models.PositiveBigIntegerField(_('токенов в ответах'), default=0)
+
+    class Meta:
+        verbose_name = _('Расход токенов за день')
+        verbose_name_plural = _('Расход токенов по дням')
+        ordering = ('-day',)
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'model', 'day'), name='unique_token_usage_per_day'),
+        )
+
+    def __str__(self):
+        return f'User: {self.user}, Model: {self.model}, Day: {self.day}'
+
+    @classmethod
+    def add(cls, user_id: int, model: str, day, requests: int = 1, question_tokens: int = 0, answer_tokens: int = 0) -> None:
+        """
+        Прибавляет расход к строке (user, model, day), создавая её при первом запросе за день.
+
+        ### Args:
+        - user_id (`int`): ID пользователя.
+        - model (`str`): Модель.
+        - day (`date`): День расхода.
+        - requests (`int`, optional): Количество запросов.
+        - question_tokens (`int`, optional): Токены запросов.
+        - answer_tokens (`int`, optional): Токены ответов.
+
+        """
+        rows = cls.objects.filter(user_id=user_id, model=model or '', day=day)
+        increment = {
+            'requests': models.F('requests') + requests,
+            'question_tokens': models.F('question_tokens') + question_tokens,
+            'answer_tokens': models.F('answer_tokens') + answer_tokens,
+        }
+        if rows.update(**increment):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user_id=user_id,
+                    model=model or '',
+                    day=day,
+                    requests=requests,
+                    question_tokens=question_tokens,
+                    answer_tokens=answer_tokens,
+                )
+        except IntegrityError:
+            # строку этого дня успела создать параллельная запись
+            rows.update(**increment)
+
+    @classmethod
+    def used_tokens(cls, user_id: int, model: str, day=None) -> int:
+        """Токены пользователя по модели за день, по умолчанию за сегодня."""
+        used = cls.objects.filter(
+            user_id=user_id, model=model, day=day or localdate()
+        ).values_list(models.F('question_tokens') + models.F('answer_tokens'), flat=True).first()
+        return used or 0
+
+
+@receiver(post_save, sender=HistoryAI)
+@receiver(post_save, sender=ReminderAI)
+def add_history_token_usage(sender, instance, created, **kwargs):
+    """
+    Учитывает токены новой записи истории, включая отменённый параллельный запрос.
+
+    Ответы из кэша и от одинакового одновременного запроса не тратят токены и не учитываются.
+    """
+    if not created or not instance.user_id or instance.served_from != HistoryAI.ServedFrom.MODEL:
+        return
+    day = localdate(instance.created_at)
+    TokenUsage.add(instance.user_id, instance.model, day, 1, instance.question_tokens or 0, instance.answer_tokens or 0)
+    if instance.hedge_model:
+        TokenUsage.add(
+            instance.user_id, instance.hedge_model, day, 1, instance.hedge_question_tokens or 0, instance.hedge_answer_tokens or 0
+        )
+
+
+@receiver(post_save, sender=HistoryDALLE)
+def add_dalle_usage(sender, instance, created, **kwargs):
+    """Учитывает запрос к DALL·E."""
+    if created:
+        TokenUsage.add(instance.user_id, TokenUsage.DALLE_MODEL, localdate(instance.created_at))
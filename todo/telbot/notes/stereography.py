@@ -1,12 +1,12 @@
 import asyncio
 import json
 import traceback
-from datetime import datetime, timedelta
 
 import httpx
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.http import HttpResponseBadRequest
+from telbot.chat_actions import chat_action
 from telbot.gpt.chat_distributor import check_request_in_distributor
 from telbot.service_message import send_message_to_chat, send_service_message
 from telegram import ChatAction, Update
@@ -40,8 +40,8 @@ class AudioTranscription():
     async def get_audio_transcription(self) -> dict:
         """Основная логика."""
         try:
-            asyncio.create_task(self.send_typing_periodically())
-            await self.request_to_whisper()
+            async with chat_action(self.update.effective_chat.id, ChatAction.UPLOAD_VOICE, self.MAX_TYPING_TIME * 60, self.event):
+                await self.request_to_whisper()
 
             if self.transcription_text:
                 self.update.effective_message.text = self.transcription_text
@@ -54,20 +54,6 @@ class AudioTranscription():
             text = 'Не получилось разобрать, что Вы сказали. Попробуйте более четко и медленнее.'
             send_service_message(self.update.effective_chat.id, text)
 
-    async def send_typing_periodically(self) -> None:
-        """"
-        Передаёт TYPING в чат Телеграм откуда пришёл запрос.
-        """
-        time_stop = datetime.now() + timedelta(minutes=self.MAX_TYPING_TIME)
-        while not self.event.is_set():
-            self.context.bot.send_chat_action(
-                chat_id=self.update.effective_chat.id,
-                action=ChatAction.UPLOAD_VOICE
-            )
-            await asyncio.sleep(3)
-            if datetime.now() > time_stop:
-                break
-
     async def request_to_whisper(self) -> None:
         """ Делает запрос в API whisper и выключает typing."""
         audio = self.context.bot.get_file(self.file_id)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+
+import httpx
+from django.test import SimpleTestCase
+from telbot.chat_actions import ChatActionBroadcaster
+from telegram import ChatAction
+
+
+class ChatActionBroadcasterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.delay = 0
+
+    async def handler(self, request):
+        self.assertEqual(request.url.path, '/bot123:abc/sendChatAction')
+        payload = json.loads(request.content)
+        self.sent.append((payload['chat_id'], payload['action'], time.monotonic()))
+        await asyncio.sleep(self.delay)
+        return httpx.Response(200, json={'ok': True, 'result': True})
+
+    def make_broadcaster(self, tick=4.0):
+        broadcaster = ChatActionBroadcaster('123:abc', 'http://telegram', httpx.MockTransport(self.handler))
+        broadcaster.TICK = tick
+        return broadcaster
+
+    def test_chats_served_concurrently(self):
+        """Действия разных чатов отправляются одновременно, event loop не блокируется."""
+        self.delay = 0.3
+        broadcaster = self.make_broadcaster()
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.05)
+
+        async def job(chat_id):
+            async with broadcaster.action(chat_id, ChatAction.TYPING, 60):
+                await asyncio.sleep(0.35)
+
+        async def main():
+            started = time.monotonic()
+            await asyncio.gather(ticker(), *[job(chat_id) for chat_id in range(1, 6)])
+            return time.monotonic() - started
+
+        elapsed = asyncio.run(main())
+
+        self.assertEqual(sorted(chat_id for chat_id, *_ in self.sent), [1, 2, 3, 4, 5])
+        self.assertLess(elapsed, 0.6)
+        self.assertLess(max(b - a for a, b in zip(ticks, ticks[1:])), 0.2)
+
+    def test_same_chat_action_sent_once(self):
+        broadcaster = self.make_broadcaster()
+
+        async def main():
+            async with broadcaster.action(1, ChatAction.TYPING, 60):
+                async with broadcaster.action(1, ChatAction.TYPING, 60):
+                    await asyncio.sleep(0.05)
+
+        asyncio.run(main())
+
+        self.assertEqual([(chat_id, action) for chat_id, action, _ in self.sent], [(1, ChatAction.TYPING)])
+
+    def test_repeats_every_tick(self):
+        broadcaster = self.make_broadcaster(tick=0.1)
+
+        async def main():
+            async with broadcaster.action(1, ChatAction.UPLOAD_VOICE, 60):
+                await asyncio.sleep(0.35)
+
+        asyncio.run(main())
+
+        self.assertEqual(len(self.sent), 4)
+
+    def test_stop_event_and_deadline(self):
+        """Показ прекращается по событию и по истечении времени, задача рассылки завершается."""
+        broadcaster = self.make_broadcaster(tick=0.1)
+        event = asyncio.Event()
+
+        async def main():
+            async with broadcaster.action(1, ChatAction.TYPING, 60, event):
+                async with broadcaster.action(2, ChatAction.UPLOAD_PHOTO, 0.15):
+                    await asyncio.sleep(0.05)
+                    event.set()
+                    await asyncio.sleep(0.4)
+                    return broadcaster.task.done()
+
+        finished = asyncio.run(main())
+
+        self.assertEqual(sorted({chat_id for chat_id, *_ in self.sent}), [1, 2])
+        self.assertEqual(len([item for item in self.sent if item[0] == 1]), 1)
+        self.assertEqual(len([item for item in self.sent if item[0] == 2]), 2)
+        self.assertTrue(finished)
@@ -0,0 +1,121 @@
+import asyncio
+import json
+from unittest import mock
+
+import httpx
+from ai.tests.mixins import OpenAIMockMixin
+from django.test import SimpleTestCase
+from telbot.gpt.chat_gpt import TelegramAnswerGPT
+from telegram import ParseMode
+from telegram.constants import MAX_MESSAGE_LENGTH
+from telegram.error import BadRequest, RetryAfter, TimedOut
+
+
+class TelegramStreamTest(OpenAIMockMixin, SimpleTestCase):
+
+    def setUp(self):
+        self.bot = mock.Mock()
+        self.bot.send_message.return_value = mock.Mock(message_id=10)
+        self.send_message_to_chat = mock.Mock()
+        patchers = [
+            mock.patch('telbot.gpt.chat_gpt.bot', self.bot),
+            mock.patch('telbot.gpt.chat_gpt.send_message_to_chat', self.send_message_to_chat),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        update = mock.Mock()
+        update.effective_message.text = 'вопрос'
+        update.effective_chat.id = 1
+        update.message.message_id = 2
+        self.answer = TelegramAnswerGPT(update, None, mock.Mock(is_authenticated=True))
+        self.answer.model = self.mock_model()
+        self.answer.STREAM_INTERVAL = 0
+
+    def test_retry_after_does_not_abort_answer(self):
+        """Лимит правок Телеграма пропускает частичные ответы, но не прерывает ответ модели."""
+        self.bot.edit_message_text.side_effect = RetryAfter(60)
+        chunks = [{'choices': [{'index': 0, 'delta': {'content': part}}]} for part in ('При', 'вет', '!')]
+        body = ''.join(f'data: {json.dumps(chunk)}\n\n' for chunk in chunks) + 'data: [DONE]\n\n'
+        self.mock_openai(lambda request: httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'}))
+        self.answer.num_tokens = mock.AsyncMock(return_value=3)
+
+        asyncio.run(self.answer.httpx_request_to_openai())
+
+        self.assertEqual(self.answer.return_text, 'Привет!')
+        self.bot.send_message.assert_called_once()
+        # после RetryAfter следующие правки не отправляются до конца паузы
+        self.assertEqual(self.bot.edit_message_text.call_count, 1)
+
+    def test_network_errors_skip_edit(self):
+        asyncio.run(self.answer.stream_chunk('При'))
+        self.bot.edit_message_text.side_effect = TimedOut()
+
+        asyncio.run(self.answer.stream_chunk('Привет'))
+
+        self.assertEqual(self.answer.reply_messages, [[10, 'При']])
+        self.assertEqual(self.answer.edit_paused_until, 0)
+
+    def test_reply_waits_for_retry_after(self):
+        self.answer.reply_messages, self.answer.return_text = [[10, 'П']], 'Привет!'
+        self.bot.edit_message_text.side_effect = [RetryAfter(0.05), None]
+        asyncio.run(self.answer.stream_chunk('При'))
+
+        asyncio.run(self.answer.reply_to_user())
+
+        self.assertEqual(self.bot.edit_message_text.call_count, 2)
+        self.assertEqual(self.bot.edit_message_text.call_args.kwargs, {'parse_mode': ParseMode.MARKDOWN})
+        self.send_message_to_chat.assert_not_called()
+
+    def test_failed_final_edit_sends_rest(self):
+        """Если правка не прошла, отдельным сообщением приходит только недоставленная часть ответа."""
+        self.answer.reply_messages, self.answer.return_text = [[10, 'При']], 'Привет!'
+        self.bot.edit_message_text.side_effect = [BadRequest("Can't parse entities"), RetryAfter(30)]
+
+        asyncio.run(self.answer.reply_to_user())
+
+        self.send_message_to_chat.assert_called_once_with(1, 'вет!', 2)
+
+    def test_not_modified_is_delivered(self):
+        self.answer.reply_messages, self.answer.return_text = [[10, 'Привет!']], 'Привет!'
+        self.bot.edit_message_text.side_effect = BadRequest('Message is not modified')
+
+        asyncio.run(self.answer.reply_to_user())
+
+        self.send_message_to_chat.assert_not_called()
+
+    def test_long_stream_continues_in_new_message(self):
+        """После `MAX_MESSAGE_LENGTH` символов потоковый ответ продолжается новым сообщением, начало не повторяется."""
+        self.bot.send_message.side_effect = [mock.Mock(message_id=10), mock.Mock(message_id=11)]
+        first, second = 'а' * 3000 + '\n', 'б' * 2000
+
+        asyncio.run(self.answer.stream_chunk(first))
+        asyncio.run(self.answer.stream_chunk(first + second[:1500]))
+        asyncio.run(self.answer.stream_chunk(first + second))
+
+        self.assertEqual(self.answer.reply_messages, [[10, first], [11, second]])
+        self.assertEqual([call.args[1] for call in self.bot.send_message.call_args_list], [first, second[:1500]])
+        self.assertTrue(all(len(call.args[0]) <= MAX_MESSAGE_LENGTH for call in self.bot.edit_message_text.call_args_list))
+
+        self.answer.return_text = first + second
+        asyncio.run(self.answer.reply_to_user())
+
+        self.assertEqual([call.args[:3] for call in self.bot.edit_message_text.call_args_list[-2:]], [(first, 1, 10), (second, 1, 11)])
+        self.send_message_to_chat.assert_not_called()
+
+    def test_long_reply_without_stream_split(self):
+        self.answer.return_text = 'а' * (MAX_MESSAGE_LENGTH + 10)
+
+        asyncio.run(self.answer.reply_to_user())
+
+        self.assertEqual([len(call.args[1]) for call in self.send_message_to_chat.call_args_list], [MAX_MESSAGE_LENGTH, 10])
+
+    def test_split_reply_is_stable(self):
+        """Граница части не меняется, пока ответ дописывается."""
+        text = ('строка\n' * 1000)[:-1]
+        parts = TelegramAnswerGPT.split_reply(text)
+
+        self.assertEqual(''.join(parts), text)
+        self.assertTrue(all(len(part) <= MAX_MESSAGE_LENGTH and part.endswith('\n') for part in parts[:-1]))
+        for length in range(MAX_MESSAGE_LENGTH + 1, len(text), 997):
+            self.assertEqual(TelegramAnswerGPT.split_reply(text[:length])[0], parts[0])
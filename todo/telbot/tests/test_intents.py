@@ -0,0 +1,43 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from telbot.gpt import intents
+from telbot.gpt.predict_client import Prediction
+
+
+@override_settings(PREDICT_INTENT_THRESHOLD=0.85, TELEGRAM_ADMIN_ID=1)
+class DispatchIntentTest(SimpleTestCase):
+
+    def setUp(self):
+        self.update = mock.Mock()
+        self.context = mock.Mock()
+        self.user = mock.Mock()
+        self.handler = mock.Mock(return_value=True)
+        patcher = mock.patch.dict(intents.INTENT_HANDLERS, {'weather': self.handler})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def dispatch(self, prediction):
+        return asyncio.run(intents.dispatch_intent(self.update, self.context, self.user, prediction))
+
+    def test_confident_intent_is_handled(self):
+        """Уверенный интент обрабатывается своим обработчиком без ИИ."""
+        self.assertTrue(self.dispatch(Prediction('weather', confidence=0.95)))
+        self.handler.assert_called_once_with(self.update, self.context, self.user)
+
+    def test_low_confidence_falls_back(self):
+        """Неуверенный интент уходит в ИИ."""
+        self.assertFalse(self.dispatch(Prediction('weather', confidence=0.6)))
+        self.handler.assert_not_called()
+
+    def test_chat_is_not_dispatched(self):
+        """Для класса chat_gpt обработчика нет."""
+        self.assertFalse(self.dispatch(Prediction('chat_gpt', confidence=0.99)))
+
+    def test_handler_error_falls_back(self):
+        """Ошибка обработчика сообщается администратору, сообщение уходит в ИИ."""
+        self.handler.side_effect = KeyError('нет координат')
+
+        self.assertFalse(self.dispatch(Prediction('weather', confidence=0.95)))
+        self.context.bot.send_message.assert_called_once()
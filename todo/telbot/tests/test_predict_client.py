@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import httpx
+from django.test import SimpleTestCase
+from telbot.gpt.predict_client import PredictClient, PredictError
+
+
+class PredictClientTest(SimpleTestCase):
+
+    def make_client(self, handler, retries=2):
+        client = PredictClient('http://predict', retries=retries, transport=httpx.MockTransport(handler))
+        client.BACKOFF = 0
+        return client
+
+    def test_classify_returns_prediction(self):
+        """Ответ сервиса преобразуется в Prediction."""
+        def handler(request):
+            self.assertEqual(request.url.path, '/tasks/check/')
+            self.assertEqual(json.loads(request.content), {'text': 'напомни завтра'})
+            return httpx.Response(200, json={'predicted_class': 'task'})
+
+        prediction = asyncio.run(self.make_client(handler).classify('напомни завтра'))
+
+        self.assertTrue(prediction.is_task)
+        self.assertEqual(prediction.probabilities, {})
+
+    def test_retries_on_unavailable(self):
+        """При 503 запрос повторяется."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) < 3:
+                return httpx.Response(503)
+            return httpx.Response(200, json={'predicted_class': 'chat_gpt'})
+
+        prediction = self.make_client(handler).classify_sync('как дела?')
+
+        self.assertFalse(prediction.is_task)
+        self.assertEqual(len(calls), 3)
+
+    def test_connection_error_not_retried_by_loop(self):
+        """Сетевые ошибки повторяет только транспорт, клиент сразу возвращает PredictError."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            raise httpx.ConnectError('refused', request=request)
+
+        with self.assertRaises(PredictError):
+            self.make_client(handler, retries=1).classify_sync('текст')
+        self.assertEqual(len(calls), 1)
+
+    def test_default_transport_retries_connect(self):
+        client = PredictClient('http://predict', retries=3)
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.client._transport._pool._retries, 3)
+
+    def test_client_survives_event_loops(self):
+        """Один клиент используется из разных asyncio.run, как в обработчиках Телеграм."""
+        client = self.make_client(lambda request: httpx.Response(200, json={'predicted_class': 'task'}))
+
+        for _ in range(3):
+            self.assertTrue(asyncio.run(client.classify('текст')).is_task)
+
+    def test_confidence_from_response_or_probabilities(self):
+        """Уверенность берётся из ответа, а у старого сервиса — из вероятностей."""
+        responses = iter([
+            {'predicted_class': 'weather', 'confidence': 0.97, 'probabilities': {'weather': 0.97}},
+            {'predicted_class': 'task', 'probabilities': {'chat_gpt': 0.2, 'task': 0.8}},
+        ])
+        client = self.make_client(lambda request: httpx.Response(200, json=next(responses)))
+
+        self.assertEqual(client.classify_sync('какая погода').confidence, 0.97)
+        self.assertEqual(client.classify_sync('напомни завтра').confidence, 0.8)
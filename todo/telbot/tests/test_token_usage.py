@@ -0,0 +1,127 @@
+from datetime import timedelta
+from unittest import mock
+
+from ai.gpt_exception import TokenQuotaError
+from ai.gpt_query import GetAnswerGPT
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate
+from telbot.models import HistoryAI, HistoryDALLE, ReminderAI, TokenUsage
+
+User = get_user_model()
+
+
+class TokenUsageTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='usage', password='password')
+        self.today = localdate()
+
+    def usage(self, model):
+        return TokenUsage.objects.filter(user=self.user, model=model, day=self.today).values_list(
+            'requests', 'question_tokens', 'answer_tokens'
+        ).first()
+
+    def test_history_rows_update_ledger(self):
+        HistoryAI.objects.create(user=self.user, question='вопрос', question_tokens=10, answer='ответ', answer_tokens=20, model='gpt-4o')
+        HistoryAI.objects.create(user=self.user, question='вопрос', question_tokens=5, answer='ответ', answer_tokens=None, model='gpt-4o')
+        ReminderAI.objects.create(user=self.user, question='вопрос', question_tokens=1, answer='ответ', answer_tokens=2, model='gpt-4o')
+
+        self.assertEqual(self.usage('gpt-4o'), (3, 16, 22))
+        self.assertEqual(TokenUsage.used_tokens(self.user.id, 'gpt-4o'), 38)
+
+    def test_hedged_request_counts_both_models(self):
+        HistoryAI.objects.create(
+            user=self.user, question='вопрос', question_tokens=10, answer='ответ', answer_tokens=20, model='gpt-fast',
+            hedge_model='gpt-slow', hedge_question_tokens=10,
+        )
+
+        self.assertEqual(self.usage('gpt-fast'), (1, 10, 20))
+        self.assertEqual(self.usage('gpt-slow'), (1, 10, 0))
+
+    def test_updates_and_guests_not_counted(self):
+        history = HistoryAI.objects.create(room_group_name='room', question='вопрос', question_tokens=10, answer='ответ', model='gpt-4o')
+        history.answer_tokens = 100
+        history.save()
+
+        self.assertFalse(TokenUsage.objects.exists())
+
+    def test_answers_not_from_model_not_counted(self):
+        """Ответ из кэша или от одинакового одновременного запроса не тратит токены пользователя."""
+        HistoryAI.objects.create(
+            user=self.user, question='вопрос', question_tokens=10, answer='ответ', answer_tokens=20, model='gpt-4o',
+            served_from=HistoryAI.ServedFrom.CACHE,
+        )
+        ReminderAI.objects.create(
+            user=self.user, question='вопрос', question_tokens=10, answer='ответ', answer_tokens=20, model='gpt-4o',
+            served_from=HistoryAI.ServedFrom.SHARED,
+        )
+
+        self.assertFalse(TokenUsage.objects.exists())
+
+    def test_dalle_requests(self):
+        HistoryDALLE.objects.create(user=self.user, question='кот', answer={})
+
+        self.assertEqual(self.usage(TokenUsage.DALLE_MODEL), (1, 0, 0))
+
+    def test_backfill_matches_incremental_ledger(self):
+        """Пересборка по частям даёт тот же расход, что и учёт при записи истории."""
+        for day in range(3):
+            for tokens in (1, 2, 3):
+                history = HistoryAI.objects.create(
+                    user=self.user, question='вопрос', question_tokens=tokens, answer='ответ', answer_tokens=tokens * 10,
+                    model='gpt-4o', hedge_model='gpt-4o-mini' if tokens == 3 else None, hedge_question_tokens=7,
+                )
+                HistoryAI.objects.filter(pk=history.pk).update(created_at=history.created_at - timedelta(days=day))
+        HistoryAI.objects.create(user=self.user, question='вопрос', question_tokens=4, answer='ответ', answer_tokens=None)
+        ReminderAI.objects.create(
+            user=self.user, question='вопрос', question_tokens=9, answer='ответ', answer_tokens=9, model='gpt-4o',
+            served_from=HistoryAI.ServedFrom.CACHE,
+        )
+        HistoryDALLE.objects.create(user=self.user, question='кот', answer={})
+        TokenUsage.objects.all().delete()
+        expected = [
+            (self.today - timedelta(days=day), model, *usage)
+            for day in range(3)
+            for model, usage in (('gpt-4o', (3, 6, 60)), ('gpt-4o-mini', (1, 7, 0)))
+        ] + [(self.today, '', 1, 4, 0), (self.today, TokenUsage.DALLE_MODEL, 1, 0, 0)]
+
+        call_command('backfill_token_usage', chunk_size=2, stdout=mock.Mock())
+
+        ledger = TokenUsage.objects.values_list('day', 'model', 'requests', 'question_tokens', 'answer_tokens')
+        self.assertCountEqual(ledger, expected)
+
+    def test_backfill_keeps_counted_days(self):
+        """Дни с расходом, включая токены сворачивания истории, не пересобираются и не удваиваются."""
+        history = HistoryAI.objects.create(user=self.user, question='вопрос', question_tokens=3, answer='ответ', answer_tokens=30, model='gpt-4o')
+        HistoryAI.objects.filter(pk=history.pk).update(created_at=history.created_at - timedelta(days=1))
+        TokenUsage.objects.all().delete()
+        HistoryAI.objects.create(user=self.user, question='вопрос', question_tokens=1, answer='ответ', answer_tokens=10, model='gpt-4o')
+        TokenUsage.add(self.user.id, 'gpt-4o-mini', self.today, 1, 200, 50)
+
+        for _ in range(2):
+            call_command('backfill_token_usage', stdout=mock.Mock())
+
+        ledger = TokenUsage.objects.values_list('day', 'model', 'requests', 'question_tokens', 'answer_tokens')
+        self.assertCountEqual(ledger, [
+            (self.today - timedelta(days=1), 'gpt-4o', 1, 3, 30),
+            (self.today, 'gpt-4o', 1, 1, 10),
+            (self.today, 'gpt-4o-mini', 1, 200, 50),
+        ])
+
+    def test_quota_is_one_indexed_lookup(self):
+        HistoryAI.objects.create(user=self.user, question='вопрос', question_tokens=60, answer='ответ', answer_tokens=40, model='gpt-4o')
+        answer = GetAnswerGPT('вопрос', 'prompt', self.user, HistoryAI)
+        answer.model = mock.Mock(title='gpt-4o', daily_token_limit=100)
+
+        with CaptureQueriesContext(connection) as queries, self.assertRaises(TokenQuotaError):
+            async_to_sync(answer.check_token_quota)()
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('SUM(', queries[0]['sql'].upper())
+
+        answer.model.daily_token_limit = 101
+        async_to_sync(answer.check_token_quota)()
@@ -32,6 +32,32 @@ YANDEX_GEO_API_TOKEN = os.getenv('YANDEX_GEO_API_TOKEN', default='some_token_to_
 TELEGRAM_ADMIN_ID = os.getenv('TELEGRAM_ADMIN_ID')
 SOCKS5 = os.getenv('SOCKS5')
 
+# openai http client
+OPENAI_HTTP2 = bool(int(os.getenv('OPENAI_HTTP2', default=1)))
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', default=20))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', default=10))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', default=120))
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', default=300))
+GPT_STREAM = bool(int(os.getenv('GPT_STREAM', default=1)))
+GPT_STREAM_EDIT_INTERVAL = float(os.getenv('GPT_STREAM_EDIT_INTERVAL', default=1.5))
+GPT_CONTEXT_TTL = int(os.getenv('GPT_CONTEXT_TTL', default=24 * 60 * 60))
+GPT_CONTEXT_MAX_ENTRIES = int(os.getenv('GPT_CONTEXT_MAX_ENTRIES', default=100))
+GPT_LATENCY_BUDGET = float(os.getenv('GPT_LATENCY_BUDGET', default=60))  # ожидание лимитов и повторов, сек
+GPT_COMPLETION_TOKENS_ESTIMATE = int(os.getenv('GPT_COMPLETION_TOKENS_ESTIMATE', default=500))
+GPT_ANSWER_CACHE_TTL = int(os.getenv('GPT_ANSWER_CACHE_TTL', default=24 * 60 * 60))
+GPT_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('GPT_ANSWER_CACHE_MAX_ENTRIES', default=1000))
+GPT_ANSWER_CACHE_SIMHASH_DISTANCE = int(os.getenv('GPT_ANSWER_CACHE_SIMHASH_DISTANCE', default=0))  # бит из 64, 0 - только точные
+GPT_SINGLE_FLIGHT_WAIT = float(os.getenv('GPT_SINGLE_FLIGHT_WAIT', default=5))  # ожидание ответа одинакового запроса, сек
+GPT_LATENCY_WINDOW = int(os.getenv('GPT_LATENCY_WINDOW', default=100))  # запросов в выборке для p95 модели
+GPT_LATENCY_MIN_SAMPLES = int(os.getenv('GPT_LATENCY_MIN_SAMPLES', default=20))
+GPT_SUMMARY_THRESHOLD = int(os.getenv('GPT_SUMMARY_THRESHOLD', default=3000))  # токенов истории в prompt до сворачивания
+GPT_SUMMARY_KEEP_TOKENS = int(os.getenv('GPT_SUMMARY_KEEP_TOKENS', default=1000))  # последние токены истории без сворачивания
+GPT_SUMMARY_MAX_TOKENS = int(os.getenv('GPT_SUMMARY_MAX_TOKENS', default=500))
+WS_AI_CONCURRENCY = int(os.getenv('WS_AI_CONCURRENCY', default=1))  # одновременных ответов ИИ на соединение чата сайта
+WS_AI_QUEUE_SIZE = int(os.getenv('WS_AI_QUEUE_SIZE', default=3))  # вопросов в очереди соединения, сверх неё - `busy`
+OPENAI_RETRY_ATTEMPTS = int(os.getenv('OPENAI_RETRY_ATTEMPTS', default=3))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv('OPENAI_RETRY_BASE_DELAY', default=1))
+
 # mail service
 EMAIL_USE_TLS = True
 EMAIL_HOST = 'smtp.gmail.com'
@@ -42,6 +68,10 @@ EMAIL_PORT = 587
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# tokenizers
+TIKTOKEN_CACHE_DIR = os.getenv('TIKTOKEN_CACHE_DIR', default=BASE_DIR / 'tiktoken_cache')
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv('TOKEN_COUNT_CACHE_SIZE', default=2048))
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
 
@@ -51,6 +81,12 @@ if not SECRET_KEY:
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = int(os.getenv('DEBUG', default=0))
 
+# predict service
+PREDICT_URL = os.getenv('PREDICT_URL', default='http://127.0.0.1:8100' if DEBUG else 'http://predict:8100')
+PREDICT_UDS = os.getenv('PREDICT_UDS')
+PREDICT_TIMEOUT = float(os.getenv('PREDICT_TIMEOUT', default=10))
+PREDICT_INTENT_THRESHOLD = float(os.getenv('PREDICT_INTENT_THRESHOLD', default=0.85))
+
 # HOSTS
 ALLOWED_HOSTS = os.getenv('DJANGO_ALLOWED_HOSTS', default='localhost').split(' ')
 